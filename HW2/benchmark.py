@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+"""
+Reproducible benchmark of the Boolean query evaluators in search.py.
+
+Generates seeded workloads of Boolean queries with a controlled shape (number of terms,
+nesting depth, NOT density and term frequency skew drawn from the real dictionary),
+runs every evaluator on the same workloads, checks that they return identical results
+and reports the p50/p95/p99 latency and the throughput of each.
+"""
+from dataclasses import dataclass, asdict
+from index import Indexer, UNIVERSE
+
+# These imports are necessary for Pickle.load
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
+from search import naive_search, opt_search, DEFAULT_PREFETCH_THREADS
+
+from functools import partial
+import getopt
+import json
+import nltk
+import random
+import statistics
+import sys
+import time
+
+
+# The evaluators under comparison, all with the signature (query, indexer, stemmer) -> str
+EVALUATORS = {
+    "naive": naive_search,
+    "opt": opt_search,
+    "opt-prefetch": partial(opt_search, prefetch_threads=DEFAULT_PREFETCH_THREADS),
+}
+
+
+@dataclass
+class WorkloadShape:
+    """
+    The shape of a generated workload.
+    num_terms: number of terms in each query
+    depth: maximum nesting depth of parenthesised sub-expressions
+    not_density: probability that a term or sub-expression is negated
+    skew: how terms are drawn from the dictionary, one of
+        "uniform" (every term equally likely, so mostly rare terms by Zipf's law),
+        "df" (proportional to document frequency, like a real query log),
+        "frequent" (the most frequent 1% of terms) or "rare" (terms in at most 2 documents)
+    """
+    name: str
+    num_terms: int
+    depth: int
+    not_density: float
+    skew: str
+
+
+DEFAULT_WORKLOADS = [
+    WorkloadShape("2-terms", num_terms=2, depth=0, not_density=0.0, skew="df"),
+    WorkloadShape("4-terms", num_terms=4, depth=0, not_density=0.0, skew="df"),
+    WorkloadShape("8-terms", num_terms=8, depth=0, not_density=0.0, skew="df"),
+    WorkloadShape("nested-2", num_terms=6, depth=2, not_density=0.0, skew="df"),
+    WorkloadShape("nested-3", num_terms=8, depth=3, not_density=0.0, skew="df"),
+    WorkloadShape("not-light", num_terms=4, depth=1, not_density=0.2, skew="df"),
+    WorkloadShape("not-heavy", num_terms=4, depth=1, not_density=0.6, skew="df"),
+    WorkloadShape("frequent", num_terms=4, depth=1, not_density=0.1, skew="frequent"),
+    WorkloadShape("rare", num_terms=4, depth=1, not_density=0.1, skew="rare"),
+    WorkloadShape("uniform", num_terms=4, depth=1, not_density=0.1, skew="uniform"),
+]
+
+
+class TermSampler:
+    """Draws query terms from the dictionary according to a frequency skew"""
+
+    def __init__(self, indexer: Indexer, rng: random.Random) -> None:
+        self.rng = rng
+        # Only keep terms that survive query splitting unchanged as a single token
+        operators = ["AND", "OR", "NOT"]
+        self.vocabulary = sorted(
+            (
+                (entry.size, term)
+                for term, entry in indexer.word_to_pointer_dict.items()
+                if term != UNIVERSE and term.isalnum() and term.upper() not in operators
+            ),
+            reverse=True,
+        )
+        self.terms = [term for _, term in self.vocabulary]
+        self.dfs = [df for df, _ in self.vocabulary]
+        num_frequent = max(1, len(self.terms) // 100)
+        self.frequent = self.terms[:num_frequent]
+        self.rare = [term for df, term in self.vocabulary if df <= 2] or self.terms[-num_frequent:]
+
+    def sample(self, skew: str) -> str:
+        if skew == "uniform":
+            return self.rng.choice(self.terms)
+        elif skew == "df":
+            return self.rng.choices(self.terms, weights=self.dfs)[0]
+        elif skew == "frequent":
+            return self.rng.choice(self.frequent)
+        elif skew == "rare":
+            return self.rng.choice(self.rare)
+        raise ValueError(f"Unsupported skew {skew}")
+
+
+def generate_expression(shape: WorkloadShape, num_terms: int, depth: int, sampler: TermSampler) -> str:
+    """
+    Recursively generate a Boolean expression with num_terms terms nested up to depth levels.
+    Each level splits its terms into 2 or 3 groups which become parenthesised sub-expressions.
+    """
+    rng = sampler.rng
+
+    def maybe_negate(operand):
+        return f"NOT {operand}" if rng.random() < shape.not_density else operand
+
+    if depth == 0 or num_terms < 2:
+        operands = [maybe_negate(sampler.sample(shape.skew)) for _ in range(num_terms)]
+    else:
+        num_groups = rng.randint(2, min(3, num_terms))
+        # Random composition of num_terms into num_groups positive parts
+        cuts = sorted(rng.sample(range(1, num_terms), num_groups - 1))
+        sizes = [b - a for a, b in zip([0] + cuts, cuts + [num_terms])]
+        operands = []
+        for size in sizes:
+            sub = generate_expression(shape, size, depth - 1, sampler)
+            operands.append(maybe_negate(f"({sub})" if size > 1 else sub))
+    query = operands[0]
+    for operand in operands[1:]:
+        query += f" {rng.choice(['AND', 'OR'])} {operand}"
+    return query
+
+
+def generate_workload(shape: WorkloadShape, num_queries: int, sampler: TermSampler) -> list[str]:
+    """Generate num_queries queries of the given shape"""
+    return [generate_expression(shape, shape.num_terms, shape.depth, sampler) for _ in range(num_queries)]
+
+
+def percentile(latencies: list[float], p: int) -> float:
+    """The p-th percentile of the latencies"""
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[p - 1]
+
+
+def run_workload(queries: list[str], indexer: Indexer, stemmer: nltk.stem.PorterStemmer, search_fn):
+    """Run every query once and return the results and the per-query latencies in seconds"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search_fn(query, indexer, stemmer))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def run_benchmark(dict_file, postings_file, num_queries=200, seed=3245, workloads=DEFAULT_WORKLOADS):
+    """
+    Run every evaluator on every workload and return the report as a list of dicts,
+    one per (workload, evaluator) pair. Each workload is generated from its own seeded
+    random generator so that the queries do not depend on the order of the workloads.
+    """
+    indexer = Indexer(dict_file, postings_file)
+    indexer.load()
+    stemmer = indexer.stemmer
+    report = []
+    for shape in workloads:
+        sampler = TermSampler(indexer, random.Random(f"{seed}-{shape.name}"))
+        queries = generate_workload(shape, num_queries, sampler)
+        # Warm up the page cache so that the first evaluator is not penalised
+        run_workload(queries, indexer, stemmer, opt_search)
+        reference = None
+        for name, search_fn in EVALUATORS.items():
+            results, latencies = run_workload(queries, indexer, stemmer, search_fn)
+            if reference is None:
+                reference = results
+            mismatches = [q for q, a, b in zip(queries, reference, results) if a != b]
+            total_time = sum(latencies)
+            report.append(
+                {
+                    "workload": asdict(shape),
+                    "evaluator": name,
+                    "num_queries": len(queries),
+                    "mismatches": len(mismatches),
+                    "mismatched_queries": mismatches[:5],
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "throughput_qps": len(queries) / total_time if total_time > 0 else float("inf"),
+                }
+            )
+    return report
+
+
+def print_report(report):
+    print(f"{'workload':<12} {'evaluator':<13} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'qps':>10} {'mismatch':>9}")
+    for row in report:
+        print(
+            f"{row['workload']['name']:<12} {row['evaluator']:<13} {row['p50_ms']:>9.3f} "
+            f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['throughput_qps']:>10.1f} {row['mismatches']:>9}"
+        )
+
+
+def usage():
+    print(
+        "usage: "
+        + sys.argv[0]
+        + " -d dictionary-file -p postings-file [-n queries-per-workload] [-s seed] [-o report-file]"
+    )
+
+
+if __name__ == "__main__":
+    dictionary_file = postings_file = report_file = None
+    num_queries = 200
+    seed = 3245
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "d:p:n:s:o:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "-d":
+            dictionary_file = a
+        elif o == "-p":
+            postings_file = a
+        elif o == "-n":
+            num_queries = int(a)
+        elif o == "-s":
+            seed = int(a)
+        elif o == "-o":
+            report_file = a
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None:
+        usage()
+        sys.exit(2)
+
+    report = run_benchmark(dictionary_file, postings_file, num_queries, seed)
+    print_report(report)
+    if report_file is not None:
+        with open(report_file, "w") as outf:
+            json.dump(report, outf, indent=2)
+    if any(row["mismatches"] for row in report):
+        print("Evaluators returned different results!")
+        sys.exit(1)
@@ -0,0 +1,196 @@
+"""
+Block-compressed posting lists with a multi-level on-disk skip directory.
+
+The doc ids of a posting list are gap encoded in fixed-size blocks of BLOCK_SIZE doc ids, every
+block encoded on its own with one of the codecs of postings_codec. The blocks are preceded by a skip directory: level 0 stores the last doc id and
+end byte offset of every block, and every higher level stores the last doc id and end index of
+each group of SKIP_FANOUT entries of the level below. A BlockCursor descends the directory to read
+and decode only the blocks that can contain the doc ids it is asked for.
+
+Layout of a posting list, all integers little-endian uint32:
+    num_postings num_blocks num_levels
+    num_entries of level 0 .. num_levels - 1
+    level 0 entries .. level num_levels - 1 entries, each (last doc id, end)
+    blocks
+"""
+from bisect import bisect_left
+from struct import pack, unpack, unpack_from, calcsize
+
+from postings_codec import CODECS
+
+BLOCK_SIZE = 128
+SKIP_FANOUT = 16
+
+HEADER_FORMAT = "<III"
+HEADER_SIZE = calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = "<II"
+ENTRY_SIZE = calcsize(ENTRY_FORMAT)
+
+
+def encode_postings(doc_ids: list[int], codec: str = "vb") -> bytes:
+    """Encode the sorted doc ids into blocks preceded by the multi-level skip directory"""
+    blocks = []
+    level = []
+    prev = 0
+    end = 0
+    for start in range(0, len(doc_ids), BLOCK_SIZE):
+        block_doc_ids = doc_ids[start : start + BLOCK_SIZE]
+        # The first gap of a block is relative to the last doc id of the previous block
+        gaps = [block_doc_ids[0] - prev] + [
+            b - a for a, b in zip(block_doc_ids, block_doc_ids[1:])
+        ]
+        block = CODECS[codec].encode(gaps)
+        blocks.append(block)
+        end += len(block)
+        prev = block_doc_ids[-1]
+        level.append((prev, end))
+    levels = [level] if level else []
+    while len(level) > SKIP_FANOUT:
+        level = [
+            (level[min(i + SKIP_FANOUT, len(level)) - 1][0], min(i + SKIP_FANOUT, len(level)))
+            for i in range(0, len(level), SKIP_FANOUT)
+        ]
+        levels.append(level)
+    header = pack(HEADER_FORMAT, len(doc_ids), len(blocks), len(levels))
+    header += pack(f"<{len(levels)}I", *[len(level) for level in levels])
+    directory = b"".join(pack(ENTRY_FORMAT, *entry) for level in levels for entry in level)
+    return header + directory + b"".join(blocks)
+
+
+def parse_header(data: bytes) -> tuple[int, int, list[int]]:
+    """Returns the number of postings, the number of blocks and the entry count of every level"""
+    num_postings, num_blocks, num_levels = unpack_from(HEADER_FORMAT, data)
+    counts = list(unpack_from(f"<{num_levels}I", data, HEADER_SIZE))
+    return num_postings, num_blocks, counts
+
+
+def block_count(num_postings: int, num_blocks: int, block: int) -> int:
+    """Number of doc ids in a block, only the last block may be smaller than BLOCK_SIZE"""
+    return BLOCK_SIZE if block < num_blocks - 1 else num_postings - BLOCK_SIZE * (num_blocks - 1)
+
+
+def decode_postings(data: bytes, codec: str = "vb") -> list[int]:
+    """Decode the whole posting list back into its sorted doc ids"""
+    num_postings, num_blocks, counts = parse_header(data)
+    level_start = HEADER_SIZE + 4 * len(counts)
+    blocks_start = level_start + ENTRY_SIZE * sum(counts)
+    decode = CODECS[codec].decode
+    doc_ids = []
+    prev = 0
+    block_start = 0
+    for block in range(num_blocks):
+        _, block_end = unpack_from(ENTRY_FORMAT, data, level_start + ENTRY_SIZE * block)
+        block_data = data[blocks_start + block_start : blocks_start + block_end]
+        for gap in decode(block_data, block_count(num_postings, num_blocks, block)):
+            prev += gap
+            doc_ids.append(prev)
+        block_start = block_end
+    return doc_ids
+
+
+class BlockCursor:
+    """
+    Cursor over an encoded posting list which only reads the parts of the skip directory and the
+    blocks that it needs through read_fn(offset, length). Only the header and the top level of the
+    directory are read when the cursor is opened.
+    """
+
+    def __init__(self, read_fn, offset: int, codec: str = "vb") -> None:
+        self.read_fn = read_fn
+        self.offset = offset
+        self.codec = CODECS[codec]
+        self.bytes_read = 0
+        self.blocks_read = 0
+        self.num_postings, self.num_blocks, num_levels = unpack(HEADER_FORMAT, self.read(0, HEADER_SIZE))
+        self.counts = list(unpack(f"<{num_levels}I", self.read(HEADER_SIZE, 4 * num_levels)))
+        # Offset of the first entry of every level, relative to the start of the posting list
+        self.level_offsets = []
+        level_offset = HEADER_SIZE + 4 * num_levels
+        for count in self.counts:
+            self.level_offsets.append(level_offset)
+            level_offset += ENTRY_SIZE * count
+        self.blocks_offset = level_offset
+        # Directory slices that have already been read, keyed by (level, start, end)
+        self.entries_cache = {}
+        self.top = self.read_entries(num_levels - 1, 0, self.counts[-1]) if self.counts else []
+        # The decoded block the cursor is currently in and the last doc id of the block before it
+        self.block = -1
+        self.doc_ids = []
+        self.prev_last = 0
+
+    def __len__(self):
+        return self.num_postings
+
+    def read(self, offset: int, length: int) -> bytes:
+        self.bytes_read += length
+        return self.read_fn(self.offset + offset, length)
+
+    def read_entries(self, level: int, start: int, end: int) -> list[tuple[int, int]]:
+        """Read the entries [start, end) of a level of the skip directory"""
+        key = (level, start, end)
+        if key not in self.entries_cache:
+            data = self.read(self.level_offsets[level] + ENTRY_SIZE * start, ENTRY_SIZE * (end - start))
+            self.entries_cache[key] = [
+                unpack_from(ENTRY_FORMAT, data, ENTRY_SIZE * i) for i in range(end - start)
+            ]
+        return self.entries_cache[key]
+
+    def find_block(self, target: int) -> int:
+        """
+        Descend the skip directory to the first block whose last doc id is >= target.
+        Returns None if target is larger than every doc id.
+        """
+        entries, start = self.top, 0
+        for level in range(len(self.counts) - 1, -1, -1):
+            i = bisect_left([last for last, _ in entries], target)
+            if i == len(entries):
+                return None
+            if level == 0:
+                return start + i
+            # The entry covers the entries [previous end, end) of the level below
+            child_start = entries[i - 1][1] if i > 0 else self.child_start(level, start)
+            child_end = entries[i][1]
+            entries, start = self.read_entries(level - 1, child_start, child_end), child_start
+        return None
+
+    def child_start(self, level: int, start: int) -> int:
+        """The first child entry of the entry at index start of the level"""
+        if start == 0:
+            return 0
+        return self.read_entries(level, start - 1, start)[0][1]
+
+    def load_block(self, block: int):
+        """Read and decode a single block"""
+        entries = self.read_entries(0, max(block - 1, 0), block + 1)
+        prev_last, block_start = entries[0] if block > 0 else (0, 0)
+        block_end = entries[-1][1]
+        data = self.read(self.blocks_offset + block_start, block_end - block_start)
+        self.blocks_read += 1
+        self.doc_ids = []
+        self.prev_last = prev = prev_last
+        for gap in self.codec.decode(data, block_count(self.num_postings, self.num_blocks, block)):
+            prev += gap
+            self.doc_ids.append(prev)
+        self.block = block
+
+    def next_geq(self, target: int) -> int:
+        """Returns the first doc id >= target, or None if there is none"""
+        # Only descend the directory if the target is outside of the current block
+        if not self.doc_ids or not self.prev_last < target <= self.doc_ids[-1]:
+            block = self.find_block(target)
+            if block is None:
+                return None
+            if block != self.block:
+                self.load_block(block)
+        return self.doc_ids[bisect_left(self.doc_ids, target)]
+
+    def intersect(self, candidates: list[int]) -> list[int]:
+        """Returns the sorted candidates that are also in this posting list"""
+        results = []
+        for docId in candidates:
+            found = self.next_geq(docId)
+            if found is None:
+                break
+            if found == docId:
+                results.append(docId)
+        return results
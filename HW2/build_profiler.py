@@ -0,0 +1,207 @@
+"""
+Phase timing and memory report of an index build.
+
+The build is split into the phases tokenisation, inversion, block flushing, merging and
+dictionary write. Tokenisation and block flushing happen inside the inversion loop and the
+dictionary write at the end of merging, so the phases nest: the wall and cpu time of a phase
+exclude the time spent in the phases nested in it, and the times of all the phases add up to the
+time of the build.
+
+The process only reports the highest RSS it ever reached, so every phase records that cumulative
+peak once it ends and by how much the phase itself raised it. When allocations are traced, every
+phase, nested ones included, records its own peak traced memory and how far above the traced
+memory at its start that peak went, both including the phases nested in it, and the sites of the
+most memory still allocated at the end of its call which went the furthest above its start.
+
+The report is a dict which is saved as JSON.
+"""
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+TOP_ALLOCATIONS = 10
+
+
+def get_peak_rss_mb() -> float:
+    """Peak resident set size of the process so far, None if it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class PhaseStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        # The peak RSS of the process so far when the phase last ended
+        self.cumulative_peak_rss_mb = None
+        # How much the phase raised the peak RSS of the process, excluding its nested phases
+        self.peak_rss_raise_mb = 0.0
+        self.traced_peak_mb = None
+        # The most memory a call of the phase traced above the traced memory at its start
+        self.traced_growth_mb = None
+        self.top_allocations = None
+
+    def to_dict(self) -> dict:
+        stats = {
+            "calls": self.calls,
+            "wall_s": self.wall_time,
+            "cpu_s": self.cpu_time,
+            "cumulative_peak_rss_mb": self.cumulative_peak_rss_mb,
+            "peak_rss_raise_mb": self.peak_rss_raise_mb,
+        }
+        if self.traced_peak_mb is not None:
+            stats["traced_peak_mb"] = self.traced_peak_mb
+            stats["traced_growth_mb"] = self.traced_growth_mb
+            stats["top_allocations"] = self.top_allocations
+        return stats
+
+
+class PhaseFrame:
+    """The state of a phase while it runs"""
+
+    def __init__(self, peak_rss_start: float, traced: int) -> None:
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        # Time spent in the phases nested in this one
+        self.nested_wall = 0.0
+        self.nested_cpu = 0.0
+        self.peak_rss_start = peak_rss_start
+        self.nested_rss_raise = 0.0
+        # The traced memory at the start of the phase and its peak during the phase, in bytes
+        self.traced_start = traced
+        self.traced_peak = traced
+
+
+class BuildProfiler:
+    """
+    Collects the phase statistics of a build. A disabled profiler only runs the phases, so that
+    the indexer can always go through one.
+    """
+
+    def __init__(self, enabled: bool = True, trace_allocations: bool = False) -> None:
+        self.enabled = enabled
+        self.trace_allocations = enabled and trace_allocations
+        self.phases: dict[str, PhaseStats] = {}
+        # The PhaseFrame of every phase being run, innermost last
+        self.stack: list[PhaseFrame] = []
+        self.block_sizes = []
+        self.info = {}
+        self.start_wall = self.start_cpu = None
+        self.end_wall = self.end_cpu = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.start_wall, self.start_cpu = time.perf_counter(), time.process_time()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.end_wall, self.end_cpu = time.perf_counter(), time.process_time()
+        if self.trace_allocations:
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        traced = 0
+        if self.trace_allocations:
+            # The peak is reset for the new phase, so the phases it is nested in keep the peak
+            # reached so far themselves
+            traced, peak = tracemalloc.get_traced_memory()
+            for outer in self.stack:
+                outer.traced_peak = max(outer.traced_peak, peak)
+            tracemalloc.reset_peak()
+        frame = PhaseFrame(get_peak_rss_mb(), traced)
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - frame.wall_start
+            cpu = time.process_time() - frame.cpu_start
+            peak_rss = get_peak_rss_mb()
+            rss_raise = peak_rss - frame.peak_rss_start if peak_rss is not None else 0.0
+            if self.trace_allocations:
+                frame.traced_peak = max(frame.traced_peak, tracemalloc.get_traced_memory()[1])
+            self.stack.pop()
+            if self.stack:
+                outer = self.stack[-1]
+                outer.nested_wall += wall
+                outer.nested_cpu += cpu
+                outer.nested_rss_raise += rss_raise
+                outer.traced_peak = max(outer.traced_peak, frame.traced_peak)
+            stats = self.phases.setdefault(name, PhaseStats())
+            stats.calls += 1
+            stats.wall_time += wall - frame.nested_wall
+            stats.cpu_time += cpu - frame.nested_cpu
+            stats.cumulative_peak_rss_mb = peak_rss
+            stats.peak_rss_raise_mb += rss_raise - frame.nested_rss_raise
+            if self.trace_allocations:
+                self.record_allocations(stats, frame)
+
+    def wrap(self, name: str, fn):
+        """fn with every call timed as the phase name"""
+        if not self.enabled:
+            return fn
+
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+
+        return timed
+
+    def record_allocations(self, stats: PhaseStats, frame: PhaseFrame):
+        peak = frame.traced_peak / 2**20
+        growth = (frame.traced_peak - frame.traced_start) / 2**20
+        stats.traced_peak_mb = peak if stats.traced_peak_mb is None else max(stats.traced_peak_mb, peak)
+        # Only the call which grew the most is snapshotted, which keeps the phases called once
+        # per document from taking a snapshot every time
+        if stats.traced_growth_mb is not None and growth <= stats.traced_growth_mb:
+            return
+        stats.traced_growth_mb = growth
+        top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+        stats.top_allocations = [
+            {"where": str(stat.traceback), "size_kb": stat.size / 2**10, "count": stat.count}
+            for stat in top
+        ]
+
+    def record_block(self, filename: str):
+        if self.enabled:
+            self.block_sizes.append(os.path.getsize(filename))
+
+    def report(self) -> dict:
+        blocks = self.block_sizes
+        return {
+            **self.info,
+            "wall_s": self.end_wall - self.start_wall if self.end_wall is not None else None,
+            "cpu_s": self.end_cpu - self.start_cpu if self.end_cpu is not None else None,
+            "peak_rss_mb": get_peak_rss_mb(),
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+            "blocks": {
+                "count": len(blocks),
+                "total_bytes": sum(blocks),
+                "min_bytes": min(blocks, default=0),
+                "mean_bytes": sum(blocks) / len(blocks) if blocks else 0,
+                "max_bytes": max(blocks, default=0),
+            },
+        }
+
+    def save(self, filename: str):
+        with open(filename, "w") as outf:
+            json.dump(self.report(), outf, indent=2)
@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+"""
+Benchmark of the postings codecs on a collection.
+
+Builds the index of the collection once per codec (and once with pickled postings as the baseline)
+and reports the size of the postings file, the build time and the decode throughput of reading
+back every posting list. The doc ids can be reassigned first to compare the reorderings.
+"""
+from index import Indexer
+from postings_codec import CODECS
+
+# These imports are necessary for Pickle.load
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
+
+import getopt
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def measure_decode(indexer: Indexer) -> tuple[int, float]:
+    """Decode every posting list of the index, returns the number of postings and the time taken"""
+    indexer.load()
+    num_postings = 0
+    total_time = 0.0
+    for word in indexer.word_to_pointer_dict:
+        data = indexer.read_posting_data(word)
+        start = time.perf_counter()
+        pl = indexer.decode_posting_data(data)
+        total_time += time.perf_counter() - start
+        num_postings += len(pl)
+    return num_postings, total_time
+
+
+def run_codec_benchmark(collection_dir: str, reorder: str = "none") -> list[dict]:
+    """Build and decode the index of the collection with every codec"""
+    variants = [("pickle", "vb")] + [("blocks", codec) for codec in CODECS]
+    report = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for postings_format, codec in variants:
+            name = "pickle" if postings_format == "pickle" else codec
+            out_dict = os.path.join(tmp_dir, f"dictionary.{name}.txt")
+            out_postings = os.path.join(tmp_dir, f"postings.{name}.txt")
+            indexer = Indexer(
+                out_dict,
+                out_postings,
+                block_dir=os.path.join(tmp_dir, "block"),
+                postings_format=postings_format,
+                codec=codec,
+                reorder=reorder,
+            )
+            start = time.perf_counter()
+            indexer.index_collection(collection_dir)
+            build_time = time.perf_counter() - start
+            num_postings, decode_time = measure_decode(indexer)
+            report.append(
+                {
+                    "codec": name,
+                    "reorder": reorder,
+                    "postings_bytes": os.path.getsize(out_postings),
+                    "dictionary_bytes": os.path.getsize(out_dict),
+                    "bytes_per_posting": os.path.getsize(out_postings) / num_postings,
+                    "build_time_s": build_time,
+                    "num_postings": num_postings,
+                    "decode_time_s": decode_time,
+                    "decode_postings_per_s": num_postings / decode_time if decode_time > 0 else float("inf"),
+                }
+            )
+    return report
+
+
+def print_report(report):
+    print(f"{'codec':<10} {'postings MB':>12} {'B/posting':>10} {'build s':>9} {'decode Mpostings/s':>19}")
+    for row in report:
+        print(
+            f"{row['codec']:<10} {row['postings_bytes'] / 1e6:>12.3f} {row['bytes_per_posting']:>10.3f} "
+            f"{row['build_time_s']:>9.2f} {row['decode_postings_per_s'] / 1e6:>19.3f}"
+        )
+
+
+def usage():
+    print("usage: " + sys.argv[0] + " -i directory-of-documents [-r reorder] [-o report-file]")
+
+
+if __name__ == "__main__":
+    input_directory = report_file = None
+    reorder = "none"
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "i:r:o:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "-i":
+            input_directory = a
+        elif o == "-r":
+            reorder = a
+        elif o == "-o":
+            report_file = a
+        else:
+            assert False, "unhandled option"
+
+    if input_directory == None:
+        usage()
+        sys.exit(2)
+
+    report = run_codec_benchmark(input_directory, reorder)
+    print_report(report)
+    if report_file is not None:
+        with open(report_file, "w") as outf:
+            json.dump(report, outf, indent=2)
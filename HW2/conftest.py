@@ -0,0 +1,100 @@
+"""
+Fixtures of the checks of the index and search, which build small indexes of a generated
+collection in a temporary directory. Run them with python -m pytest from this directory.
+"""
+import random
+
+import pytest
+
+from index import Indexer, build_index
+from search import naive_search
+
+# These imports are necessary for pickle to work
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
+
+# Scripts which print the postings of the index of the Reuters collection rather than checks
+collect_ignore = ["test_custom.py", "test_empty_string.py"]
+
+VOCABULARY = [f"w{i}" for i in range(60)]
+# The earlier words are more frequent, so the posting lists have a range of sizes
+WORD_WEIGHTS = [1 / (i + 1) for i in range(len(VOCABULARY))]
+DOC_IDS = list(range(1, 600, 4))
+QUERIES = [
+    "w1",
+    "w1 AND w2",
+    "w3 OR w4 AND NOT w5",
+    "NOT w1",
+    "(w2 OR w7) AND NOT (w3 AND w4)",
+    "w10 AND w11 AND w12",
+    "w50 OR w59 OR w0",
+    "w0 AND NOT w0",
+    "missing",
+    "w1 AND missing",
+    "NOT missing AND w30",
+]
+
+
+def document_text(docId: int) -> str:
+    """The text of a document only depends on its doc id, so any subset can be indexed"""
+    rng = random.Random(docId)
+    return " ".join(rng.choices(VOCABULARY, WORD_WEIGHTS, k=rng.randint(5, 40))) + "."
+
+
+def write_collection(directory, doc_ids):
+    directory.mkdir()
+    for docId in doc_ids:
+        (directory / str(docId)).write_text(document_text(docId))
+    return directory
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary working directory, as the builds write their blocks next to the index"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def collection(workdir):
+    return write_collection(workdir / "collection", DOC_IDS)
+
+
+@pytest.fixture
+def build(workdir, collection):
+    """Builds an index of the collection with the keyword arguments of build_index"""
+
+    def build_named(name, in_dir=collection, **kwargs):
+        out_dict, out_postings = str(workdir / f"{name}.dict"), str(workdir / f"{name}.postings")
+        build_index(str(in_dir), out_dict, out_postings, **kwargs)
+        return out_dict, out_postings
+
+    return build_named
+
+
+@pytest.fixture
+def queries_file(workdir):
+    path = workdir / "queries.txt"
+    path.write_text("\n".join(QUERIES))
+    return str(path)
+
+
+def search_lines(dict_file, postings_file, queries=QUERIES) -> list[str]:
+    """The naive_search results of the queries, the reference of the other ways to search"""
+    indexer = Indexer(dict_file, postings_file)
+    indexer.load()
+    return [naive_search(query, indexer, indexer.stemmer) for query in queries]
+
+
+@pytest.fixture
+def reference(build) -> list[str]:
+    """The results of QUERIES on the plain index of the collection"""
+    return search_lines(*build("reference"))
+
+
+@pytest.fixture
+def read_results(workdir):
+    def read(results_file) -> list[str]:
+        with open(results_file) as f:
+            return f.read().split("\n")
+
+    return read
@@ -1,14 +1,34 @@
 #!/usr/bin/python3
 
+from array import array
 from dataclasses import dataclass
 from collections import defaultdict, OrderedDict
 from heapq import merge
+from itertools import accumulate
 import getopt
+import json
 import math
+import mmap
 import nltk
 import os
 import pickle
 import sys
+import threading
+import zlib
+
+from block_postings import BlockCursor, encode_postings, decode_postings
+from build_profiler import BuildProfiler
+from index_container import (
+    Container,
+    ContainerWriter,
+    CorruptIndexError,
+    is_container,
+    pack_array,
+    unpack_array,
+)
+from kgram_index import KGramIndex
+from postings_codec import CODECS
+from stem_cache import StemCache
 
 
 class Posting:
@@ -83,7 +103,16 @@ class PostingsList:
     def add_skip_pointers(self):
         """Add skip pointers for disk writing"""
         self.plist = sorted(list(set(self.plist)), key=lambda p: p.value)
+        self.set_skip_pointers()
+
+    def set_skip_pointers(self):
+        """Add skip pointers to a list that is already sorted and free of duplicates"""
+        # Reset any skip pointers left over from before the list was filtered or merged
+        for p in self.plist:
+            p.skip = None
         skips = round(math.sqrt(len(self.plist)))
+        if skips == 0:
+            return
         step = len(self.plist) // skips
         for i in range(0, len(self.plist), step):
             if i + step < len(self.plist):
@@ -111,6 +140,153 @@ class WordToPointerEntry:
         self.__dict__ = d
 
 
+@dataclass
+class IndexHeader:
+    """
+    Dataclass written to the dictionary file right before the dictionary to record how the
+    posting lists in the postings file are encoded. Dictionary files without a header use pickle.
+    """
+    # "pickle" for pickled PostingsLists or "blocks" for block_postings
+    postings_format: str = "pickle"
+    # The postings_codec used for the doc id gaps of the blocks
+    codec: str = "vb"
+
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, d):
+        self.__dict__ = d
+
+
+POSTINGS_FORMATS = ["pickle", "blocks"]
+# How the dictionary and postings files are laid out, raw pickles or index_container containers
+FILE_FORMATS = ["pickle", "container"]
+DICTIONARY_KIND = b"DICT"
+POSTINGS_KIND = b"POST"
+
+
+def merge_posting_lists(posting_lists: list[PostingsList]) -> PostingsList:
+    """
+    Merges the sorted posting lists of the same term from different index segments
+    into a single sorted posting list with fresh skip pointers.
+    """
+    if len(posting_lists) == 1:
+        return posting_lists[0]
+    merged = PostingsList()
+    for value in merge(*[[p.value for p in pl.plist] for pl in posting_lists]):
+        merged.append(Posting(value))
+    merged.add_skip_pointers()
+    return merged
+
+
+class DeletedDocuments:
+    """
+    Tombstone bitmap of deleted doc ids, stored in a file next to the dictionary.
+    Bit docId is set when the document has been deleted. Deleted documents are filtered out of the
+    posting lists when they are read and only physically purged at the next segment merge.
+    """
+    def __init__(self, bits: bytearray = None) -> None:
+        self.bits = bytearray() if bits is None else bits
+        self.count = sum(bin(byte).count("1") for byte in self.bits)
+
+    def __contains__(self, docId: int) -> bool:
+        byte = docId >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (docId & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, docId: int):
+        byte = docId >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        if not self.bits[byte] & (1 << (docId & 7)):
+            self.bits[byte] |= 1 << (docId & 7)
+            self.count += 1
+
+    @staticmethod
+    def load(filename: str) -> "DeletedDocuments":
+        if not os.path.exists(filename):
+            return DeletedDocuments()
+        with open(filename, "rb") as f:
+            return DeletedDocuments(bytearray(f.read()))
+
+    def save(self, filename: str):
+        """Atomically replace the bitmap file"""
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(self.bits)
+        os.replace(tmp_file, filename)
+
+
+class DocIdMap:
+    """
+    Mapping array from the dense internal doc ids assigned by the reordering stage back to the
+    external doc ids (the file names), stored as raw uint32 in a file next to the dictionary.
+    Indexes without the file use the external doc ids directly.
+    """
+    def __init__(self, external_ids=None) -> None:
+        self.external_ids = array("I", [] if external_ids is None else external_ids)
+        # Inverse mapping, only built when external doc ids have to be translated
+        self.internal_ids = None
+
+    def __len__(self):
+        return len(self.external_ids)
+
+    def to_external(self, docId: int) -> int:
+        return self.external_ids[docId]
+
+    def to_internal(self, docId: int) -> int:
+        """Returns the internal doc id of the external doc id, or None if it is not indexed"""
+        if self.internal_ids is None:
+            self.internal_ids = {external: i for i, external in enumerate(self.external_ids)}
+        return self.internal_ids.get(docId)
+
+    def extend(self, external_ids: list[int]):
+        self.external_ids.extend(external_ids)
+        self.internal_ids = None
+
+    @staticmethod
+    def load(filename: str) -> "DocIdMap":
+        if not os.path.exists(filename):
+            return None
+        doc_map = DocIdMap()
+        with open(filename, "rb") as f:
+            doc_map.external_ids.frombytes(f.read())
+        return doc_map
+
+    def save(self, filename: str):
+        """Atomically replace the mapping file"""
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, "wb") as f:
+            self.external_ids.tofile(f)
+        os.replace(tmp_file, filename)
+
+
+# How internal doc ids can be reassigned at index time, see Indexer.reorder_documents
+REORDERINGS = ["none", "docid", "minhash"]
+# Parameters (a, b) of the universal hash functions (a * h + b) mod MINHASH_PRIME of the minhash
+MINHASH_FUNCTIONS = [(0x5BD1E995, 0x27D4EB2D), (0x165667B1, 0x9E3779B1), (0x85EBCA6B, 0xC2B2AE35)]
+MINHASH_PRIME = 4294967311
+
+
+def minhash_stream(token_stream, signatures: dict):
+    """
+    Pass the document token stream through unchanged while recording the minhash signature of
+    every document's set of terms in signatures, keyed by doc id.
+    """
+    for token in token_stream:
+        h = zlib.crc32(token.term.encode())
+        signature = signatures.get(token.docId)
+        if signature is None:
+            signature = signatures[token.docId] = [MINHASH_PRIME] * len(MINHASH_FUNCTIONS)
+        for i, (a, b) in enumerate(MINHASH_FUNCTIONS):
+            value = (a * h + b) % MINHASH_PRIME
+            if value < signature[i]:
+                signature[i] = value
+        yield token
+
+
 # The term used to represent the list of all doc ids
 UNIVERSE = "-+@'adasdasdasdasedqwewqeeeqadasdasdasdasdasdasdasdasdad.,."  
 # I am choosing random terms to make this unique so that there is no clash with an actual term
@@ -138,12 +314,13 @@ def tokenize_document(docId, path, processing_fn):
             yield DocumentStreamToken(token, docId)
 
 
-def tokenize_collection(dir, processing_fn, debug=False):
+def tokenize_collection(dir, processing_fn, debug=False, files=None):
     """
     Apply the generator function tokenize_document onto each document in the directory
     to avoid reading all into memory thanks to Python generators.
+    Only the given files of the directory are tokenized if files is provided.
     """
-    for file in os.listdir(dir):
+    for file in os.listdir(dir) if files is None else files:
         path = os.path.join(dir, file)
         # Assume that doc id is name of file
         docId = int(file)
@@ -158,6 +335,33 @@ def tokenize_collection(dir, processing_fn, debug=False):
             yield token
 
 
+def get_build_id(postings_writer) -> int:
+    """The build id of a postings container being written, None for pickled postings"""
+    return postings_writer.build_id if isinstance(postings_writer, ContainerWriter) else None
+
+
+def read_manifest_file(filename: str) -> list[tuple[str, str]]:
+    """
+    Returns the (dictionary, postings) file paths listed in a manifest.
+    The manifest stores them relative to its own directory.
+    """
+    if not os.path.exists(filename):
+        return []
+    with open(filename, "rb") as f:
+        names = pickle.load(f)
+    base = os.path.dirname(filename)
+    return [(os.path.join(base, d), os.path.join(base, p)) for d, p in names]
+
+
+def write_manifest_file(filename: str, paths: list[tuple[str, str]]):
+    """Atomically replace the manifest with the (dictionary, postings) file paths"""
+    names = [(os.path.basename(d), os.path.basename(p)) for d, p in paths]
+    tmp_file = f"{filename}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(names, f)
+    os.replace(tmp_file, filename)
+
+
 class Indexer:
     """
     The Indexer abstraction which implements the SPIMI technique for indexing and then
@@ -170,6 +374,12 @@ class Indexer:
         block_dir="block",
         block_size=500000,
         use_binary=True,
+        merge_ratio=0.1,
+        max_deltas=8,
+        postings_format="pickle",
+        codec="vb",
+        reorder="none",
+        file_format="pickle",
     ) -> None:
         """
         The posting files contains the serialized version of the posting lists.
@@ -178,8 +388,24 @@ class Indexer:
         Default to 0.5MB for the block size
         Note that use_Binary=False is purely for debugging and will not work with loading at the moment
         as deserialization would be slightly harder to write.
+        Documents appended later are indexed into small delta segments which are listed in a
+        manifest next to the dictionary. They are merged into the main segment in the background
+        once they hold more than merge_ratio of the main segment's documents or there are more
+        than max_deltas of them.
+        postings_format selects how posting lists are written, "pickle" or "blocks" for
+        block-compressed lists with a skip directory that supports partial reads.
+        codec selects the postings_codec used to compress the blocks.
+        reorder selects how dense internal doc ids are reassigned when indexing a collection:
+        "none" keeps the external doc ids, "docid" numbers the documents in external doc id order
+        (the date order of the Reuters collection) and "minhash" sorts them by the minhash
+        signature of their terms so that similar documents get nearby ids and the gaps shrink.
+        file_format selects how the dictionary and postings files are written, "pickle" or
+        "container" for checksummed binary containers which load without unpickling.
+        Loading detects the format of the files.
         """
-        self.stemmer = nltk.stem.PorterStemmer()
+        # Saved next to the dictionary and preloaded by load
+        self.stemmer = StemCache(nltk.stem.PorterStemmer())
+        self.stem_cache_file = f"{out_dict}.stems"
         self.dictionary = {}
         self.word_to_pointer_dict = {}
         self.out_dict = out_dict
@@ -188,18 +414,105 @@ class Indexer:
         self.block_dir = block_dir
         self.block_size = block_size
         self.use_binary = use_binary
-
-    def index_collection(self, collection_dir):
-        """Apply the SPIMI inverting technique then block merge onto the specified directory."""
+        # Read-only mapping of the postings file, see open_postings_mmap
+        self.postings_mmap = None
+        # The postings file as of the last load, see open_postings_handle
+        self.postings_handle = None
+        self.postings_read_lock = threading.Lock()
+        # The delta segments, each an Indexer over its own dictionary and postings file
+        self.deltas: list[Indexer] = []
+        self.manifest_file = f"{out_dict}.segments"
+        self.merge_ratio = merge_ratio
+        self.max_deltas = max_deltas
+        self.merge_thread = None
+        # Guards the list of deltas and the manifest against the background merge
+        self.segments_lock = threading.Lock()
+        self.deleted_file = f"{out_dict}.deleted"
+        self.deleted = DeletedDocuments()
+        if postings_format not in POSTINGS_FORMATS:
+            raise ValueError(f"postings_format should be one of {POSTINGS_FORMATS}")
+        if codec not in CODECS:
+            raise ValueError(f"codec should be one of {list(CODECS)}")
+        self.header = IndexHeader(postings_format=postings_format, codec=codec)
+        if reorder not in REORDERINGS:
+            raise ValueError(f"reorder should be one of {REORDERINGS}")
+        self.reorder = reorder
+        self.doc_map_file = f"{out_dict}.docmap"
+        self.doc_map: DocIdMap = None
+        # The k-gram index of the vocabulary for wildcard queries, loaded on first use
+        self.kgram_file = f"{out_dict}.kgrams"
+        self.kgram_index: KGramIndex = None
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"file_format should be one of {FILE_FORMATS}")
+        self.file_format = file_format
+        # Offset of the posting lists in the postings file, the dictionary pointers are relative to it
+        self.postings_base = 0
+        # Replaced by an enabled profiler to report the phases of the build
+        self.profiler = BuildProfiler(enabled=False)
+
+    def index_collection(self, collection_dir, files=None, doc_ids=None):
+        """
+        Apply the SPIMI inverting technique then block merge onto the specified directory.
+        Only the given files of the directory are indexed if files is provided.
+        The blocks hold external doc ids which are only remapped to the internal doc ids while
+        merging, so that the reordering can use what was learnt about the documents while inverting.
+        doc_ids gives the internal doc ids of the files, otherwise they are assigned by reorder.
+        """
+        files = list(os.listdir(collection_dir)) if files is None else files
         token_stream = tokenize_collection(
-            collection_dir, processing_fn=self.preprocess_text
+            collection_dir,
+            processing_fn=self.profiler.wrap("tokenisation", self.preprocess_text),
+            files=files,
         )
+        signatures = {}
+        if doc_ids is None and self.reorder == "minhash":
+            token_stream = minhash_stream(token_stream, signatures)
         print("SPIMI Inverting...")
-        num_blocks = self.spimi_invert(token_stream)
+        with self.profiler.phase("inversion"):
+            num_blocks = self.spimi_invert(token_stream)
         print("SPIMI Inverting done!")
+        remap = None
+        if doc_ids is not None:
+            remap = dict(zip((int(file) for file in files), doc_ids))
+        elif self.reorder != "none":
+            order = self.reorder_documents([int(file) for file in files], signatures)
+            remap = {docId: i for i, docId in enumerate(order)}
+            self.doc_map = DocIdMap(order)
         print("Merging blocks...")
-        self.merge_blocks(num_blocks, collection_dir)
+        with self.profiler.phase("merging"):
+            self.merge_blocks(num_blocks, collection_dir, files, remap)
         print("Blocks merged!")
+        print(self.stemmer.report())
+        if doc_ids is None:
+            self.save_doc_map()
+
+    def reorder_documents(self, doc_ids: list[int], signatures: dict) -> list[int]:
+        """
+        Returns the external doc ids in the order of their new internal doc ids.
+        Sorting by minhash signature groups documents which share their minimum hashed term,
+        which two documents do with a probability equal to the Jaccard similarity of their terms.
+        Documents without any terms go last.
+        """
+        if self.reorder == "docid":
+            return sorted(doc_ids)
+        empty = [MINHASH_PRIME] * len(MINHASH_FUNCTIONS)
+        return sorted(doc_ids, key=lambda docId: (signatures.get(docId, empty), docId))
+
+    def save_doc_map(self):
+        """Write the doc id mapping next to the dictionary, or remove a stale one"""
+        if self.doc_map is not None:
+            self.doc_map.save(self.doc_map_file)
+        elif os.path.exists(self.doc_map_file):
+            os.remove(self.doc_map_file)
+
+    def save_stem_cache(self):
+        self.stemmer.save(self.stem_cache_file)
+
+    def to_external_ids(self, doc_ids: list[int]) -> list[int]:
+        """Translate internal doc ids back to the sorted external doc ids"""
+        if self.doc_map is None:
+            return doc_ids
+        return sorted(self.doc_map.to_external(docId) for docId in doc_ids)
 
     def spimi_invert(self, token_stream):
         """
@@ -255,15 +568,19 @@ class Indexer:
 
     def flush_block(self, block_id: int, dict: dict):
         """Writes the dictionary to the block file specified by block_id"""
-        with open(self.get_block_filename(block_id), "w") as inf:
-            for term, docIds in dict.items():
-                inf.write(f"{term}: {docIds}\n")
+        with self.profiler.phase("block flushing"):
+            with open(self.get_block_filename(block_id), "w") as inf:
+                for term, docIds in dict.items():
+                    inf.write(f"{term}: {docIds}\n")
+        self.profiler.record_block(self.get_block_filename(block_id))
 
-    def merge_blocks(self, num_blocks: int, collection_dir: str):
+    def merge_blocks(self, num_blocks: int, collection_dir: str, files=None, remap=None):
         """
         Implements the n-way merge algorithm as described in the lecture slides.
         Maintain num_block pointers to each block file and advance line by line, thus reading in
         posting list by posting list instead of the entire thing at once as desired.
+        The UNIVERSE is made of the given files, or of every file in collection_dir if None.
+        remap maps the external doc ids of the blocks to internal doc ids if given.
         """
         def can_still_process(block_lines):
             """
@@ -284,7 +601,9 @@ class Indexer:
         # As mentioned in the specifications, we will write the postings list with the skip pointers since the index is already constructed here
         # We assume that the dictionary to the WPE fits into memory
         mode = "wb" if self.use_binary else "w"
-        with open(self.out_postings, mode) as out_pf:
+        with self.open_postings_writer(self.out_postings) if self.use_binary else open(
+            self.out_postings, mode
+        ) as out_pf:
             while can_still_process(block_lines):
                 # Extract the terms
                 terms = []
@@ -312,6 +631,8 @@ class Indexer:
                             .replace("]", "")
                             .split(", ")
                         ]
+                        if remap is not None:
+                            doc_ids = sorted(remap[docId] for docId in doc_ids)
                         smallest_term_doc_ids.append(doc_ids)
                         # Advance the file reader, if there are no more lines to read
                         line = block_files[i].readline()
@@ -332,7 +653,7 @@ class Indexer:
                 # Write to out postings
                 out_pf_ptr = out_pf.tell()
                 pl_data = (
-                    pickle.dumps(posting_list) if self.use_binary else str(posting_list)
+                    self.encode_posting_list(posting_list) if self.use_binary else str(posting_list)
                 )
                 out_pf.write(pl_data)
 
@@ -344,13 +665,13 @@ class Indexer:
                 self.word_to_pointer_dict[smallest_term] = wpe
             # We are done with the SPIMI merge here but we are going to add the Universe entry
             universe_posting_list = PostingsList()
-            for file in os.listdir(collection_dir):
-                posting = Posting(value=int(file))
-                universe_posting_list.append(posting)
+            for file in os.listdir(collection_dir) if files is None else files:
+                docId = int(file) if remap is None else remap[int(file)]
+                universe_posting_list.append(Posting(value=docId))
             universe_posting_list.add_skip_pointers()
             out_pf_ptr = out_pf.tell()
             pl_data = (
-                pickle.dumps(universe_posting_list)
+                self.encode_posting_list(universe_posting_list)
                 if self.use_binary
                 else str(universe_posting_list)
             )
@@ -362,11 +683,14 @@ class Indexer:
         # Remember to close them all
         for block_file in block_files:
             block_file.close()
-        with open(self.out_dict, mode) as out_df:
+        with self.profiler.phase("dictionary write"):
             if self.use_binary:
-                pickle.dump(self.word_to_pointer_dict, out_df)
+                self.write_dictionary(self.out_dict, self.word_to_pointer_dict, get_build_id(out_pf))
+                self.postings_base = self.get_postings_base(self.out_postings)
+                self.write_kgram_index(self.kgram_file, self.word_to_pointer_dict)
             else:
-                out_df.write(str(self.word_to_pointer_dict))
+                with open(self.out_dict, mode) as out_df:
+                    out_df.write(str(self.word_to_pointer_dict))
         print("Done indexing!")
 
 
@@ -409,16 +733,16 @@ class Indexer:
         """
         for s in self.dictionary:
             self.dictionary[s].add_skip_pointers()
-        with open(self.out_postings, "wb") as f:
+        with self.open_postings_writer(self.out_postings) as f:
             for word, pl in self.dictionary.items():
                 pointer = f.tell()
-                data = pickle.dumps(pl)
+                data = self.encode_posting_list(pl)
                 f.write(data)
                 self.word_to_pointer_dict[word] = WordToPointerEntry(
                     pointer, len(data), len(pl)
                 )
-        with open(self.out_dict, "wb") as f:
-            pickle.dump(self.word_to_pointer_dict, f)
+        self.write_dictionary(self.out_dict, self.word_to_pointer_dict, get_build_id(f))
+        self.postings_base = self.get_postings_base(self.out_postings)
 
     def load(self):
         """
@@ -426,22 +750,476 @@ class Indexer:
         dictionary is small and can fit entirely into memory.
         used for retrieving the postings list from memory
         """
-        with open(self.out_dict, "rb") as f:
-            self.word_to_pointer_dict = pickle.load(f)
+        if is_container(self.out_dict):
+            self.load_container()
+        else:
+            self.file_format = "pickle"
+            self.postings_base = 0
+            with open(self.out_dict, "rb") as f:
+                header = pickle.load(f)
+                if isinstance(header, IndexHeader):
+                    self.header = header
+                    self.word_to_pointer_dict = pickle.load(f)
+                else:
+                    # Dictionary files from before the header was added only hold the dictionary
+                    self.header = IndexHeader()
+                    self.word_to_pointer_dict = header
+        self.open_postings_handle()
+        self.deltas = []
+        for delta_dict, delta_postings in self.read_manifest():
+            delta = Indexer(delta_dict, delta_postings)
+            delta.load()
+            self.deltas.append(delta)
+        self.deleted = DeletedDocuments.load(self.deleted_file)
+        self.doc_map = DocIdMap.load(self.doc_map_file)
+        self.kgram_index = None
+        self.stemmer.load(self.stem_cache_file)
+
+    def load_container(self):
+        """
+        Loads the dictionary from a dictionary container without unpickling anything.
+        Opening the containers validates that both files are complete and from the same build
+        without reading the postings, the dictionary sections are checked against their crc32.
+        """
+        dictionary = Container(self.out_dict, DICTIONARY_KIND)
+        postings = Container(self.out_postings, POSTINGS_KIND)
+        if dictionary.build_id != postings.build_id:
+            raise CorruptIndexError(
+                f"{self.out_dict} and {self.out_postings} are from different builds"
+            )
+        meta = json.loads(dictionary.read_section("meta"))
+        self.header = IndexHeader(postings_format=meta["postings_format"], codec=meta["codec"])
+        terms = dictionary.read_section("terms").decode()
+        # The character offsets of the ends of the terms
+        ends = unpack_array("Q", dictionary.read_section("term_ends"))
+        pointers = unpack_array("Q", dictionary.read_section("pointers"))
+        lengths = unpack_array("I", dictionary.read_section("lengths"))
+        sizes = unpack_array("I", dictionary.read_section("sizes"))
+        self.word_to_pointer_dict = {}
+        start = 0
+        for i, end in enumerate(ends):
+            self.word_to_pointer_dict[terms[start:end]] = WordToPointerEntry(
+                pointers[i], lengths[i], sizes[i]
+            )
+            start = end
+        self.file_format = "container"
+        self.postings_base = postings.get_offset("postings")
 
-    def get_posting_list(self, word: str, filename=None) -> PostingsList:
+    def write_dictionary(self, filename: str, word_to_pointer_dict: dict, build_id: int = None):
         """
-        Uses low level file operations such as seek and read to read in a Pickle-serialized version,
-        deserialize it into a PostingsList class and then returns it.
+        Write the header followed by the dictionary to the dictionary file, or the dictionary
+        container with the build id of its postings container.
+        """
+        if self.file_format == "container":
+            self.write_dictionary_container(filename, word_to_pointer_dict, build_id)
+            return
+        with open(filename, "wb") as f:
+            pickle.dump(self.header, f)
+            pickle.dump(word_to_pointer_dict, f)
+
+    def write_dictionary_container(self, filename: str, word_to_pointer_dict: dict, build_id: int):
+        """The dictionary is stored column by column: the concatenated terms and an array per field"""
+        terms = list(word_to_pointer_dict)
+        entries = [word_to_pointer_dict[term] for term in terms]
+        universe = word_to_pointer_dict.get(UNIVERSE)
+        meta = {
+            "postings_format": self.header.postings_format,
+            "codec": self.header.codec,
+            "num_terms": len(terms),
+            "num_docs": 0 if universe is None else universe.size,
+        }
+        with ContainerWriter(filename, DICTIONARY_KIND, build_id) as writer:
+            writer.add_section("meta", json.dumps(meta).encode(), alignment=8)
+            writer.add_section("terms", "".join(terms).encode(), alignment=8)
+            writer.add_section(
+                "term_ends", pack_array(array("Q", accumulate(len(term) for term in terms))), alignment=8
+            )
+            writer.add_section(
+                "pointers", pack_array(array("Q", (e.pointer for e in entries))), alignment=8
+            )
+            writer.add_section(
+                "lengths", pack_array(array("I", (e.pointer_offset for e in entries))), alignment=8
+            )
+            writer.add_section("sizes", pack_array(array("I", (e.size for e in entries))), alignment=8)
+
+    def open_postings_writer(self, filename: str):
+        """
+        Open the postings file for writing the posting lists one after the other, as a container
+        whose postings section starts at the first page. Both support write and tell.
+        """
+        if self.file_format == "container":
+            writer = ContainerWriter(filename, POSTINGS_KIND)
+            writer.begin_section("postings")
+            return writer
+        return open(filename, "wb")
+
+    def get_postings_base(self, filename: str) -> int:
+        """Offset of the posting lists in a postings file written in this index's file format"""
+        if self.file_format == "container":
+            return Container(filename).get_offset("postings")
+        return 0
+
+    def verify(self):
+        """Check every section of the containers of all segments against their crc32"""
+        for segment in self.segments():
+            if segment.file_format == "container":
+                Container(segment.out_dict, DICTIONARY_KIND).verify()
+                Container(segment.out_postings, POSTINGS_KIND).verify()
+
+    def write_kgram_index(self, filename: str, word_to_pointer_dict: dict):
+        """Build and write the k-gram index of the terms of the dictionary"""
+        self.kgram_index = KGramIndex.build(term for term in word_to_pointer_dict if term != UNIVERSE)
+        self.kgram_index.save(filename)
+
+    def get_kgram_index(self) -> KGramIndex:
+        """
+        The k-gram index of this segment. It is built in memory from the dictionary
+        for indexes written before k-gram indexes were added.
+        """
+        if self.kgram_index is None:
+            if os.path.exists(self.kgram_file):
+                self.kgram_index = KGramIndex.load(self.kgram_file)
+            else:
+                self.kgram_index = KGramIndex.build(
+                    term for term in self.word_to_pointer_dict if term != UNIVERSE
+                )
+        return self.kgram_index
+
+    def expand_wildcard(self, pattern: str) -> list[str]:
+        """The sorted terms of the main segment and all delta segments matching the wildcard pattern"""
+        terms = set()
+        for segment in self.segments():
+            terms.update(segment.get_kgram_index().expand(pattern))
+        return sorted(terms)
+
+    def encode_posting_list(self, pl: PostingsList) -> bytes:
+        """Serialize the posting list in the postings format of the index"""
+        if self.header.postings_format == "blocks":
+            return encode_postings([p.value for p in pl.plist], self.header.codec)
+        return pickle.dumps(pl)
+
+    def decode_posting_data(self, data: bytes) -> PostingsList:
+        """Deserialize a posting list read from the postings file"""
+        if self.header.postings_format == "blocks":
+            pl = PostingsList()
+            pl.plist = [Posting(value) for value in decode_postings(data, self.header.codec)]
+            pl.set_skip_pointers()
+            return pl
+        return pickle.loads(data)
+
+    def open_postings_mmap(self):
+        """
+        Memory-maps the postings file read-only so that reading a posting list becomes a slice
+        of the shared page cache instead of an open, seek and read per term.
+        Worker processes forked after this call share the same mapping.
+        """
+        with open(self.out_postings, "rb") as f:
+            self.postings_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for delta in self.deltas:
+            delta.open_postings_mmap()
+
+    def open_postings_handle(self):
+        """
+        Opens the postings file for the reads of read_posting_data. The file stays open until the
+        next load, so a merge which replaces or removes it does not change what is read until then.
+        """
+        if self.postings_handle is not None:
+            self.postings_handle.close()
+        self.postings_handle = None
+        if os.path.exists(self.out_postings):
+            self.postings_handle = open(self.out_postings, "rb")
+
+    def read_postings_handle(self, pointer: int, length: int) -> bytes:
+        """Reads from the open postings file, which the search threads and forked workers share"""
+        if hasattr(os, "pread"):
+            # pread does not move the shared file offset
+            return os.pread(self.postings_handle.fileno(), length, pointer)
+        with self.postings_read_lock:
+            self.postings_handle.seek(pointer)
+            return self.postings_handle.read(length)
+
+    def read_posting_data(self, word: str, filename=None) -> bytes:
+        """
+        Uses low level file operations such as seek and read to read in the Pickle-serialized
+        posting list of the word without deserializing it. Reads from the memory-mapped postings
+        file, or the postings file opened by load, instead if there is one.
+        Returns None if the word is not in the dictionary.
         """
         filename = self.out_postings if filename is None else filename
-        if word not in self.word_to_pointer_dict or not os.path.exists(filename):
-            return PostingsList()
+        if word not in self.word_to_pointer_dict:
+            return None
+        entry = self.word_to_pointer_dict[word]
+        pointer = entry.pointer
+        if filename == self.out_postings:
+            pointer += self.postings_base
+            if self.postings_mmap is not None:
+                return self.postings_mmap[pointer : pointer + entry.pointer_offset]
+            if self.postings_handle is not None:
+                return self.read_postings_handle(pointer, entry.pointer_offset)
+        if not os.path.exists(filename):
+            return None
         with open(filename, "rb") as f:
-            entry = self.word_to_pointer_dict[word]
-            f.seek(entry.pointer)
-            data = f.read(entry.pointer_offset)
-        return pickle.loads(data)
+            f.seek(pointer)
+            return f.read(entry.pointer_offset)
+
+    def get_segment_posting_list(self, word: str, filename=None) -> PostingsList:
+        """
+        Reads in the serialized posting list of the word from this segment only, deserialize it
+        into a PostingsList class and then returns it.
+        """
+        data = self.read_posting_data(word, filename)
+        if data is None:
+            return PostingsList()
+        return self.decode_posting_data(data)
+
+    def get_posting_list(self, word: str, filename=None) -> PostingsList:
+        """
+        Returns the posting list of the word across the main segment and all delta segments.
+        """
+        pl = self.get_segment_posting_list(word, filename)
+        if filename is None and self.deltas:
+            pl = merge_posting_lists([pl] + [d.get_segment_posting_list(word) for d in self.deltas])
+        return self.filter_deleted(pl)
+
+    def filter_deleted(self, pl: PostingsList, deleted: DeletedDocuments = None) -> PostingsList:
+        """Drop the deleted documents from the posting list, including from the UNIVERSE"""
+        deleted = self.deleted if deleted is None else deleted
+        if not deleted:
+            return pl
+        filtered = PostingsList()
+        filtered.plist = [p for p in pl.plist if p.value not in deleted]
+        if len(filtered) != len(pl):
+            # The old skip pointers index into the unfiltered list
+            filtered.add_skip_pointers()
+        return filtered
+
+    def delete_documents(self, doc_ids: list[int]) -> list[int]:
+        """
+        Mark the documents as deleted in the tombstone bitmap without rewriting any postings.
+        The postings of the deleted documents are purged at the next merge_segments.
+        doc_ids are external doc ids, those which are not in the index or already deleted are
+        ignored. Returns the doc ids which were deleted.
+        """
+        if not self.word_to_pointer_dict:
+            self.load()
+        deleted_ids = []
+        with self.segments_lock:
+            self.deleted = DeletedDocuments.load(self.deleted_file)
+            self.doc_map = DocIdMap.load(self.doc_map_file)
+            # The (internal) doc ids of the main segment and the deltas which are not deleted yet
+            indexed = {posting.value for posting in self.get_posting_list(UNIVERSE).plist}
+            for external_id in doc_ids:
+                docId = external_id if self.doc_map is None else self.doc_map.to_internal(external_id)
+                if docId is None or docId not in indexed:
+                    continue
+                self.deleted.add(docId)
+                indexed.discard(docId)
+                deleted_ids.append(external_id)
+            if deleted_ids:
+                self.deleted.save(self.deleted_file)
+        return deleted_ids
+
+    def get_df(self, word: str) -> int:
+        """Document frequency of the word in the main segment as recorded in the dictionary"""
+        entry = self.word_to_pointer_dict.get(word)
+        return 0 if entry is None else entry.size
+
+    def has_exact_sizes(self) -> bool:
+        """Whether the posting list sizes in the dictionary are exact, with no deltas or deletions"""
+        return not self.deltas and not self.deleted
+
+    def can_use_cursors(self) -> bool:
+        """Whether posting lists can be probed with a BlockCursor instead of being read in full"""
+        return self.header.postings_format == "blocks" and not self.deltas
+
+    def open_cursor(self, word: str) -> BlockCursor:
+        """
+        Open a BlockCursor over the posting list of the word in the memory-mapped postings file.
+        Returns None if the word is not in the dictionary.
+        The cursor does not filter deleted documents so its results should be intersected with
+        doc ids that have already been filtered.
+        """
+        if word not in self.word_to_pointer_dict:
+            return None
+        if self.postings_mmap is None:
+            self.open_postings_mmap()
+        postings_mmap = self.postings_mmap
+        return BlockCursor(
+            lambda offset, length: postings_mmap[offset : offset + length],
+            self.postings_base + self.word_to_pointer_dict[word].pointer,
+            self.header.codec,
+        )
+
+    def segments(self) -> list["Indexer"]:
+        """The main segment followed by the delta segments"""
+        return [self] + self.deltas
+
+    """
+    INCREMENTAL INDEXING
+    """
+
+    def read_manifest(self) -> list[tuple[str, str]]:
+        """Returns the (dictionary, postings) file paths of the delta segments"""
+        return read_manifest_file(self.manifest_file)
+
+    def write_manifest(self):
+        """Atomically replace the manifest with the current list of delta segments"""
+        write_manifest_file(
+            self.manifest_file, [(delta.out_dict, delta.out_postings) for delta in self.deltas]
+        )
+
+    def get_delta_paths(self, delta_id: int) -> tuple[str, str]:
+        """Helper method to obtain the dictionary and postings filenames of a delta segment"""
+        dict_root, dict_ext = os.path.splitext(self.out_dict)
+        postings_root, postings_ext = os.path.splitext(self.out_postings)
+        return (
+            f"{dict_root}.delta{delta_id}{dict_ext}",
+            f"{postings_root}.delta{delta_id}{postings_ext}",
+        )
+
+    def get_num_docs(self) -> int:
+        """Number of documents in this segment, read off the size of its UNIVERSE"""
+        entry = self.word_to_pointer_dict.get(UNIVERSE)
+        return 0 if entry is None else entry.size
+
+    def add_documents(self, collection_dir, files=None):
+        """
+        Index the new documents of collection_dir (or only the given files) into a new delta
+        segment instead of re-indexing the whole collection. The documents are assumed to not be
+        in the index yet. Starts a background merge if the merge policy says so.
+        If the index reassigned its doc ids, the new documents get the next internal doc ids.
+        """
+        # Reloading replaces the deltas the running merge is folding in
+        self.wait_for_merge()
+        with self.segments_lock:
+            self.load()
+            delta_id = 0
+            taken = {delta.out_dict for delta in self.deltas}
+            while self.get_delta_paths(delta_id)[0] in taken:
+                delta_id += 1
+            delta_dict, delta_postings = self.get_delta_paths(delta_id)
+            delta = Indexer(
+                delta_dict,
+                delta_postings,
+                block_dir=self.block_dir,
+                block_size=self.block_size,
+                postings_format=self.header.postings_format,
+                codec=self.header.codec,
+                file_format=self.file_format,
+            )
+            # Stem with the cache of the main segment, which is kept up to date
+            delta.stemmer = self.stemmer
+            files = list(os.listdir(collection_dir)) if files is None else files
+            doc_ids = None
+            if self.doc_map is not None:
+                doc_ids = range(len(self.doc_map), len(self.doc_map) + len(files))
+            delta.index_collection(collection_dir, files, doc_ids)
+            if self.doc_map is not None:
+                self.doc_map.extend([int(file) for file in files])
+                self.save_doc_map()
+            self.deltas.append(delta)
+            self.write_manifest()
+            self.save_stem_cache()
+        if self.should_merge():
+            self.merge_in_background()
+
+    def should_merge(self) -> bool:
+        """The merge policy for folding the delta segments into the main segment"""
+        delta_docs = sum(delta.get_num_docs() for delta in self.deltas)
+        return (
+            len(self.deltas) > self.max_deltas
+            or delta_docs > self.merge_ratio * self.get_num_docs()
+        )
+
+    def merge_in_background(self) -> threading.Thread:
+        """
+        Start merging the delta segments on a background thread unless a merge is already running.
+        The thread is not a daemon so that the process waits for the merge before exiting.
+        """
+        if self.merge_thread is not None and self.merge_thread.is_alive():
+            return self.merge_thread
+        self.merge_thread = threading.Thread(target=self.merge_segments)
+        self.merge_thread.start()
+        return self.merge_thread
+
+    def wait_for_merge(self):
+        """Block until the background merge, if any, is done"""
+        if self.merge_thread is not None:
+            self.merge_thread.join()
+
+    def merge_segments(self):
+        """
+        Fold the current delta segments into the main segment.
+        Writes the merged postings and dictionary to temporary files and moves them over the main
+        segment's files. Other Indexers which loaded the index before keep reading the old files,
+        which they hold open (or memory-mapped), and only see the merge once they load it again.
+        Deltas added while the merge runs stay in the manifest.
+        The postings of deleted documents are purged, after which their tombstones can be dropped.
+        """
+        with self.segments_lock:
+            merging = list(self.deltas)
+            deleted = self.deleted
+        if not merging and not deleted:
+            return
+        segments = [self] + merging
+        terms = sorted(set().union(*[segment.word_to_pointer_dict for segment in segments]))
+        tmp_postings, tmp_dict = f"{self.out_postings}.merging", f"{self.out_dict}.merging"
+        word_to_pointer_dict = {}
+        with self.open_postings_writer(tmp_postings) as out_pf:
+            for term in terms:
+                posting_list = merge_posting_lists(
+                    [segment.get_segment_posting_list(term) for segment in segments]
+                )
+                posting_list = self.filter_deleted(posting_list, deleted)
+                if not posting_list and term != UNIVERSE:
+                    continue
+                out_pf_ptr = out_pf.tell()
+                pl_data = self.encode_posting_list(posting_list)
+                out_pf.write(pl_data)
+                word_to_pointer_dict[term] = WordToPointerEntry(
+                    out_pf_ptr, len(pl_data), len(posting_list)
+                )
+        self.write_dictionary(tmp_dict, word_to_pointer_dict, get_build_id(out_pf))
+        postings_base = self.get_postings_base(tmp_postings)
+        kgram_index = KGramIndex.build(term for term in word_to_pointer_dict if term != UNIVERSE)
+        kgram_index.save(f"{self.kgram_file}.merging")
+        with self.segments_lock:
+            os.replace(tmp_postings, self.out_postings)
+            os.replace(tmp_dict, self.out_dict)
+            os.replace(f"{self.kgram_file}.merging", self.kgram_file)
+            self.word_to_pointer_dict = word_to_pointer_dict
+            self.postings_base = postings_base
+            self.kgram_index = kgram_index
+            # add_documents may have reloaded the deltas since, so they are matched by file
+            merged = {delta.out_dict for delta in merging}
+            self.deltas = [delta for delta in self.deltas if delta.out_dict not in merged]
+            self.write_manifest()
+            # Tombstones must be kept for documents that may still be in deltas added since
+            # and for documents deleted while the merge was running
+            if not self.deltas and self.deleted is deleted and os.path.exists(self.deleted_file):
+                os.remove(self.deleted_file)
+                self.deleted = DeletedDocuments()
+            self.open_postings_handle()
+            if self.postings_mmap is not None:
+                self.open_postings_mmap()
+        for delta in merging:
+            for path in [delta.out_dict, delta.out_postings, delta.kgram_file]:
+                if os.path.exists(path):
+                    os.remove(path)
+        print(f"Merged {len(merging)} delta segments and purged {len(deleted)} deleted documents")
+
+    def clear_segments(self):
+        """Drop all delta segments and tombstones, used after a full re-index of the collection"""
+        for delta_dict, delta_postings in self.read_manifest():
+            for path in [delta_dict, delta_postings, f"{delta_dict}.kgrams"]:
+                if os.path.exists(path):
+                    os.remove(path)
+        if os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+        self.deltas = []
+        if os.path.exists(self.deleted_file):
+            os.remove(self.deleted_file)
+        self.deleted = DeletedDocuments()
 
     def get_full_postings(self):
         """
@@ -455,16 +1233,177 @@ class Indexer:
         return ans
 
 
-def build_index(in_dir, out_dict, out_postings):
+"""
+SHARDING
+"""
+
+
+def get_shards_manifest(out_dict: str) -> str:
+    """The manifest listing the shards of a sharded index, next to the dictionary file"""
+    return f"{out_dict}.shards"
+
+
+def get_shard_paths(out_dict: str, out_postings: str, shard_id: int) -> tuple[str, str]:
+    """Helper method to obtain the dictionary and postings filenames of a shard"""
+    dict_root, dict_ext = os.path.splitext(out_dict)
+    postings_root, postings_ext = os.path.splitext(out_postings)
+    return (
+        f"{dict_root}.shard{shard_id}{dict_ext}",
+        f"{postings_root}.shard{shard_id}{postings_ext}",
+    )
+
+
+def read_shards(out_dict: str) -> list[tuple[str, str]]:
+    """
+    Returns the (dictionary, postings) file paths of the shards in doc id order,
+    or an empty list if the index is not sharded.
+    """
+    return read_manifest_file(get_shards_manifest(out_dict))
+
+
+def partition_documents(files: list[str], num_shards: int) -> list[list[str]]:
+    """Split the documents into num_shards contiguous doc id ranges of about the same size"""
+    files = sorted(files, key=int)
+    shard_size = math.ceil(len(files) / num_shards)
+    return [files[i : i + shard_size] for i in range(0, len(files), shard_size)]
+
+
+def clear_shards(out_dict: str):
+    """Remove every file of the shards of an earlier sharded build and the shards manifest"""
+    for shard_dict, shard_postings in read_shards(out_dict):
+        shard = Indexer(shard_dict, shard_postings)
+        shard.clear_segments()
+        for path in [
+            shard_dict,
+            shard_postings,
+            shard.doc_map_file,
+            shard.kgram_file,
+            shard.stem_cache_file,
+        ]:
+            if os.path.exists(path):
+                os.remove(path)
+    if os.path.exists(get_shards_manifest(out_dict)):
+        os.remove(get_shards_manifest(out_dict))
+
+
+def build_index(
+    in_dir,
+    out_dict,
+    out_postings,
+    postings_format="pickle",
+    codec="vb",
+    reorder="none",
+    num_shards=1,
+    file_format="pickle",
+    report_file=None,
+    trace_allocations=False,
+):
     """
     build index from documents stored in the input directory,
     then output the dictionary file and postings file
+    num_shards > 1 partitions the documents by doc id range into shards which each get their own
+    dictionary, postings and UNIVERSE, listed in the shards manifest of the dictionary file
+    the phase timings and memory usage of the build are saved as JSON to report_file if given,
+    with the top allocations of every phase if trace_allocations, which slows down the build
     """
     print(
         f"indexing {in_dir} to dictionary file {out_dict} and postings file {out_postings}"
     )
+    profiler = BuildProfiler(enabled=report_file is not None, trace_allocations=trace_allocations)
+    profiler.info.update(
+        collection=in_dir,
+        num_docs=len(os.listdir(in_dir)),
+        num_shards=num_shards,
+        postings_format=postings_format,
+        codec=codec,
+        reorder=reorder,
+        file_format=file_format,
+    )
+    clear_shards(out_dict)
+    profiler.start()
+    if num_shards > 1:
+        shards = []
+        for shard_id, files in enumerate(partition_documents(os.listdir(in_dir), num_shards)):
+            shard_dict, shard_postings = get_shard_paths(out_dict, out_postings, shard_id)
+            print(f"indexing shard {shard_id} of doc ids {files[0]} to {files[-1]}")
+            indexer = Indexer(
+                shard_dict,
+                shard_postings,
+                postings_format=postings_format,
+                codec=codec,
+                reorder=reorder,
+                file_format=file_format,
+            )
+            indexer.profiler = profiler
+            indexer.index_collection(in_dir, files)
+            indexer.save_stem_cache()
+            indexer.clear_segments()
+            shards.append((shard_dict, shard_postings))
+        write_manifest_file(get_shards_manifest(out_dict), shards)
+    else:
+        indexer = Indexer(
+            out_dict,
+            out_postings,
+            postings_format=postings_format,
+            codec=codec,
+            reorder=reorder,
+            file_format=file_format,
+        )
+        indexer.profiler = profiler
+        indexer.index_collection(in_dir)
+        indexer.save_stem_cache()
+        # The full index already contains the documents of any earlier delta segments
+        indexer.clear_segments()
+    profiler.stop()
+    if report_file is not None:
+        profiler.save(report_file)
+        print(f"build report saved to {report_file}")
+
+
+def append_index(in_dir, out_dict, out_postings):
+    """
+    index the documents stored in the input directory into a new delta segment
+    of the existing dictionary file and postings file
+    the documents of a sharded index are appended to its last shard
+    """
+    out_dict, out_postings = (read_shards(out_dict) or [(out_dict, out_postings)])[-1]
+    print(f"appending {in_dir} to dictionary file {out_dict} and postings file {out_postings}")
     indexer = Indexer(out_dict, out_postings)
-    indexer.index_collection(in_dir)
+    indexer.add_documents(in_dir)
+    indexer.wait_for_merge()
+
+
+def delete_from_index(doc_ids_file, out_dict, out_postings):
+    """
+    mark the whitespace separated doc ids in doc_ids_file as deleted in the existing index
+    """
+    with open(doc_ids_file, "r") as f:
+        doc_ids = [int(docId) for docId in f.read().split()]
+    for shard_dict, shard_postings in read_shards(out_dict) or [(out_dict, out_postings)]:
+        indexer = Indexer(shard_dict, shard_postings)
+        deleted = indexer.delete_documents(doc_ids)
+        print(f"deleted {len(deleted)} of {len(doc_ids)} documents from dictionary file {shard_dict}")
+
+
+def merge_index(out_dict, out_postings):
+    """
+    merge the delta segments into the main segment and purge the deleted documents
+    """
+    for shard_dict, shard_postings in read_shards(out_dict) or [(out_dict, out_postings)]:
+        indexer = Indexer(shard_dict, shard_postings)
+        indexer.load()
+        indexer.merge_segments()
+
+
+def verify_index(out_dict, out_postings):
+    """
+    check every section of the index containers, including those of every delta segment and shard
+    """
+    for shard_dict, shard_postings in read_shards(out_dict) or [(out_dict, out_postings)]:
+        indexer = Indexer(shard_dict, shard_postings)
+        indexer.load()
+        indexer.verify()
+        print(f"verified dictionary file {shard_dict} and postings file {shard_postings}")
 
 
 def compare(in_dir, out_dict, out_postings):
@@ -528,14 +1467,38 @@ def usage():
     print(
         "usage: "
         + sys.argv[0]
-        + " -i directory-of-documents -d dictionary-file -p postings-file"
+        + " -i directory-of-documents -d dictionary-file -p postings-file [-a] [-f postings-format] [-c codec] [-r reorder] [-s number-of-shards] [-F file-format] [-j report-file [-M]]"
     )
+    print(f"  -f: one of {POSTINGS_FORMATS}, defaults to pickle")
+    print(f"  -c: codec of the blocks postings format, one of {list(CODECS)}, defaults to vb")
+    print(f"  -r: reassignment of the internal doc ids, one of {REORDERINGS}, defaults to none")
+    print(f"  -F: layout of the dictionary and postings files, one of {FILE_FORMATS}, defaults to pickle")
+    print("  -s: partition the documents by doc id range into that many shards")
+    print("  -j: save the phase timings, peak memory and block sizes of the build as JSON")
+    print("  -M: also trace the top allocations of every phase for -j, slows down the build")
+    print("  -a: append the documents as a delta segment of the existing index")
+    print("   or: " + sys.argv[0] + " -x file-of-doc-ids -d dictionary-file -p postings-file")
+    print("  -x: mark the doc ids as deleted in the existing index")
+    print("   or: " + sys.argv[0] + " -m -d dictionary-file -p postings-file")
+    print("  -m: merge the delta segments and purge the deleted documents")
+    print("   or: " + sys.argv[0] + " -v -d dictionary-file -p postings-file")
+    print("  -v: check the checksums of every section of the index containers")
 
 
 if __name__ == "__main__":
     input_directory = output_file_dictionary = output_file_postings = None
+    append = merge_now = False
+    deleted_doc_ids_file = None
+    postings_format = "pickle"
+    codec = "vb"
+    reorder = "none"
+    num_shards = 1
+    file_format = "pickle"
+    verify_now = False
+    report_file = None
+    trace_allocations = False
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "i:d:p:")
+        opts, args = getopt.getopt(sys.argv[1:], "i:d:p:ax:mf:c:r:s:F:vj:M")
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -547,17 +1510,64 @@ if __name__ == "__main__":
             output_file_dictionary = a
         elif o == "-p":  # postings file
             output_file_postings = a
+        elif o == "-a":  # append to the existing index
+            append = True
+        elif o == "-x":  # file of doc ids to delete
+            deleted_doc_ids_file = a
+        elif o == "-m":  # merge segments and purge deletions
+            merge_now = True
+        elif o == "-f":  # postings format
+            postings_format = a
+        elif o == "-c":  # codec of the blocks postings format
+            codec = a
+        elif o == "-r":  # reassignment of the internal doc ids
+            reorder = a
+        elif o == "-s":  # number of shards
+            num_shards = int(a)
+        elif o == "-F":  # layout of the dictionary and postings files
+            file_format = a
+        elif o == "-v":  # verify the checksums of the index
+            verify_now = True
+        elif o == "-j":  # build report file
+            report_file = a
+        elif o == "-M":  # trace the allocations of the build
+            trace_allocations = True
         else:
             assert False, "unhandled option"
 
     if (
-        input_directory == None
+        (
+            input_directory == None
+            and deleted_doc_ids_file == None
+            and not merge_now
+            and not verify_now
+        )
         or output_file_postings == None
         or output_file_dictionary == None
     ):
         usage()
         sys.exit(2)
 
-    build_index(input_directory, output_file_dictionary, output_file_postings)
+    if verify_now:
+        verify_index(output_file_dictionary, output_file_postings)
+    elif deleted_doc_ids_file is not None:
+        delete_from_index(deleted_doc_ids_file, output_file_dictionary, output_file_postings)
+    elif merge_now:
+        merge_index(output_file_dictionary, output_file_postings)
+    elif append:
+        append_index(input_directory, output_file_dictionary, output_file_postings)
+    else:
+        build_index(
+            input_directory,
+            output_file_dictionary,
+            output_file_postings,
+            postings_format,
+            codec,
+            reorder,
+            num_shards,
+            file_format,
+            report_file,
+            trace_allocations,
+        )
     # test_get_posting_lists(output_file_dictionary, output_file_postings)
     # python3 index.py -i ./reuters/small-training -d dictionary.txt -p postings.txt
@@ -0,0 +1,218 @@
+"""
+Versioned, checksummed binary container for the dictionary and postings files of the index.
+
+A container is a header, page-aligned sections, a section table and a footer:
+    header: magic, format version, kind of file, number of sections, offset of the section table,
+            length of the whole file and the build id, followed by the crc32 of the header
+    sections: raw bytes, page-aligned by default so that they can be memory-mapped on their own,
+              small sections may only be aligned to 8 bytes for reading them as arrays
+    section table: name, offset, length and crc32 of every section
+    footer: length of the whole file, crc32 of the section table and FOOTER_MAGIC
+
+Opening a container only reads the header, the footer and the section table, so validating that
+the file is complete costs O(1) no matter how large the sections are. The sections are checked
+against their crc32 with verify. Containers are written to a temporary file which is only moved
+over the target once it is complete, so a half-written container is never visible under its name.
+The dictionary and postings containers of one index share a random build id, which lets the
+reader detect a dictionary paired with the postings of another build.
+All integers are little-endian.
+"""
+from array import array
+from struct import pack, unpack_from, calcsize
+import mmap
+import os
+import sys
+import zlib
+
+MAGIC = b"CS3245IX"
+FOOTER_MAGIC = b"IXFOOTER"
+VERSION = 1
+ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+# magic, version, kind, number of sections, section table offset, file length, build id
+HEADER_FORMAT = "<8sH2x4sIQQQ"
+HEADER_SIZE = calcsize(HEADER_FORMAT) + 4
+# name, offset, length, crc32
+SECTION_FORMAT = "<16sQQI4x"
+SECTION_SIZE = calcsize(SECTION_FORMAT)
+# file length, section table crc32, footer magic
+FOOTER_FORMAT = "<QI4x8s"
+FOOTER_SIZE = calcsize(FOOTER_FORMAT)
+
+
+class CorruptIndexError(ValueError):
+    """Raised when a container is truncated, corrupted or of an unsupported version"""
+
+
+def is_container(filename: str) -> bool:
+    """Whether the file starts with the container magic"""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def pack_array(values: array) -> bytes:
+    """The bytes of the array in little-endian order"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_array(typecode: str, data: bytes) -> array:
+    """Read back an array written by pack_array"""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class ContainerWriter:
+    """
+    Writes a container section by section to a temporary file which is moved over filename on
+    close. Used as a context manager, the temporary file is removed if an exception is raised.
+    """
+
+    def __init__(self, filename: str, kind: bytes, build_id: int = None) -> None:
+        self.filename = filename
+        self.tmp_file = f"{filename}.tmp"
+        self.kind = kind
+        self.build_id = int.from_bytes(os.urandom(8), "little") if build_id is None else build_id
+        self.f = open(self.tmp_file, "wb")
+        self.f.write(bytes(HEADER_SIZE))
+        self.sections = []
+        # The name, start offset and running crc32 of the section being written
+        self.current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def align(self, alignment: int):
+        padding = -self.f.tell() % alignment
+        self.f.write(bytes(padding))
+
+    def begin_section(self, name: str, alignment: int = ALIGNMENT):
+        if self.current is not None:
+            self.end_section()
+        self.align(alignment)
+        self.current = [name, self.f.tell(), 0]
+
+    def write(self, data: bytes):
+        self.f.write(data)
+        self.current[2] = zlib.crc32(data, self.current[2])
+
+    def tell(self) -> int:
+        """The offset in the current section"""
+        return self.f.tell() - self.current[1]
+
+    def end_section(self):
+        name, start, crc = self.current
+        self.sections.append((name, start, self.f.tell() - start, crc))
+        self.current = None
+
+    def add_section(self, name: str, data: bytes, alignment: int = ALIGNMENT):
+        self.begin_section(name, alignment)
+        self.write(data)
+        self.end_section()
+
+    def close(self):
+        if self.current is not None:
+            self.end_section()
+        self.align(8)
+        table_offset = self.f.tell()
+        table = b"".join(
+            pack(SECTION_FORMAT, name.encode(), offset, length, crc)
+            for name, offset, length, crc in self.sections
+        )
+        self.f.write(table)
+        length = self.f.tell() + FOOTER_SIZE
+        self.f.write(pack(FOOTER_FORMAT, length, zlib.crc32(table), FOOTER_MAGIC))
+        header = pack(
+            HEADER_FORMAT, MAGIC, VERSION, self.kind, len(self.sections), table_offset, length, self.build_id
+        )
+        self.f.seek(0)
+        self.f.write(header + pack("<I", zlib.crc32(header)))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        os.replace(self.tmp_file, self.filename)
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.tmp_file)
+
+
+class Container:
+    """
+    Read access to a container. Opening it validates the header, the footer and the section table.
+    """
+
+    def __init__(self, filename: str, kind: bytes = None) -> None:
+        self.filename = filename
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE + FOOTER_SIZE:
+                raise CorruptIndexError(f"{filename} is truncated")
+            header = f.read(HEADER_SIZE)
+            f.seek(size - FOOTER_SIZE)
+            footer = f.read(FOOTER_SIZE)
+            magic, version, self.kind, num_sections, table_offset, length, self.build_id = unpack_from(
+                HEADER_FORMAT, header
+            )
+            if magic != MAGIC:
+                raise CorruptIndexError(f"{filename} is not an index container")
+            if unpack_from("<I", header, HEADER_SIZE - 4)[0] != zlib.crc32(header[: HEADER_SIZE - 4]):
+                raise CorruptIndexError(f"{filename} has a corrupted header")
+            if version != VERSION:
+                raise CorruptIndexError(f"{filename} has unsupported version {version}")
+            if kind is not None and self.kind != kind:
+                raise CorruptIndexError(f"{filename} is a {self.kind} container instead of {kind}")
+            footer_length, table_crc, footer_magic = unpack_from(FOOTER_FORMAT, footer)
+            if footer_magic != FOOTER_MAGIC or length != size or footer_length != size:
+                raise CorruptIndexError(f"{filename} is incomplete")
+            f.seek(table_offset)
+            table = f.read(SECTION_SIZE * num_sections)
+        if zlib.crc32(table) != table_crc:
+            raise CorruptIndexError(f"{filename} has a corrupted section table")
+        # Section name to (offset, length, crc32)
+        self.sections = {}
+        for i in range(num_sections):
+            name, offset, section_length, crc = unpack_from(SECTION_FORMAT, table, SECTION_SIZE * i)
+            self.sections[name.rstrip(b"\0").decode()] = (offset, section_length, crc)
+
+    def get_offset(self, name: str) -> int:
+        return self.sections[name][0]
+
+    def read_section(self, name: str, verify: bool = True) -> bytes:
+        """Read a whole section, checking it against its crc32 unless verify is False"""
+        if name not in self.sections:
+            raise CorruptIndexError(f"{self.filename} has no {name} section")
+        offset, length, crc = self.sections[name]
+        with open(self.filename, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if verify and zlib.crc32(data) != crc:
+            raise CorruptIndexError(f"{self.filename} has a corrupted {name} section")
+        return data
+
+    def verify(self):
+        """Check every section against its crc32, reading them in chunks"""
+        with open(self.filename, "rb") as f:
+            for name, (offset, length, crc) in self.sections.items():
+                f.seek(offset)
+                actual = 0
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    actual = zlib.crc32(chunk, actual)
+                    remaining -= len(chunk)
+                if actual != crc:
+                    raise CorruptIndexError(f"{self.filename} has a corrupted {name} section")
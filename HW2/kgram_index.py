@@ -0,0 +1,93 @@
+"""
+K-gram index over the vocabulary of an index segment for wildcard term queries such as 'comput*'.
+
+Every term is padded with BOUNDARY on both sides and indexed under each of its k-grams for
+k in K_VALUES, the bigrams being needed for short prefixes and suffixes such as 'c*'. A wildcard
+pattern is expanded by intersecting the k-gram posting lists of its fixed fragments, which gives
+a superset of the matching terms, and then filtering the candidates against the pattern itself.
+
+The k-gram posting lists are sorted uint32 ids into the sorted vocabulary and are pickled as raw
+bytes together with the vocabulary, so that loading the file does not need any of our classes.
+"""
+from array import array
+import os
+import pickle
+import re
+
+K_VALUES = (2, 3)
+BOUNDARY = "$"
+WILDCARD = "*"
+
+
+def is_wildcard(token: str) -> bool:
+    return WILDCARD in token
+
+
+def kgrams(text: str, k: int) -> set[str]:
+    """The distinct k-grams of the text"""
+    return {text[i : i + k] for i in range(len(text) - k + 1)}
+
+
+class KGramIndex:
+    """K-gram index of the vocabulary of one index segment"""
+
+    def __init__(self, terms: list[str] = None, postings: dict = None) -> None:
+        # The sorted vocabulary, the k-gram postings hold indexes into it
+        self.terms = [] if terms is None else terms
+        # k-gram to the raw bytes of its array of term ids
+        self.postings = {} if postings is None else postings
+
+    @staticmethod
+    def build(terms) -> "KGramIndex":
+        terms = sorted(terms)
+        postings = {}
+        for term_id, term in enumerate(terms):
+            padded = f"{BOUNDARY}{term}{BOUNDARY}"
+            for k in K_VALUES:
+                for kgram in kgrams(padded, k):
+                    postings.setdefault(kgram, array("I")).append(term_id)
+        return KGramIndex(terms, {kgram: ids.tobytes() for kgram, ids in postings.items()})
+
+    @staticmethod
+    def load(filename: str) -> "KGramIndex":
+        with open(filename, "rb") as f:
+            terms, postings = pickle.load(f)
+        return KGramIndex(terms, postings)
+
+    def save(self, filename: str):
+        """Atomically replace the k-gram index file"""
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump((self.terms, self.postings), f)
+        os.replace(tmp_file, filename)
+
+    def get_term_ids(self, kgram: str) -> array:
+        ids = array("I")
+        ids.frombytes(self.postings.get(kgram, b""))
+        return ids
+
+    def expand(self, pattern: str) -> list[str]:
+        """Returns the sorted terms of the vocabulary which match the wildcard pattern"""
+        padded = f"{BOUNDARY}{pattern}{BOUNDARY}"
+        # Use the longest k-grams of every fragment between the wildcards, they are the most selective
+        query_kgrams = set()
+        for fragment in padded.split(WILDCARD):
+            for k in sorted(K_VALUES, reverse=True):
+                if len(fragment) >= k:
+                    query_kgrams |= kgrams(fragment, k)
+                    break
+        if query_kgrams:
+            # Intersect starting from the shortest k-gram posting list
+            lists = sorted((self.get_term_ids(kgram) for kgram in query_kgrams), key=len)
+            candidate_ids = set(lists[0])
+            for ids in lists[1:]:
+                if not candidate_ids:
+                    break
+                candidate_ids.intersection_update(ids)
+            candidates = [self.terms[term_id] for term_id in sorted(candidate_ids)]
+        else:
+            # Patterns such as '*' or '*a*' have no k-gram to look up
+            candidates = self.terms
+        # The k-grams may match in the wrong order or overlap, so check the pattern itself
+        regex = re.compile(".*".join(re.escape(part) for part in pattern.split(WILDCARD)), re.DOTALL)
+        return [term for term in candidates if regex.fullmatch(term)]
@@ -0,0 +1,157 @@
+"""
+Integer codecs for the gap-encoded doc ids of block_postings.
+
+Every codec encodes a list of non-negative integers into bytes and decodes them back given how
+many integers there are, since the bit-aligned codecs pad their last byte with zeros.
+The Elias codecs can only represent positive integers so they encode n + 1.
+"""
+from struct import pack, unpack_from
+
+
+class VariableByteCodec:
+    """Variable-byte encoding with 7 data bits per byte and the stop bit set on the last byte"""
+
+    name = "vb"
+
+    @staticmethod
+    def encode_number(number: int) -> bytes:
+        b = []
+        while True:
+            b.insert(0, number % 128)
+            if number < 128:
+                break
+            number = number // 128
+        b[-1] += 128
+        return pack("%dB" % len(b), *b)
+
+    def encode(self, numbers: list[int]) -> bytes:
+        return b"".join(self.encode_number(number) for number in numbers)
+
+    def decode(self, bytestream: bytes, count: int) -> list[int]:
+        n = 0
+        numbers = []
+        for byte in bytestream:
+            if byte < 128:
+                n = 128 * n + byte
+            else:
+                n = 128 * n + (byte - 128)
+                numbers.append(n)
+                n = 0
+        return numbers
+
+
+def bits_to_bytes(bits: str) -> bytes:
+    """Pack a string of '0' and '1' into bytes, padding the last byte with zeros"""
+    if not bits:
+        return b""
+    bits += "0" * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+
+def bytes_to_bits(data: bytes) -> str:
+    return bin(int.from_bytes(data, "big"))[2:].zfill(len(data) * 8) if data else ""
+
+
+class EliasGammaCodec:
+    """
+    Elias-gamma encoding: the length of the number in unary (as leading zeros)
+    followed by its binary representation.
+    """
+
+    name = "gamma"
+
+    def encode(self, numbers: list[int]) -> bytes:
+        bits = []
+        for number in numbers:
+            binary = bin(number + 1)[2:]
+            bits.append("0" * (len(binary) - 1) + binary)
+        return bits_to_bytes("".join(bits))
+
+    def decode(self, data: bytes, count: int) -> list[int]:
+        bits = bytes_to_bits(data)
+        numbers = []
+        pos = 0
+        for _ in range(count):
+            zeros = bits.index("1", pos) - pos
+            end = pos + 2 * zeros + 1
+            numbers.append(int(bits[pos + zeros : end], 2) - 1)
+            pos = end
+        return numbers
+
+
+class EliasDeltaCodec:
+    """
+    Elias-delta encoding: the length of the number in Elias-gamma followed by its binary
+    representation without the leading 1.
+    """
+
+    name = "delta"
+
+    def encode(self, numbers: list[int]) -> bytes:
+        bits = []
+        for number in numbers:
+            binary = bin(number + 1)[2:]
+            length = bin(len(binary))[2:]
+            bits.append("0" * (len(length) - 1) + length + binary[1:])
+        return bits_to_bytes("".join(bits))
+
+    def decode(self, data: bytes, count: int) -> list[int]:
+        bits = bytes_to_bits(data)
+        numbers = []
+        pos = 0
+        for _ in range(count):
+            zeros = bits.index("1", pos) - pos
+            length_end = pos + 2 * zeros + 1
+            length = int(bits[pos + zeros : length_end], 2)
+            end = length_end + length - 1
+            numbers.append(int("1" + bits[length_end:end], 2) - 1)
+            pos = end
+        return numbers
+
+
+class Simple8bCodec:
+    """
+    Simple-8b word-aligned encoding: every 64-bit word holds a 4-bit selector and 60 data bits
+    which are split into as many equal width integers as the selector says.
+    """
+
+    name = "simple8b"
+    # (number of integers, bits per integer) for each selector
+    SELECTORS = [
+        (240, 0), (120, 0), (60, 1), (30, 2), (20, 3), (15, 4), (12, 5), (10, 6),
+        (8, 7), (7, 8), (6, 10), (5, 12), (4, 15), (3, 20), (2, 30), (1, 60),
+    ]
+
+    def encode(self, numbers: list[int]) -> bytes:
+        words = []
+        i = 0
+        while i < len(numbers):
+            for selector, (n, bits) in enumerate(self.SELECTORS):
+                group = numbers[i : i + n]
+                # Only the last word may hold fewer integers than the selector allows
+                if len(group) < n and i + len(group) < len(numbers):
+                    continue
+                if all(number < (1 << bits) for number in group) if bits else not any(group):
+                    break
+            else:
+                raise ValueError("Simple-8b can only encode integers below 2**60")
+            word = selector << 60
+            for j, number in enumerate(group):
+                word |= number << (bits * j)
+            words.append(word)
+            i += len(group)
+        return pack(f"<{len(words)}Q", *words)
+
+    def decode(self, data: bytes, count: int) -> list[int]:
+        numbers = []
+        for (word,) in (unpack_from("<Q", data, offset) for offset in range(0, len(data), 8)):
+            n, bits = self.SELECTORS[word >> 60]
+            mask = (1 << bits) - 1
+            numbers.extend((word >> (bits * j)) & mask for j in range(n))
+        return numbers[:count]
+
+
+CODECS = {
+    codec.name: codec
+    for codec in [VariableByteCodec(), EliasGammaCodec(), EliasDeltaCodec(), Simple8bCodec()]
+}
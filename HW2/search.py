@@ -1,17 +1,26 @@
 #!/usr/bin/python3
-from index import Indexer, UNIVERSE
+from index import Indexer, UNIVERSE, merge_posting_lists, read_shards
+from kgram_index import is_wildcard
 
 # These imports are necessary for Pickle.load
 # Python needs to know what classes are being deserialized into so we need
 # to load the classes into memory for Pickle to work
-from index import WordToPointerEntry, PostingsList, Posting
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from itertools import islice
+import json
 import math
+import multiprocessing
+import os
 import nltk
 import re
 import sys
 import getopt
 import time
+from heapq import merge
 
 
 def usage():
@@ -19,7 +28,11 @@ def usage():
         "usage: "
         + sys.argv[0]
         + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results"
+        + " [-w number-of-workers] [-t trace-file] [-f number-of-prefetch-threads]"
+        + " [-m result-mode] [-n number-of-results]"
     )
+    print(f"  -m: one of {RESULT_MODES}, defaults to all")
+    print("  -n: number of doc ids returned in the first mode, defaults to 10")
 
 
 """
@@ -35,6 +48,8 @@ def split(q, stemmer: nltk.stem.PorterStemmer):
     as a single token.
     We are also splitting by keywords AND, OR, NOT to separate the tokens.
     2-word terms such as 'bunny balls' should be counted as invalid.
+    Wildcard terms such as 'comput*' are only lowercased, they are matched against the stemmed
+    terms of the dictionary.
     Returns None if invalid
     """
     q = re.sub(r"[(]", "( ", q)
@@ -57,11 +72,31 @@ def split(q, stemmer: nltk.stem.PorterStemmer):
             regular_term_count += 1
             if regular_term_count > 1:
                 return None
+            if is_wildcard(token):
+                new_tokens.append(token.lower())
+                continue
             # Use stemming to match the preprocessing of index
             new_tokens.append(stemmer.stem(token.lower(), to_lowercase=True))
     return new_tokens
 
 
+def find_closing_parenthesis(tokens, i) -> int:
+    """
+    Returns the index of the ")" that closes the "(" at tokens[i].
+    Counts the nesting depth so that nested parentheses such as '(a AND (b OR c))'
+    close at the outer ")" instead of the first one.
+    """
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j] == "(":
+            depth += 1
+        elif tokens[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    raise ValueError("Unbalanced parentheses")
+
+
 def shunting(tokens) -> list[str]:
     """Given a sequence of tokens, return a postfix syntax representation according to
     Shunting Yard algorithm. This is the default Shunting algorithm.
@@ -89,7 +124,7 @@ def shunting(tokens) -> list[str]:
                 result_stack.append(operator_stack.pop())
             operator_stack.append(token)
         elif token == "(":
-            right_parenth_idx = tokens[i:].index(")") + i
+            right_parenth_idx = find_closing_parenthesis(tokens, i)
             result = shunting(tokens[i + 1 : right_parenth_idx])
             i = right_parenth_idx
             for t in result:
@@ -142,15 +177,15 @@ def opt_shunting(tokens) -> list[str]:
             # Append current operator to operator_stack
             operator_stack.append(token)
         elif token == "(":
-            # If current token is "(", find the next ")" and do opt_shunting for tokens inside ()
-            right_parenth_idx = tokens[i:].index(")") + i
+            # If current token is "(", find the matching ")" and do opt_shunting for tokens inside ()
+            right_parenth_idx = find_closing_parenthesis(tokens, i)
             result = opt_shunting(tokens[i + 1 : right_parenth_idx])
             # Move pointer i to ")"
             i = right_parenth_idx
             # Append the resulting term to term_stack
             term_stack.append(result)
         else:  # regular terms
-            term_stack.append(Term(token))
+            term_stack.append(Wildcard(token) if is_wildcard(token) else Term(token))
         i += 1
     terms = []
     now = None
@@ -230,8 +265,10 @@ def apply_and(pl1: PostingsList, pl2: PostingsList) -> PostingsList:
             p1 += 1
             p2 += 1
         elif pl1[p1] < pl2[p2]:
-            while pl1[p1].has_skip() and pl1[pl1[p1].skip] <= pl2[p2]:
-                p1 = pl1[p1].skip
+            # Same reasoning as the pl2 case below, a while else would skip past a match
+            if pl1[p1].has_skip() and pl1[pl1[p1].skip] <= pl2[p2]:
+                while pl1[p1].has_skip() and pl1[pl1[p1].skip] <= pl2[p2]:
+                    p1 = pl1[p1].skip
             else:
                 p1 += 1
         else:
@@ -310,6 +347,20 @@ def apply_and_not(pl1: PostingsList, pl2: PostingsList) -> PostingsList:
     return convert_posting_to_list(results)
 
 
+def apply_or_n(pls: list[PostingsList]) -> PostingsList:
+    """
+    Apply the OR operation on any number of posting lists at once with an n-way merge,
+    instead of len(pls) - 1 pairwise merges which each copy the growing result.
+    """
+    if len(pls) == 1:
+        return pls[0]
+    results = []
+    for value in merge(*[[p.value for p in pl.plist] for pl in pls]):
+        if not results or results[-1] != value:
+            results.append(value)
+    return convert_posting_to_list(results)
+
+
 def apply_not(pl: PostingsList, universe: PostingsList) -> PostingsList:
     """Apply the NOT operation to a posting list by applying UNIVERSE AND NOT term"""
     return apply_and_not(universe, pl)
@@ -320,6 +371,162 @@ Evaluation methods
 """
 
 
+class QueryTrace:
+    """
+    Execution statistics of a single query for the tracing mode.
+    Every operator node that is evaluated appends a record with the cardinalities
+    of its inputs and output, and the whole trace is emitted as one JSON line.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self.plan = None
+        self.parse_time = 0.0
+        self.total_time = 0.0
+        # Totals over all the posting lists read from the postings file
+        self.bytes_read = 0
+        self.read_time = 0.0
+        self.decode_time = 0.0
+        # Total time spent in the AND, OR and NOT list merges
+        self.merge_time = 0.0
+        self.nodes = []
+
+    def record_read(self, term: str, num_bytes: int, read_time: float, decode_time: float, output: int):
+        """Record the disk read and unpickling of a single posting list"""
+        self.bytes_read += num_bytes
+        self.read_time += read_time
+        self.decode_time += decode_time
+        self.nodes.append(
+            {
+                "op": "Read",
+                "term": term,
+                "output": output,
+                "bytes": num_bytes,
+                "read_time": read_time,
+                "decode_time": decode_time,
+            }
+        )
+
+    def record_cursor(self, term: str, num_bytes: int, num_blocks: int, probe_time: float, output: int):
+        """Record the probing of a posting list through a BlockCursor"""
+        self.bytes_read += num_bytes
+        self.decode_time += probe_time
+        self.nodes.append(
+            {
+                "op": "Cursor",
+                "term": term,
+                "output": output,
+                "bytes": num_bytes,
+                "blocks": num_blocks,
+                "probe_time": probe_time,
+            }
+        )
+
+    def record_prefetch(self, term: str, wait_time: float, output: int):
+        """Record a posting list that was read ahead, with how long evaluation waited for it"""
+        self.read_time += wait_time
+        self.nodes.append(
+            {
+                "op": "Prefetch",
+                "term": term,
+                "output": output,
+                "wait_time": wait_time,
+            }
+        )
+
+    def record_merge(self, node, inputs: list[int], output: int, merge_time: float):
+        """Record an operator node with the sizes of its operands and its result"""
+        self.merge_time += merge_time
+        self.nodes.append(
+            {
+                "op": type(node).__name__,
+                "node": repr(node),
+                "inputs": inputs,
+                "output": output,
+                "merge_time": merge_time,
+            }
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "query": self.query,
+                "plan": self.plan,
+                "parse_time": self.parse_time,
+                "total_time": self.total_time,
+                "bytes_read": self.bytes_read,
+                "read_time": self.read_time,
+                "decode_time": self.decode_time,
+                "merge_time": self.merge_time,
+                "nodes": self.nodes,
+            }
+        )
+
+
+def fetch_posting_list(indexer: Indexer, word: str, trace: QueryTrace = None) -> PostingsList:
+    """Read the posting list of the word, timing the read and unpickling separately when tracing"""
+    if trace is None:
+        return indexer.get_posting_list(word)
+    if isinstance(indexer, PrefetchedIndexer) and word in indexer.futures:
+        start = time.perf_counter()
+        pl = indexer.get_posting_list(word)
+        trace.record_prefetch(word, time.perf_counter() - start, len(pl))
+        return pl
+    posting_lists = []
+    # Trace every index segment the posting list is read from
+    for segment in indexer.segments():
+        start = time.perf_counter()
+        data = segment.read_posting_data(word)
+        read_done = time.perf_counter()
+        pl = PostingsList() if data is None else segment.decode_posting_data(data)
+        decode_done = time.perf_counter()
+        num_bytes = 0 if data is None else len(data)
+        trace.record_read(word, num_bytes, read_done - start, decode_done - read_done, len(pl))
+        posting_lists.append(pl)
+    return indexer.filter_deleted(merge_posting_lists(posting_lists))
+
+
+class SortedProbe:
+    """
+    Membership tests of increasing doc ids against a sorted doc id iterator,
+    which is only advanced as far as the doc ids that are tested.
+    """
+
+    def __init__(self, doc_ids) -> None:
+        self.doc_ids = iter(doc_ids)
+        self.current = next(self.doc_ids, None)
+
+    def __contains__(self, docId: int) -> bool:
+        while self.current is not None and self.current < docId:
+            self.current = next(self.doc_ids, None)
+        return self.current == docId
+
+
+class CursorProbe:
+    """Membership tests of increasing doc ids against the skip directory of a BlockCursor"""
+
+    def __init__(self, cursor) -> None:
+        self.cursor = cursor
+
+    def __contains__(self, docId: int) -> bool:
+        return self.cursor is not None and self.cursor.next_geq(docId) == docId
+
+
+def get_universe_count(indexer: Indexer) -> int:
+    """Number of documents in the index, read off the dictionary when it is exact"""
+    if indexer.has_exact_sizes():
+        return indexer.get_df(UNIVERSE)
+    return len(indexer.get_posting_list(UNIVERSE))
+
+
+"""
+Besides evaluate, which returns the whole posting list of a node, every node can lazily iterate
+over its sorted doc ids, so that only the results which are consumed get computed, and count its
+results, using the sizes in the dictionary instead of reading posting lists where possible.
+estimate returns an upper bound of the number of results without reading any posting list.
+"""
+
+
 class Term:
     """
     Term abstraction that evaluates to the posting list of the term.
@@ -328,8 +535,26 @@ class Term:
     def __init__(self, term) -> None:
         self.term = term
 
-    def evaluate(self, indexer: Indexer):
-        return indexer.get_posting_list(self.term)
+    def evaluate(self, indexer: Indexer, trace: QueryTrace = None):
+        return fetch_posting_list(indexer, self.term, trace)
+
+    def iterate(self, indexer: Indexer):
+        for posting in self.evaluate(indexer).plist:
+            yield posting.value
+
+    def count(self, indexer: Indexer) -> int:
+        if indexer.has_exact_sizes():
+            return indexer.get_df(self.term)
+        return len(self.evaluate(indexer))
+
+    def estimate(self, indexer: Indexer) -> int:
+        return indexer.get_df(self.term)
+
+    def probe(self, indexer: Indexer):
+        """Membership tests of increasing doc ids, through the skip directory when possible"""
+        if indexer.can_use_cursors():
+            return CursorProbe(indexer.open_cursor(self.term))
+        return SortedProbe(self.iterate(indexer))
 
     def __repr__(self):
         return str(self.term)
@@ -344,9 +569,29 @@ class Not:
     def __init__(self, term: Term) -> None:
         self.term = term
 
-    def evaluate(self, indexer: Indexer):
-        ans = apply_not(self.term.evaluate(indexer), indexer.get_posting_list(UNIVERSE))
-        return reapply_skip_pointers(ans)
+    def evaluate(self, indexer: Indexer, trace: QueryTrace = None):
+        pl = self.term.evaluate(indexer, trace)
+        universe = fetch_posting_list(indexer, UNIVERSE, trace)
+        start = time.perf_counter()
+        ans = reapply_skip_pointers(apply_not(pl, universe))
+        if trace is not None:
+            trace.record_merge(self, [len(pl), len(universe)], len(ans), time.perf_counter() - start)
+        return ans
+
+    def iterate(self, indexer: Indexer):
+        excluded = SortedProbe(self.term.iterate(indexer))
+        for docId in Term(UNIVERSE).iterate(indexer):
+            if docId not in excluded:
+                yield docId
+
+    def count(self, indexer: Indexer) -> int:
+        return get_universe_count(indexer) - self.term.count(indexer)
+
+    def estimate(self, indexer: Indexer) -> int:
+        return indexer.get_df(UNIVERSE)
+
+    def probe(self, indexer: Indexer):
+        return SortedProbe(self.iterate(indexer))
 
     def __repr__(self):
         return f"Not( {self.term} )"
@@ -361,8 +606,11 @@ class And:
     def __init__(self, terms) -> None:
         self.terms = terms
 
-    def evaluate(self, indexer: Indexer):
-        res = [term.evaluate(indexer) for term in self.terms]
+    def evaluate(self, indexer: Indexer, trace: QueryTrace = None):
+        if indexer.can_use_cursors():
+            return self.evaluate_with_cursors(indexer, trace)
+        res = [term.evaluate(indexer, trace) for term in self.terms]
+        start = time.perf_counter()
         # Sort the terms in the order of increasing posting list length to optimise
         res.sort(key=lambda x: len(x))
         ans = res[0]
@@ -370,8 +618,85 @@ class And:
             ans = apply_and(ans, res[i])
             # Need to reapply skip pointers at every iteration
             ans = reapply_skip_pointers(ans)
+        if trace is not None:
+            trace.record_merge(self, [len(x) for x in res], len(ans), time.perf_counter() - start)
+        return ans
+
+    def evaluate_with_cursors(self, indexer: Indexer, trace: QueryTrace = None):
+        """
+        Intersection for block-compressed postings. Only the rarest term and the non-term operands
+        are read in full. The candidates they produce are then probed against the skip directory of
+        the remaining terms, in order of increasing document frequency, so that only the blocks
+        which can contain a candidate are read and decoded.
+        """
+        terms = sorted(
+            (term for term in self.terms if isinstance(term, Term)),
+            key=lambda term: indexer.get_df(term.term),
+        )
+        res = [term.evaluate(indexer, trace) for term in self.terms if not isinstance(term, Term)]
+        if terms and (not res or indexer.get_df(terms[0].term) <= min(len(x) for x in res)):
+            res.append(terms.pop(0).evaluate(indexer, trace))
+        start = time.perf_counter()
+        res.sort(key=lambda x: len(x))
+        ans = res[0]
+        for i in range(1, len(res)):
+            ans = apply_and(ans, res[i])
+        candidates = [posting.value for posting in ans.plist]
+        merge_time = time.perf_counter() - start
+        for term in terms:
+            if not candidates:
+                break
+            start = time.perf_counter()
+            cursor = indexer.open_cursor(term.term)
+            candidates = [] if cursor is None else cursor.intersect(candidates)
+            if trace is not None and cursor is not None:
+                trace.record_cursor(
+                    term.term,
+                    cursor.bytes_read,
+                    cursor.blocks_read,
+                    time.perf_counter() - start,
+                    len(candidates),
+                )
+        start = time.perf_counter()
+        ans = reapply_skip_pointers(convert_posting_to_list(candidates))
+        if trace is not None:
+            inputs = [len(x) for x in res] + [indexer.get_df(term.term) for term in terms]
+            trace.record_merge(self, inputs, len(ans), merge_time + time.perf_counter() - start)
         return ans
 
+    def iterate(self, indexer: Indexer):
+        """
+        Drive the intersection with the operand with the fewest estimated results and test each of
+        its doc ids against the other operands, in increasing doc id order so that every operand is
+        only read as far as the last candidate. Negated operands are tested for exclusion instead
+        of having their complement computed.
+        """
+        positives = sorted(
+            (term for term in self.terms if not isinstance(term, Not)),
+            key=lambda term: term.estimate(indexer),
+        )
+        negatives = [term.term for term in self.terms if isinstance(term, Not)]
+        if not positives:
+            # NOT a AND NOT b is NOT (a OR b)
+            yield from Not(Or(negatives) if len(negatives) > 1 else negatives[0]).iterate(indexer)
+            return
+        included = [term.probe(indexer) for term in positives[1:]]
+        excluded = [term.probe(indexer) for term in negatives]
+        for docId in positives[0].iterate(indexer):
+            if all(docId in probe for probe in included) and not any(
+                docId in probe for probe in excluded
+            ):
+                yield docId
+
+    def count(self, indexer: Indexer) -> int:
+        return sum(1 for _ in self.iterate(indexer))
+
+    def estimate(self, indexer: Indexer) -> int:
+        return min(term.estimate(indexer) for term in self.terms)
+
+    def probe(self, indexer: Indexer):
+        return SortedProbe(self.iterate(indexer))
+
     def __repr__(self):
         return f"And( {self.terms} )"
 
@@ -385,19 +710,164 @@ class Or:
     def __init__(self, terms) -> None:
         self.terms = terms
 
-    def evaluate(self, indexer: Indexer):
-        res = [term.evaluate(indexer) for term in self.terms]
-        ans = res[0]
-        for i in range(1, len(res)):
-            ans = apply_or(ans, res[i])
-            # Need to reapply skip pointers at every iteration
-            ans = reapply_skip_pointers(ans)
+    def evaluate(self, indexer: Indexer, trace: QueryTrace = None):
+        res = [term.evaluate(indexer, trace) for term in self.terms]
+        start = time.perf_counter()
+        if len(res) == 2:
+            ans = reapply_skip_pointers(apply_or(res[0], res[1]))
+        else:
+            ans = reapply_skip_pointers(apply_or_n(res))
+        if trace is not None:
+            trace.record_merge(self, [len(x) for x in res], len(ans), time.perf_counter() - start)
         return ans
 
+    def iterate(self, indexer: Indexer):
+        prev = None
+        for docId in merge(*[term.iterate(indexer) for term in self.terms]):
+            if docId != prev:
+                yield docId
+            prev = docId
+
+    def count(self, indexer: Indexer) -> int:
+        return sum(1 for _ in self.iterate(indexer))
+
+    def estimate(self, indexer: Indexer) -> int:
+        return sum(term.estimate(indexer) for term in self.terms)
+
+    def probe(self, indexer: Indexer):
+        return SortedProbe(self.iterate(indexer))
+
     def __repr__(self):
         return f"Or( {self.terms} )"
 
 
+class Wildcard:
+    """
+    Wildcard abstraction of a term such as 'comput*' that evaluates to the posting list of
+    the OR of every term of the dictionary that it matches, found through the k-gram index.
+    """
+
+    def __init__(self, pattern) -> None:
+        self.pattern = pattern
+        self.terms = None
+
+    def expand(self, indexer: Indexer) -> list[str]:
+        """The terms matching the pattern, only looked up once per query"""
+        if self.terms is None:
+            self.terms = indexer.expand_wildcard(self.pattern)
+        return self.terms
+
+    def evaluate(self, indexer: Indexer, trace: QueryTrace = None):
+        terms = [Term(term) for term in self.expand(indexer)]
+        if not terms:
+            return PostingsList()
+        return Or(terms).evaluate(indexer, trace)
+
+    def as_or(self, indexer: Indexer):
+        """The equivalent OR of the matching terms, or None if no term matches"""
+        terms = [Term(term) for term in self.expand(indexer)]
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else Or(terms)
+
+    def iterate(self, indexer: Indexer):
+        node = self.as_or(indexer)
+        return iter(()) if node is None else node.iterate(indexer)
+
+    def count(self, indexer: Indexer) -> int:
+        node = self.as_or(indexer)
+        return 0 if node is None else node.count(indexer)
+
+    def estimate(self, indexer: Indexer) -> int:
+        return sum(indexer.get_df(term) for term in self.expand(indexer))
+
+    def probe(self, indexer: Indexer):
+        return SortedProbe(self.iterate(indexer))
+
+    def __repr__(self):
+        return f"Wildcard( {self.pattern} )"
+
+
+"""
+PREFETCHING
+"""
+
+
+# Thread pools of the prefetch stage keyed by their number of threads, created on first use
+prefetch_executors = {}
+DEFAULT_PREFETCH_THREADS = 4
+# The threads of the pools are not copied into forked worker processes, which create their own
+os.register_at_fork(after_in_child=prefetch_executors.clear)
+
+
+def get_prefetch_executor(num_threads: int) -> ThreadPoolExecutor:
+    if num_threads not in prefetch_executors:
+        prefetch_executors[num_threads] = ThreadPoolExecutor(num_threads)
+    return prefetch_executors[num_threads]
+
+
+def collect_prefetch_terms(node, indexer: Indexer, terms: set):
+    """Collect the terms of the query tree whose posting lists are read in full when evaluated"""
+    if isinstance(node, Term):
+        terms.add(node.term)
+    elif isinstance(node, Wildcard):
+        terms.update(node.expand(indexer))
+    elif isinstance(node, Not):
+        terms.add(UNIVERSE)
+        collect_prefetch_terms(node.term, indexer, terms)
+    elif isinstance(node, And) and indexer.can_use_cursors():
+        # Only the rarest term of an intersection is read in full, the others are probed
+        # through their skip directory which prefetching the whole list would defeat
+        direct_terms = [term for term in node.terms if isinstance(term, Term)]
+        if direct_terms:
+            terms.add(min(direct_terms, key=lambda term: indexer.get_df(term.term)).term)
+        for term in node.terms:
+            if not isinstance(term, Term):
+                collect_prefetch_terms(term, indexer, terms)
+    else:
+        for term in node.terms:
+            collect_prefetch_terms(term, indexer, terms)
+
+
+class PrefetchedIndexer:
+    """
+    Wraps an Indexer to serve the posting lists which are being read ahead on the prefetch
+    thread pool. Everything else is delegated to the wrapped Indexer.
+    """
+
+    def __init__(self, indexer: Indexer, futures: dict[str, Future]) -> None:
+        self.indexer = indexer
+        self.futures = futures
+
+    def __getattr__(self, name):
+        return getattr(self.indexer, name)
+
+    def get_posting_list(self, word: str, filename=None) -> PostingsList:
+        future = self.futures.get(word) if filename is None else None
+        if future is None:
+            return self.indexer.get_posting_list(word, filename)
+        return future.result()
+
+
+def prefetch(plan, indexer: Indexer, num_threads: int):
+    """
+    Start reading every posting list the query plan needs concurrently, instead of one after
+    the other as the evaluation reaches each term, and return the indexer to evaluate with.
+    The reads are issued longest posting list first so that the slowest read is not left to
+    start last when there are more terms than threads.
+    """
+    terms = set()
+    collect_prefetch_terms(plan, indexer, terms)
+    if len(terms) < 2:
+        return indexer
+    executor = get_prefetch_executor(num_threads)
+    futures = {
+        term: executor.submit(indexer.get_posting_list, term)
+        for term in sorted(terms, key=indexer.get_df, reverse=True)
+    }
+    return PrefetchedIndexer(indexer, futures)
+
+
 def naive_evaluation(indexer: Indexer, query: list[str]):
     """
     The most baseline evaluation that operates according to Shunting Yard, hence
@@ -408,6 +878,8 @@ def naive_evaluation(indexer: Indexer, query: list[str]):
     def get_posting_list(term):
         if isinstance(term, PostingsList):
             return term
+        elif isinstance(term, str) and is_wildcard(term):
+            return Wildcard(term).evaluate(indexer)
         elif isinstance(term, str):
             return indexer.get_posting_list(term)
         else:
@@ -445,8 +917,9 @@ def naive_evaluation(indexer: Indexer, query: list[str]):
     assert len(operand_stack) == 1
     # Handle the unary case which has no optimisation possible
     if isinstance(operand_stack[0], str):
-        operand_stack = [indexer.get_posting_list(operand_stack[0])]
-    results = " ".join([str(posting.value) for posting in operand_stack[0]])
+        operand_stack = [get_posting_list(operand_stack[0])]
+    doc_ids = indexer.to_external_ids([posting.value for posting in operand_stack[0]])
+    results = " ".join([str(docId) for docId in doc_ids])
     return results
 
 
@@ -463,47 +936,347 @@ def naive_search(query: str, indexer: Indexer, stemmer: nltk.stem.PorterStemmer)
     return naive_evaluation(indexer, query_list)
 
 
-def opt_search(query: str, indexer: Indexer, stemmer: nltk.stem.PorterStemmer) -> str:
-    """Apply the optimised search algorithm with the provided query, indexer and stemming technique"""
+def plan_query(query: str, stemmer: nltk.stem.PorterStemmer):
+    """Parse the query into its tree of Term, Not, And, Or and Wildcard nodes, None if invalid"""
     # Split the query into operators and regular terms, stem regular terms
     splitted = split(query, stemmer)
-    # If invalid query, reject and return ""
+    # If invalid query, reject
     if splitted is None:
+        return None
+    # Apply optimised Shunting Yard
+    return opt_shunting(splitted)
+
+
+def opt_search(
+    query: str,
+    indexer: Indexer,
+    stemmer: nltk.stem.PorterStemmer,
+    trace: QueryTrace = None,
+    prefetch_threads: int = 0,
+) -> str:
+    """
+    Apply the optimised search algorithm with the provided query, indexer and stemming technique.
+    Fills in the trace with the parse time, plan and per-node statistics if one is given.
+    prefetch_threads > 0 reads the posting lists of the query ahead on that many threads.
+    """
+    start = time.perf_counter()
+    plan = plan_query(query, stemmer)
+    # If invalid query, reject and return ""
+    if plan is None:
         return ""
-    # Apply optimised Shunting Yard and evaluate the result
-    ans = opt_shunting(splitted).evaluate(indexer)
-    # Convert posting list to string result
-    ans = [str(posting.value) for posting in ans.plist]
+    if trace is not None:
+        trace.parse_time = time.perf_counter() - start
+        trace.plan = repr(plan)
+    if prefetch_threads > 0:
+        indexer = prefetch(plan, indexer, prefetch_threads)
+    ans = plan.evaluate(indexer, trace)
+    # Convert posting list to string result, in external doc ids
+    ans = [str(docId) for docId in indexer.to_external_ids([posting.value for posting in ans.plist])]
+    if trace is not None:
+        trace.total_time = time.perf_counter() - start
     return " ".join(ans)
 
 
-def run_search(dict_file, postings_file, queries_file, results_file):
+"""
+RESULT MODES
+"""
+
+
+# "all" returns every doc id, "count" only the number of results, "first" the first limit doc ids
+# and "stream" every doc id written out in chunks as they are produced
+RESULT_MODES = ["all", "count", "first", "stream"]
+STREAM_CHUNK_SIZE = 1024
+
+
+def iterate_search(
+    query: str, indexer: Indexer, stemmer: nltk.stem.PorterStemmer, prefetch_threads: int = 0
+):
+    """
+    Lazily yields the sorted external doc ids of the results of the query.
+    prefetch_threads > 0 reads the posting lists of the query ahead on that many threads.
+    """
+    plan = plan_query(query, stemmer)
+    if plan is None:
+        return
+    if prefetch_threads > 0:
+        indexer = prefetch(plan, indexer, prefetch_threads)
+    if indexer.doc_map is not None:
+        # Reassigned internal doc ids are not in external doc id order,
+        # so every result is needed before the first one is known
+        yield from indexer.to_external_ids(list(plan.iterate(indexer)))
+    else:
+        yield from plan.iterate(indexer)
+
+
+def count_search(query: str, indexer: Indexer, stemmer: nltk.stem.PorterStemmer) -> int:
+    """Number of results of the query, without materialising them where possible"""
+    plan = plan_query(query, stemmer)
+    return 0 if plan is None else plan.count(indexer)
+
+
+def first_search(query: str, indexer: Indexer, stemmer: nltk.stem.PorterStemmer, limit: int) -> str:
+    """The first limit doc ids of the results, the evaluation stops once they are found"""
+    return " ".join(str(docId) for docId in islice(iterate_search(query, indexer, stemmer), limit))
+
+
+def stream_search(
+    query: str,
+    indexer: Indexer,
+    stemmer: nltk.stem.PorterStemmer,
+    prefetch_threads: int = 0,
+    chunk_size=STREAM_CHUNK_SIZE,
+):
+    """
+    Yields the results as strings of chunk_size doc ids which concatenate to the result line.
+    Every result is produced, so the posting lists can be read ahead on prefetch_threads threads.
+    """
+    chunk = []
+    separator = ""
+    for docId in iterate_search(query, indexer, stemmer, prefetch_threads):
+        chunk.append(str(docId))
+        if len(chunk) == chunk_size:
+            yield separator + " ".join(chunk)
+            chunk = []
+            separator = " "
+    if chunk:
+        yield separator + " ".join(chunk)
+
+
+@dataclass
+class SearchOptions:
+    """How each query is answered by answer_query"""
+    # Record a QueryTrace of every query
+    tracing: bool = False
+    # Number of threads reading the posting lists of each query ahead, 0 disables prefetching
+    prefetch_threads: int = 0
+    # One of RESULT_MODES
+    mode: str = "all"
+    # Number of doc ids returned in the "first" mode
+    limit: int = 10
+
+
+def answer_query(
+    query: str,
+    indexer: Indexer,
+    stemmer: nltk.stem.PorterStemmer,
+    options: SearchOptions = None,
+):
+    """
+    Answer a single line of query with opt_search, or in the result mode of the options,
+    which default to SearchOptions().
+    Returns the results and, in tracing mode, the JSON line of the query trace.
+    The results are a string, except in the "stream" mode where they are an iterator of chunks
+    of the result string. Only the "all" mode traces the individual operators.
+    """
+    options = SearchOptions() if options is None else options
+    query = query.strip()
+    if options.mode == "stream" and not options.tracing:
+        return stream_search(query, indexer, stemmer, options.prefetch_threads), None
+    trace = QueryTrace(query) if options.tracing else None
+    start = time.perf_counter()
+    if options.mode == "count":
+        results = str(count_search(query, indexer, stemmer))
+    elif options.mode == "first":
+        results = first_search(query, indexer, stemmer, options.limit)
+    elif options.mode == "stream":
+        results = "".join(stream_search(query, indexer, stemmer, options.prefetch_threads))
+    else:
+        results = opt_search(query, indexer, stemmer, trace, options.prefetch_threads)
+    if trace is None:
+        return results, None
+    # Rejected queries return before the end of opt_search
+    trace.total_time = time.perf_counter() - start
+    return results, trace.to_json()
+
+
+def answer_to_string(answer) -> tuple[str, str]:
+    """Join streamed results so that the answer can be sent back from a worker process"""
+    results, trace = answer
+    return (results if isinstance(results, str) else "".join(results)), trace
+
+
+"""
+PARALLEL EVALUATION
+"""
+
+
+# Per-process search state. It is loaded once per worker (or inherited from the parent
+# when the pool is forked) so that each task only needs to ship the query string.
+worker_indexer = None
+worker_stemmer = None
+worker_options = SearchOptions()
+
+
+def load_shared_indexer(dict_file, postings_file) -> Indexer:
+    """Load the dictionary and memory-map the postings file for sharing across workers"""
+    indexer = Indexer(dict_file, postings_file)
+    indexer.load()
+    indexer.open_postings_mmap()
+    return indexer
+
+
+def init_worker(dict_file, postings_file, options: SearchOptions):
+    """Pool initializer that sets up the worker's indexer unless it was inherited by fork"""
+    global worker_indexer, worker_stemmer, worker_options
+    worker_options = options
+    if worker_indexer is None:
+        worker_indexer = load_shared_indexer(dict_file, postings_file)
+    if worker_stemmer is None:
+        worker_stemmer = worker_indexer.stemmer
+
+
+def search_worker(query: str) -> tuple[str, str]:
+    """Evaluate a single query inside a worker process"""
+    return answer_to_string(answer_query(query, worker_indexer, worker_stemmer, worker_options))
+
+
+def parallel_search(
+    dict_file, postings_file, queries: list[str], num_workers: int, options: SearchOptions
+):
+    """
+    Distribute the queries over a pool of num_workers processes which share one
+    memory-mapped postings file. Yields the answer_query results in the original query order.
+    """
+    global worker_indexer, worker_stemmer
+    # Load before creating the pool so that forked workers inherit the dictionary
+    # and the mapping instead of each loading their own copy
+    worker_indexer = load_shared_indexer(dict_file, postings_file)
+    worker_stemmer = worker_indexer.stemmer
+    # Hand out a few chunks per worker to amortise the IPC cost while keeping the load balanced
+    chunksize = max(1, len(queries) // (num_workers * 4))
+    with multiprocessing.Pool(
+        num_workers, initializer=init_worker, initargs=(dict_file, postings_file, options)
+    ) as pool:
+        # imap (unlike imap_unordered) returns results in the order of submission
+        for results in pool.imap(search_worker, queries, chunksize=chunksize):
+            yield results
+
+
+"""
+SHARDED EVALUATION
+"""
+
+
+# The only shard loaded by this shard worker process
+worker_shard = None
+
+
+def init_shard_worker(shard_dict, shard_postings):
+    """Pool initializer that loads the shard the worker process is dedicated to"""
+    global worker_shard
+    worker_shard = load_shared_indexer(shard_dict, shard_postings)
+
+
+def search_shard(queries: list[str], options: SearchOptions) -> list[tuple[str, str]]:
+    """Answer a batch of queries against the shard of this shard worker process"""
+    indexer = worker_shard
+    return [
+        answer_to_string(answer_query(query, indexer, indexer.stemmer, options))
+        for query in queries
+    ]
+
+
+def gather_results(
+    query: str, shard_answers: list[tuple[str, str]], options: SearchOptions
+) -> tuple[str, str]:
+    """
+    Combine the answers of every shard to one query. The doc ids of each shard are sorted
+    and merging them keeps the results sorted even once documents have been appended to a shard
+    out of doc id order. The shard traces are nested in a single JSON line.
+    """
+    if options.mode == "count":
+        results = str(sum(int(results) for results, _ in shard_answers))
+    else:
+        doc_ids = merge(*[[int(docId) for docId in results.split()] for results, _ in shard_answers])
+        if options.mode == "first":
+            doc_ids = islice(doc_ids, options.limit)
+        results = " ".join(str(docId) for docId in doc_ids)
+    if shard_answers[0][1] is None:
+        return results, None
+    traces = [json.loads(trace) for _, trace in shard_answers]
+    return results, json.dumps({"query": query.strip(), "shards": traces})
+
+
+def sharded_search(shards, queries: list[str], options: SearchOptions, batch_size: int = 1000):
+    """
+    Scatter each batch of queries to one worker process per shard and gather their answers.
+    Every shard has a pool of a single process of its own, so each process only ever loads its
+    own shard. Yields the combined answer_query results in the original query order.
+    """
+    with ExitStack() as stack:
+        pools = [
+            stack.enter_context(multiprocessing.Pool(1, initializer=init_shard_worker, initargs=shard))
+            for shard in shards
+        ]
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start : start + batch_size]
+            # Every shard answers the whole batch, the answers are gathered in shard order
+            pending = [pool.apply_async(search_shard, (batch, options)) for pool in pools]
+            answers = [result.get() for result in pending]
+            for i, query in enumerate(batch):
+                yield gather_results(
+                    query, [shard_answers[i] for shard_answers in answers], options
+                )
+
+
+def run_search(
+    dict_file,
+    postings_file,
+    queries_file,
+    results_file,
+    num_workers=1,
+    trace_file=None,
+    prefetch_threads=DEFAULT_PREFETCH_THREADS,
+    mode="all",
+    limit=10,
+):
     """
     using the given dictionary file and postings file,
     perform searching on the given queries file and output the results to a file
+    num_workers > 1 evaluates the queries on a pool of worker processes
+    trace_file receives one JSON line of execution statistics per query if provided
+    a sharded index is searched by one worker process per shard
+    prefetch_threads is the number of threads reading the posting lists of each query ahead, 0 disables it
+    mode is one of RESULT_MODES, limit the number of doc ids of the "first" mode
     """
+    if mode not in RESULT_MODES:
+        raise ValueError(f"mode should be one of {RESULT_MODES}")
+    # Counting and early termination read as little as possible, prefetching would read everything
+    options = SearchOptions(
+        trace_file is not None, prefetch_threads if mode in ["all", "stream"] else 0, mode, limit
+    )
     print("running search on the queries...")
-    # Initialize indexer and PorterStemmer
-    indexer = Indexer(dict_file, postings_file)
-    stemmer = nltk.stem.PorterStemmer()
-    # Load dictionary mapping of token to file pointer from dict_file
-    indexer.load()
-    with open(results_file, "w") as outf, open(queries_file, "r") as inf:
-        num_queries = 0
+    with open(queries_file, "r") as inf:
         queries = inf.readlines()
-        for i, query in enumerate(queries):
-            # Read a single line of query
-            query = query.strip()
-            # Perform naive search or optimised search
-            results = opt_search(query, indexer, stemmer)
-            # results = naive_search(query, indexer, stemmer)
-            # Write the result to results_file
-            if i == len(queries) - 1:
-                outf.write(results)
-            else:
-                outf.write(results + "\n")
+    shards = read_shards(dict_file)
+    if shards:
+        all_results = sharded_search(shards, queries, options)
+    elif num_workers > 1:
+        all_results = parallel_search(dict_file, postings_file, queries, num_workers, options)
+    else:
+        # Initialize indexer
+        indexer = Indexer(dict_file, postings_file)
+        # Load dictionary mapping of token to file pointer from dict_file, and the stem cache
+        indexer.load()
+        stemmer = indexer.stemmer
+        # Perform naive search or optimised search on each line of query
+        all_results = (answer_query(query, indexer, stemmer, options) for query in queries)
+        # all_results = ((naive_search(query.strip(), indexer, stemmer), None) for query in queries)
+    trace_outf = open(trace_file, "w") if trace_file is not None else None
+    with open(results_file, "w") as outf:
+        num_queries = 0
+        for i, (results, trace) in enumerate(all_results):
+            if trace_outf is not None:
+                trace_outf.write(trace + "\n")
+            # Write the result to results_file, chunk by chunk in the "stream" mode
+            for chunk in [results] if isinstance(results, str) else results:
+                outf.write(chunk)
+            if i != len(queries) - 1:
+                outf.write("\n")
             num_queries += 1
         print(f"Handled {num_queries} queries")
+    if trace_outf is not None:
+        trace_outf.close()
 
 
 def evaluate_runtime(
@@ -530,39 +1303,65 @@ def evaluate_runtime(
     print(f"Took {average_time_taken} seconds on average")
 
 
-dictionary_file = postings_file = file_of_queries = output_file_of_results = None
-
-try:
-    opts, args = getopt.getopt(sys.argv[1:], "d:p:q:o:")
-except getopt.GetoptError:
-    usage()
-    sys.exit(2)
-
-for o, a in opts:
-    if o == "-d":
-        dictionary_file = a
-    elif o == "-p":
-        postings_file = a
-    elif o == "-q":
-        file_of_queries = a
-    elif o == "-o":
-        file_of_output = a
-    else:
-        assert False, "unhandled option"
-
-if (
-    dictionary_file == None
-    or postings_file == None
-    or file_of_queries == None
-    or file_of_output == None
-):
-    usage()
-    sys.exit(2)
-
-run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
-# print("Evaluating 'naive' search")
-# evaluate_runtime(
-#     dictionary_file, postings_file, file_of_queries, search_fn=naive_search
-# )
-# print("Evaluating 'optimised' search")
-# evaluate_runtime(dictionary_file, postings_file, file_of_queries, search_fn=opt_search)
+if __name__ == "__main__":
+    dictionary_file = postings_file = file_of_queries = output_file_of_results = None
+    num_workers = 1
+    trace_file = None
+    prefetch_threads = DEFAULT_PREFETCH_THREADS
+    mode = "all"
+    limit = 10
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "d:p:q:o:w:t:f:m:n:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "-d":
+            dictionary_file = a
+        elif o == "-p":
+            postings_file = a
+        elif o == "-q":
+            file_of_queries = a
+        elif o == "-o":
+            file_of_output = a
+        elif o == "-w":
+            num_workers = int(a)
+        elif o == "-t":
+            trace_file = a
+        elif o == "-f":
+            prefetch_threads = int(a)
+        elif o == "-m":
+            mode = a
+        elif o == "-n":
+            limit = int(a)
+        else:
+            assert False, "unhandled option"
+
+    if (
+        dictionary_file == None
+        or postings_file == None
+        or file_of_queries == None
+        or file_of_output == None
+    ):
+        usage()
+        sys.exit(2)
+
+    run_search(
+        dictionary_file,
+        postings_file,
+        file_of_queries,
+        file_of_output,
+        num_workers,
+        trace_file,
+        prefetch_threads,
+        mode,
+        limit,
+    )
+    # print("Evaluating 'naive' search")
+    # evaluate_runtime(
+    #     dictionary_file, postings_file, file_of_queries, search_fn=naive_search
+    # )
+    # print("Evaluating 'optimised' search")
+    # evaluate_runtime(dictionary_file, postings_file, file_of_queries, search_fn=opt_search)
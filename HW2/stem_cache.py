@@ -0,0 +1,76 @@
+"""
+Bounded memo cache of the stems of surface forms, shared between indexing and querying.
+
+By Zipf's law most token occurrences are repetitions of a small number of surface forms, so most
+calls to PorterStemmer.stem can be answered from a cache. The cache is saved next to the index
+and preloaded by search, so that query terms seen while indexing are not stemmed again.
+"""
+from collections import OrderedDict
+import os
+import pickle
+import time
+
+DEFAULT_CAPACITY = 100000
+
+
+class StemCache:
+    """
+    Least recently used cache in front of a stemmer. It has the same stem method as the stemmer
+    so it can be used in its place.
+    """
+
+    def __init__(self, stemmer, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.stemmer = stemmer
+        self.capacity = capacity
+        self.stems = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Time spent in the stemmer on misses, used to estimate the time saved by the hits
+        self.miss_time = 0.0
+
+    def stem(self, word: str, to_lowercase: bool = True) -> str:
+        if not to_lowercase:
+            return self.stemmer.stem(word, to_lowercase=False)
+        stem = self.stems.get(word)
+        if stem is not None:
+            self.hits += 1
+            self.stems.move_to_end(word)
+            return stem
+        start = time.perf_counter()
+        stem = self.stemmer.stem(word, to_lowercase=True)
+        self.miss_time += time.perf_counter() - start
+        self.misses += 1
+        self.stems[word] = stem
+        if len(self.stems) > self.capacity:
+            self.stems.popitem(last=False)
+        return stem
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def time_saved(self) -> float:
+        """Estimated time the hits would have spent in the stemmer"""
+        return self.hits * self.miss_time / self.misses if self.misses else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Stem cache: {self.hits + self.misses} lookups, {self.hit_rate():.1%} hits, "
+            f"{len(self.stems)} entries, ~{self.time_saved():.2f}s of stemming saved"
+        )
+
+    def load(self, filename: str):
+        """Preload the entries saved by save, most recently used last"""
+        if not os.path.exists(filename):
+            return
+        with open(filename, "rb") as f:
+            entries = pickle.load(f)
+        for word, stem in entries[-self.capacity :]:
+            self.stems[word] = stem
+
+    def save(self, filename: str):
+        """Atomically replace the cache file with the current entries"""
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(list(self.stems.items()), f)
+        os.replace(tmp_file, filename)
@@ -0,0 +1,43 @@
+"""Checks of the phase report of a build"""
+import json
+import time
+
+from build_profiler import BuildProfiler
+from conftest import DOC_IDS, search_lines
+
+PHASES = ["tokenisation", "inversion", "block flushing", "merging", "dictionary write"]
+
+
+def test_nested_phases():
+    profiler = BuildProfiler()
+    profiler.start()
+    with profiler.phase("outer"):
+        time.sleep(0.05)
+        for _ in range(2):
+            with profiler.phase("inner"):
+                time.sleep(0.05)
+    profiler.stop()
+    report = profiler.report()
+    # The time of a phase excludes the phases nested in it
+    assert report["phases"]["inner"]["calls"] == 2
+    inner, outer = report["phases"]["inner"]["wall_s"], report["phases"]["outer"]["wall_s"]
+    assert inner >= 0.1 and 0.05 <= outer < inner
+    assert report["wall_s"] >= inner + outer
+    # A disabled profiler only runs the phases
+    disabled = BuildProfiler(enabled=False)
+    with disabled.phase("outer"):
+        pass
+    assert not disabled.phases and disabled.wrap("outer", len) is len
+
+
+def test_build_report(build, reference):
+    for trace_allocations in [False, True]:
+        index = build(f"index-{trace_allocations}", report_file="report.json", trace_allocations=trace_allocations)
+        # Profiling does not change the index
+        assert search_lines(*index) == reference
+        with open("report.json") as f:
+            report = json.load(f)
+        assert set(PHASES) <= set(report["phases"])
+        assert report["phases"]["tokenisation"]["calls"] == len(DOC_IDS)
+        assert report["blocks"]["count"] == report["phases"]["block flushing"]["calls"] > 0
+        assert all(("top_allocations" in stats) == trace_allocations for stats in report["phases"].values())
@@ -0,0 +1,56 @@
+"""Checks of the container format of the index files and of detecting damaged containers"""
+import shutil
+
+import pytest
+
+from conftest import DOC_IDS, search_lines, write_collection
+from index import Indexer
+from index_container import Container, CorruptIndexError
+from search import run_search
+
+
+@pytest.mark.parametrize("postings_format", ["pickle", "blocks"])
+def test_container_index(build, workdir, queries_file, reference, read_results, postings_format):
+    index = build("index", postings_format=postings_format, file_format="container")
+    assert all(Container(filename).kind for filename in index)
+    assert search_lines(*index) == reference
+    run_search(*index, queries_file, "out.txt", num_workers=3)
+    assert read_results("out.txt") == reference
+    # Deltas and merges keep the container format
+    base = build("base", postings_format=postings_format, file_format="container",
+                 in_dir=write_collection(workdir / "base", DOC_IDS[:100]))
+    indexer = Indexer(*base, merge_ratio=10)
+    indexer.add_documents(str(write_collection(workdir / "added", DOC_IDS[100:])))
+    indexer.verify()
+    assert search_lines(*base) == reference
+    indexer.merge_segments()
+    assert search_lines(*base) == reference
+    indexer.load()
+    assert indexer.file_format == "container"
+    indexer.verify()
+
+
+def test_corrupted_containers(build, workdir):
+    out_dict, out_postings = build("index", postings_format="blocks", file_format="container")
+    other_dict, _ = build("other", postings_format="blocks", file_format="container")
+    data = open(out_postings, "rb").read()
+    offset = Container(out_postings).get_offset("postings")
+
+    def damaged(postings):
+        with open("damaged.postings", "wb") as f:
+            f.write(postings)
+        shutil.copy(out_dict, "damaged.dict")
+        return Indexer("damaged.dict", "damaged.postings")
+
+    # A truncated file and a dictionary of another build are rejected on load
+    for indexer in [damaged(data[:-1]), damaged(data[: len(data) // 2]), Indexer(other_dict, out_postings)]:
+        with pytest.raises(CorruptIndexError):
+            indexer.load()
+    # A flipped byte of the postings is only found by checking the crc32 of the sections
+    indexer = damaged(data[:offset] + bytes([data[offset] ^ 1]) + data[offset + 1 :])
+    indexer.load()
+    with pytest.raises(CorruptIndexError):
+        indexer.verify()
+    # A flipped byte of the header after the magic is found on load
+    with pytest.raises(CorruptIndexError):
+        damaged(data[:8] + bytes([data[8] ^ 1]) + data[9:]).load()
@@ -1,5 +1,5 @@
 from index import Indexer
-from index import WordToPointerEntry, PostingsList, Posting
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
 
 indexer = Indexer(out_dict="dictionary.txt", out_postings="postings.txt")
 indexer.load()
@@ -5,7 +5,7 @@ from index import Indexer, UNIVERSE
 # These imports are necessary for Pickle.load
 # Python needs to know what classes are being deserialized into so we need
 # to load the classes into memory for Pickle to work
-from index import WordToPointerEntry, PostingsList, Posting
+from index import WordToPointerEntry, PostingsList, Posting, IndexHeader
 
 
 d = "dictionary.txt"
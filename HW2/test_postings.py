@@ -0,0 +1,103 @@
+"""Checks of the encodings of the posting lists and of reading them back"""
+import random
+from bisect import bisect_left
+
+import pytest
+
+from block_postings import BLOCK_SIZE, SKIP_FANOUT, BlockCursor, decode_postings, encode_postings
+from codec_benchmark import run_codec_benchmark
+from conftest import DOC_IDS, search_lines
+from index import REORDERINGS, Indexer
+from postings_codec import CODECS
+from search import run_search
+
+# Lengths around the block boundaries and with one, two and three levels of skip directory
+LIST_LENGTHS = [0, 1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, BLOCK_SIZE * SKIP_FANOUT + 1, 40000]
+
+
+def sorted_doc_ids(length: int, rng: random.Random) -> list[int]:
+    """Distinct sorted doc ids starting at 0, with small and large gaps"""
+    doc_ids, docId = [], 0
+    for _ in range(length):
+        doc_ids.append(docId)
+        docId += rng.choice([1, 1, 2, 3, 17, 1000])
+    return doc_ids
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_codec_round_trip(codec):
+    rng = random.Random(3245)
+    # Every power of two and its neighbours up to the 60 bits of a Simple-8b integer
+    edges = sorted({n for k in range(60) for n in [(1 << k) - 1, 1 << k, (1 << k) + 1] if n < 1 << 60})
+    cases = [[], [0], [1], [0] * 300, [1] * 300, edges, [rng.choice(edges[:40]) for _ in range(1000)]]
+    # Runs of zeros of every length next to larger integers, for the Simple-8b selectors
+    cases += [[0] * n + [5] + [0] * n for n in [1, 59, 60, 61, 119, 120, 121, 239, 240, 241]]
+    for numbers in cases:
+        data = CODECS[codec].encode(numbers)
+        assert CODECS[codec].decode(data, len(numbers)) == numbers
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_block_postings_round_trip(codec):
+    rng = random.Random(3245)
+    for length in LIST_LENGTHS:
+        doc_ids = sorted_doc_ids(length, rng)
+        assert decode_postings(encode_postings(doc_ids, codec), codec) == doc_ids
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_block_cursor(codec):
+    rng = random.Random(3245)
+    for length in LIST_LENGTHS:
+        doc_ids = sorted_doc_ids(length, rng)
+        data = encode_postings(doc_ids, codec)
+        read = lambda offset, length: data[offset : offset + length]
+        # Targets on, between and around the doc ids, in increasing then random order
+        last = doc_ids[-1] if doc_ids else 0
+        targets = sorted(rng.sample(range(last + 2), min(last + 2, 500)) + doc_ids[::97])
+        for order in [targets, rng.sample(targets, len(targets))]:
+            cursor = BlockCursor(read, 0, codec)
+            assert len(cursor) == length
+            for target in order:
+                i = bisect_left(doc_ids, target)
+                assert cursor.next_geq(target) == (doc_ids[i] if i < len(doc_ids) else None)
+        candidates = sorted(set(rng.sample(range(last + 2), min(last + 2, 300))))
+        cursor = BlockCursor(read, 0, codec)
+        assert cursor.intersect(candidates) == sorted(set(candidates) & set(doc_ids))
+        if length == LIST_LENGTHS[-1]:
+            # A single probe only reads the path down the directory and one block
+            cursor = BlockCursor(read, 0, codec)
+            cursor.next_geq(doc_ids[length // 2])
+            assert cursor.blocks_read == 1 and cursor.bytes_read < len(data) // 10
+
+
+def test_blocks_index(build, queries_file, reference, read_results):
+    for codec in CODECS:
+        index = build(f"index-{codec}", postings_format="blocks", codec=codec)
+        assert search_lines(*index) == reference
+        # opt_search probes the lists of the AND queries with cursors
+        run_search(*index, queries_file, "out.txt")
+        assert read_results("out.txt") == reference
+
+
+def test_codec_benchmark(collection):
+    report = run_codec_benchmark(str(collection))
+    assert [row["codec"] for row in report] == ["pickle"] + list(CODECS)
+    # Every codec decodes the same postings
+    assert len({row["num_postings"] for row in report}) == 1
+
+
+@pytest.mark.parametrize("reorder", REORDERINGS)
+def test_reordered_index(build, queries_file, reference, read_results, reorder):
+    index = build(f"index-{reorder}", postings_format="blocks", reorder=reorder)
+    indexer = Indexer(*index)
+    indexer.load()
+    doc_map = indexer.doc_map
+    if reorder == "none":
+        assert doc_map is None
+    else:
+        assert sorted(doc_map.external_ids) == DOC_IDS
+    # The results are in external doc ids, sorted
+    assert search_lines(*index) == reference
+    run_search(*index, queries_file, "out.txt")
+    assert read_results("out.txt") == reference
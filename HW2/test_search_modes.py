@@ -0,0 +1,130 @@
+"""Checks that the ways of running the queries return the results of naive_search"""
+import fnmatch
+import json
+import os
+import random
+import subprocess
+import sys
+
+from benchmark import DEFAULT_WORKLOADS, EVALUATORS, TermSampler, generate_workload, run_benchmark
+from conftest import QUERIES, VOCABULARY, search_lines
+from index import UNIVERSE, Indexer, read_shards
+from kgram_index import KGramIndex
+from search import DEFAULT_PREFETCH_THREADS, count_search, first_search, run_search, stream_search
+
+
+def test_parallel_search(build, queries_file, reference, read_results):
+    index = build("index")
+    for num_workers in [1, 3]:
+        run_search(*index, queries_file, f"out{num_workers}.txt", num_workers=num_workers)
+        assert read_results(f"out{num_workers}.txt") == reference
+
+
+def test_tracing(build, queries_file, reference, read_results):
+    index = build("index")
+    run_search(*index, queries_file, "out.txt", trace_file="trace.jsonl", prefetch_threads=0)
+    assert read_results("out.txt") == reference
+    with open("trace.jsonl") as f:
+        traces = [json.loads(line) for line in f]
+    assert [trace["query"] for trace in traces] == QUERIES
+    for trace, results in zip(traces, reference):
+        # The root of the plan is evaluated last
+        assert trace["nodes"][-1]["output"] == len(results.split())
+        if results:
+            assert trace["bytes_read"] > 0
+
+
+def test_benchmark_evaluators_agree(build):
+    index = build("index")
+    report = run_benchmark(*index, num_queries=20)
+    assert {row["evaluator"] for row in report} == set(EVALUATORS)
+    assert all(row["mismatches"] == 0 for row in report)
+    # The workloads only depend on the seed
+    indexer = Indexer(*index)
+    indexer.load()
+    shape = DEFAULT_WORKLOADS[-1]
+    workloads = [
+        generate_workload(shape, 20, TermSampler(indexer, random.Random(f"3245-{shape.name}"))) for _ in range(2)
+    ]
+    assert workloads[0] == workloads[1]
+
+
+def test_kgram_expansion():
+    terms = VOCABULARY + ["a", "ab", "aba", "abab", "ba", "bab"]
+    kgram_index = KGramIndex.build(terms)
+    patterns = ["w1*", "*9", "w*5", "*1*", "w*", "*", "x*", "w1*1", "w**2", "a*", "*ab", "ab*ba", "*b*b*", "aba*"]
+    for pattern in patterns:
+        assert kgram_index.expand(pattern) == sorted(fnmatch.filter(terms, pattern)), pattern
+
+
+def test_wildcard_queries(build, workdir, read_results):
+    index = build("index")
+    indexer = Indexer(*index)
+    indexer.load()
+    vocabulary = [term for term in indexer.word_to_pointer_dict if term != UNIVERSE]
+
+    def expand(token):
+        # Every matching term of the vocabulary as an OR, or a term of no document
+        matches = sorted(fnmatch.filter(vocabulary, token))
+        return f"({' OR '.join(matches)})" if matches else "missing"
+
+    queries = ["w1*", "w1* AND NOT w2", "*9 OR w5*", "w*1* AND w3", "NOT w5*", "zz* OR w0", "(w2* AND *7) OR w3"]
+    expanded = [
+        " ".join(
+            expand(token) if "*" in token else token
+            for token in query.replace("(", "( ").replace(")", " )").split()
+        )
+        for query in queries
+    ]
+    expected = search_lines(*index, expanded)
+    assert all(expected)
+    assert search_lines(*index, queries) == expected
+    (workdir / "wildcards.txt").write_text("\n".join(queries))
+    run_search(*index, str(workdir / "wildcards.txt"), "out.txt")
+    assert read_results("out.txt") == expected
+
+
+def test_sharded_search(build, queries_file, reference, read_results):
+    index = build("index", num_shards=3)
+    assert len(read_shards(index[0])) == 3
+    run_search(*index, queries_file, "out.txt")
+    assert read_results("out.txt") == reference
+    run_search(*index, queries_file, "count.txt", mode="count")
+    assert read_results("count.txt") == [str(len(results.split())) for results in reference]
+
+
+def test_prefetch(build, queries_file, reference, read_results):
+    index = build("index")
+    for prefetch_threads in [0, 1, DEFAULT_PREFETCH_THREADS]:
+        run_search(*index, queries_file, "out.txt", prefetch_threads=prefetch_threads)
+        assert read_results("out.txt") == reference
+    # Worker processes forked after the prefetch threads were started must not wait on them
+    script = (
+        "from search import run_search\n"
+        "from index import WordToPointerEntry, PostingsList, Posting, IndexHeader\n"
+        f"run_search({index[0]!r}, {index[1]!r}, {queries_file!r}, 'out1.txt')\n"
+        f"run_search({index[0]!r}, {index[1]!r}, {queries_file!r}, 'out3.txt', num_workers=3)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=60)
+    assert read_results("out3.txt") == reference
+
+
+def test_result_modes(build, queries_file, reference, read_results):
+    index = build("index")
+    for num_workers in [1, 3]:
+        run_search(*index, queries_file, "count.txt", mode="count", num_workers=num_workers)
+        assert read_results("count.txt") == [str(len(results.split())) for results in reference]
+        for limit in [1, 5, 1000]:
+            run_search(*index, queries_file, "first.txt", mode="first", limit=limit, num_workers=num_workers)
+            assert read_results("first.txt") == [" ".join(results.split()[:limit]) for results in reference]
+        run_search(*index, queries_file, "stream.txt", mode="stream", num_workers=num_workers)
+        assert read_results("stream.txt") == reference
+    # Chunks smaller than the results, and the reordered index whose results are sorted at the end
+    for reorder in ["none", "docid"]:
+        indexer = Indexer(*build(f"index-{reorder}", postings_format="blocks", reorder=reorder))
+        indexer.load()
+        for query, results in zip(QUERIES, reference):
+            assert "".join(stream_search(query, indexer, indexer.stemmer, chunk_size=7)) == results
+            assert count_search(query, indexer, indexer.stemmer) == len(results.split())
+            assert first_search(query, indexer, indexer.stemmer, 4) == " ".join(results.split()[:4])
@@ -0,0 +1,71 @@
+"""Checks that appending, deleting and merging documents keep the results of a full build"""
+from conftest import DOC_IDS, QUERIES, search_lines, write_collection
+from index import Indexer, read_shards
+from search import naive_search
+
+
+def test_append_and_merge(build, workdir, reference):
+    index = build("index", in_dir=write_collection(workdir / "base", DOC_IDS[:100]))
+    added = [write_collection(workdir / f"added{i}", DOC_IDS[100 + i :: 2]) for i in range(2)]
+    # The merge policy is relaxed so that the deltas are kept until the explicit merge
+    indexer = Indexer(*index, merge_ratio=10)
+    for collection_dir in added:
+        indexer.add_documents(str(collection_dir))
+    assert len(indexer.deltas) == 2
+    assert search_lines(*index) == reference
+    reader = Indexer(*index)
+    reader.load()
+    indexer.merge_segments()
+    assert not indexer.deltas and not indexer.read_manifest()
+    assert search_lines(*index) == reference
+    # A reader loaded before the merge keeps reading the files it loaded
+    assert [naive_search(query, reader, reader.stemmer) for query in QUERIES] == reference
+
+
+def test_background_merge(build, workdir, reference):
+    index = build("index", in_dir=write_collection(workdir / "base", DOC_IDS[:100]))
+    indexer = Indexer(*index)
+    # More than merge_ratio of the documents of the main segment
+    indexer.add_documents(str(write_collection(workdir / "added", DOC_IDS[100:])))
+    indexer.wait_for_merge()
+    assert not indexer.deltas
+    assert search_lines(*index) == reference
+
+
+def test_delete_and_purge(build, workdir):
+    deleted = DOC_IDS[::7]
+    remaining = write_collection(workdir / "remaining", [docId for docId in DOC_IDS if docId not in deleted])
+    expected = search_lines(*build("expected", in_dir=remaining))
+    for reorder in ["none", "docid"]:
+        index = build(f"index-{reorder}", reorder=reorder)
+        indexer = Indexer(*index)
+        # Ids which were never indexed and repeated ids are not deleted
+        assert indexer.delete_documents(deleted + [2, 10**6, deleted[0]]) == deleted
+        assert indexer.delete_documents(deleted) == []
+        assert search_lines(*index) == expected
+        indexer.load()
+        indexer.merge_segments()
+        assert not indexer.deleted
+        assert search_lines(*index) == expected
+
+
+def test_delete_from_shards(build):
+    shards = read_shards(build("index", num_shards=3)[0])
+    deleted = DOC_IDS[::5] + [2]
+    per_shard = [Indexer(*shard).delete_documents(deleted) for shard in shards]
+    # Every document is deleted from the one shard which holds it
+    assert sorted(sum(per_shard, [])) == sorted(DOC_IDS[::5])
+
+
+def test_delete_from_deltas(build, workdir):
+    deleted = DOC_IDS[::7]
+    remaining = write_collection(workdir / "remaining", [docId for docId in DOC_IDS if docId not in deleted])
+    expected = search_lines(*build("expected", in_dir=remaining))
+    index = build("index", in_dir=write_collection(workdir / "base", DOC_IDS[:100]))
+    indexer = Indexer(*index, merge_ratio=10)
+    indexer.add_documents(str(write_collection(workdir / "added", DOC_IDS[100:])))
+    assert indexer.delete_documents(deleted) == deleted
+    assert search_lines(*index) == expected
+    indexer.merge_segments()
+    assert not indexer.deltas and not indexer.deleted
+    assert search_lines(*index) == expected
@@ -0,0 +1,48 @@
+"""Checks that the stem cache returns the stems of the stemmer it caches"""
+import os
+import random
+
+import nltk
+
+from conftest import QUERIES
+from index import Indexer
+from stem_cache import StemCache
+
+WORDS = ["running", "Runs", "ran", "Cats", "cat", "generously", "stemming", "stemmed", "a", "The"]
+
+
+def test_stems():
+    stemmer = nltk.stem.PorterStemmer()
+    cache = StemCache(nltk.stem.PorterStemmer(), capacity=4)
+    words = random.Random(3245).choices(WORDS, k=500)
+    for word in words:
+        assert cache.stem(word) == stemmer.stem(word)
+        assert cache.stem(word, to_lowercase=False) == stemmer.stem(word, to_lowercase=False)
+        assert len(cache.stems) <= 4
+    assert cache.hits + cache.misses == len(words) and cache.hits > 0
+
+
+def test_save_and_load(workdir):
+    cache = StemCache(nltk.stem.PorterStemmer())
+    for word in WORDS:
+        cache.stem(word)
+    cache.save("stems")
+    # Only the most recently used entries fit in a smaller cache
+    loaded = StemCache(nltk.stem.PorterStemmer(), capacity=3)
+    loaded.load("stems")
+    assert list(loaded.stems.items()) == list(cache.stems.items())[-3:]
+    StemCache(nltk.stem.PorterStemmer()).load("missing")
+
+
+def test_preloaded_for_search(build):
+    index = build("index")
+    assert os.path.exists(f"{index[0]}.stems")
+    indexer = Indexer(*index)
+    indexer.load()
+    assert indexer.stemmer.stems
+    # The query terms were seen while indexing, so they are not stemmed again
+    for query in QUERIES:
+        for word in query.replace("(", " ").replace(")", " ").split():
+            if word not in ["AND", "OR", "NOT", "missing"]:
+                indexer.stemmer.stem(word)
+    assert indexer.stemmer.misses == 0
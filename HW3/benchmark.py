@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+"""
+Benchmark of the search modes on a file of queries.
+
+Runs every query of the file with each search mode and reports the mean, median and 95th
+percentile latency, or only the mean latency of the batch modes which answer all the queries at
+once, the fraction of postings the pruning modes skipped scoring (they still decode every posting
+list in full, so this is not a fraction of the postings read), and how well the results agree
+with the exact term-at-a-time search as recall@K, the fraction of the exact top K which is also
+returned, and the fraction of queries whose ranking is identical.
+
+Given a second index, e.g. one built with quantised weights, it also compares the sizes of the two
+indexes and how well the exact search on the second index agrees with the first one as overlap@K
+and nDCG@K, where the gain of a document is its cosine score on the first index.
+"""
+import getopt
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+from index import Indexer
+from search import SEARCH_MODES, PRUNING_MODES, BATCH_MODES, PruningStats, cosine_scores, rank_scores
+
+# These imports are necessary for pickle to work
+from index import Posting, PostingList, WordToPointerEntry
+
+# The search mode the results of the other modes are compared to
+EXACT_MODE = "taat"
+
+
+def run_mode(mode: str, queries: list[str], indexer: Indexer, K: int = 10):
+    """
+    Run the queries with the search mode, returns the results, latencies and pruning stats.
+    The batch modes return the total latency as the only latency.
+    """
+    stats = PruningStats()
+    if mode in BATCH_MODES:
+        start = time.perf_counter()
+        results = BATCH_MODES[mode](queries, indexer, K=K)
+        return results, [time.perf_counter() - start], stats
+    search_fn = SEARCH_MODES[mode]
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        if mode in PRUNING_MODES:
+            results.append(search_fn(query, indexer, K=K, stats=stats))
+        else:
+            results.append(search_fn(query, indexer, K=K))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies, stats
+
+
+def recall_at_k(results: list[int], exact: list[int]) -> float:
+    if not exact:
+        return 1.0
+    return len(set(results) & set(exact)) / len(exact)
+
+
+def ndcg_at_k(results: list[int], scores: dict, K: int = 10) -> float:
+    """nDCG of the results, graded by the scores of the reference index"""
+    ideal = sorted(scores.values(), reverse=True)[:K]
+    ideal_dcg = sum(gain / math.log2(i + 2) for i, gain in enumerate(ideal))
+    if ideal_dcg == 0:
+        return 1.0
+    dcg = sum(scores.get(d, 0.0) / math.log2(i + 2) for i, d in enumerate(results[:K]))
+    return dcg / ideal_dcg
+
+
+def compare_indexes(dict_file, postings_file, other_dict, other_postings, queries_file, K=10) -> dict:
+    """Compare the sizes and the exact results of the other index to those of the index"""
+    with open(queries_file, "r") as qf:
+        queries = [line.strip() for line in qf]
+    indexer = Indexer(dict_file, postings_file)
+    other = Indexer(other_dict, other_postings)
+    overlaps = []
+    ndcgs = []
+    identical = 0
+    for query in queries:
+        scores = cosine_scores(query, indexer)
+        exact = rank_scores(scores, K)
+        results = rank_scores(cosine_scores(query, other), K)
+        overlaps.append(recall_at_k(results, exact))
+        ndcgs.append(ndcg_at_k(results, scores, K))
+        identical += results == exact
+    sizes = {}
+    for name, filename, other_filename in [
+        ("dictionary", dict_file, other_dict),
+        ("postings", postings_file, other_postings),
+    ]:
+        size, other_size = os.path.getsize(filename), os.path.getsize(other_filename)
+        sizes[name] = {
+            "bytes": size,
+            "other_bytes": other_size,
+            "reduction": 1 - other_size / size,
+        }
+    return {
+        "queries": len(queries),
+        "sizes": sizes,
+        f"overlap@{K}": statistics.mean(overlaps) if overlaps else 1.0,
+        f"ndcg@{K}": statistics.mean(ndcgs) if ndcgs else 1.0,
+        "identical": identical / len(queries) if queries else 1.0,
+    }
+
+
+def run_benchmark(dict_file, postings_file, queries_file, modes=None, K=10) -> list[dict]:
+    """
+    Benchmark the search modes on the queries of the file, by default all the modes the index
+    was built for
+    """
+    with open(queries_file, "r") as qf:
+        queries = [line.strip() for line in qf]
+    indexer = Indexer(dict_file, postings_file)
+    if modes is None:
+        # The tiers are only built on request, so the modes searching a missing one are left out
+        tier_files = {"impact": indexer.impact_dict_file, "champion": indexer.champion_dict_file}
+        modes = []
+        for mode in list(SEARCH_MODES) + list(BATCH_MODES):
+            if mode in tier_files and not os.path.exists(tier_files[mode]):
+                print(f"skipping {mode}, {tier_files[mode]} not found", file=sys.stderr)
+            else:
+                modes.append(mode)
+    # Load the dictionary and lengths before timing anything
+    indexer.load()
+    exact, _, _ = run_mode(EXACT_MODE, queries, indexer, K)
+    report = []
+    for mode in modes:
+        results, latencies, stats = run_mode(mode, queries, indexer, K)
+        latencies.sort()
+        batch = mode in BATCH_MODES
+        report.append(
+            {
+                "mode": mode,
+                "queries": len(queries),
+                "total_s": sum(latencies),
+                "mean_ms": 1000 * sum(latencies) / len(queries),
+                "p50_ms": None if batch else 1000 * statistics.median(latencies),
+                "p95_ms": None if batch else 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+                "skipped_postings": stats.skipped_fraction() if mode in PRUNING_MODES else None,
+                f"recall@{K}": statistics.mean(recall_at_k(r, e) for r, e in zip(results, exact)),
+                "identical": sum(r == e for r, e in zip(results, exact)) / len(queries),
+            }
+        )
+    return report
+
+
+def print_report(report, K=10):
+    print(
+        f"{'mode':<10} {'total s':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'skipped':>8} {f'recall@{K}':>10} {'identical':>10}"
+    )
+    for row in report:
+        skipped = "-" if row["skipped_postings"] is None else f"{row['skipped_postings']:.1%}"
+        p50 = "-" if row["p50_ms"] is None else f"{row['p50_ms']:.2f}"
+        p95 = "-" if row["p95_ms"] is None else f"{row['p95_ms']:.2f}"
+        print(
+            f"{row['mode']:<10} {row['total_s']:>8.2f} {row['mean_ms']:>8.2f} {p50:>8} "
+            f"{p95:>8} {skipped:>8} {row[f'recall@{K}']:>10.4f} {row['identical']:>10.1%}"
+        )
+
+
+def print_comparison(comparison, K=10):
+    print(f"{'file':<10} {'bytes':>12} {'other':>12} {'reduction':>10}")
+    for name, size in comparison["sizes"].items():
+        print(f"{name:<10} {size['bytes']:>12} {size['other_bytes']:>12} {size['reduction']:>10.1%}")
+    print(
+        f"overlap@{K} {comparison[f'overlap@{K}']:.4f}  ndcg@{K} {comparison[f'ndcg@{K}']:.4f}  "
+        f"identical {comparison['identical']:.1%}"
+    )
+
+
+def usage():
+    print(
+        "usage: "
+        + sys.argv[0]
+        + " -d dictionary-file -p postings-file -q file-of-queries [-m mode,mode...] [-k K] [-o report-file]"
+        + " [-D other-dictionary-file -P other-postings-file]"
+    )
+    print(f"  -m: comma separated search modes of {list(SEARCH_MODES) + list(BATCH_MODES)}, defaults to all of those the index was built for")
+    print("  -D, -P: another index of the same collection to compare to the index, e.g. a quantised one")
+
+
+if __name__ == "__main__":
+    dictionary_file = postings_file = file_of_queries = report_file = None
+    other_dictionary_file = other_postings_file = None
+    modes = None
+    K = 10
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "d:p:q:m:k:o:D:P:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "-d":
+            dictionary_file = a
+        elif o == "-p":
+            postings_file = a
+        elif o == "-q":
+            file_of_queries = a
+        elif o == "-m":
+            modes = a.split(",")
+        elif o == "-k":
+            K = int(a)
+        elif o == "-o":
+            report_file = a
+        elif o == "-D":
+            other_dictionary_file = a
+        elif o == "-P":
+            other_postings_file = a
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None or file_of_queries == None:
+        usage()
+        sys.exit(2)
+    if (other_dictionary_file == None) != (other_postings_file == None):
+        usage()
+        sys.exit(2)
+    for mode in modes or []:
+        if mode not in SEARCH_MODES and mode not in BATCH_MODES:
+            raise ValueError(f"mode should be one of {list(SEARCH_MODES) + list(BATCH_MODES)}")
+
+    report = run_benchmark(dictionary_file, postings_file, file_of_queries, modes, K)
+    print_report(report, K)
+    if other_dictionary_file is not None:
+        comparison = compare_indexes(
+            dictionary_file, postings_file, other_dictionary_file, other_postings_file, file_of_queries, K
+        )
+        print()
+        print_comparison(comparison, K)
+        report = {"modes": report, "comparison": comparison}
+    if report_file is not None:
+        with open(report_file, "w") as outf:
+            json.dump(report, outf, indent=2)
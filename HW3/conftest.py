@@ -0,0 +1,89 @@
+"""
+Fixtures of the checks of the index and search modes, which build small indexes of a generated
+collection in a temporary directory. Run them with python -m pytest from this directory.
+"""
+import random
+
+import pytest
+
+from index import build_index
+from search import cosine_scores, search
+
+# These imports are necessary for pickle to work
+from index import Posting, PostingList, WordToPointerEntry
+
+VOCABULARY = [f"w{i}" for i in range(80)]
+# The earlier words are more frequent, so the posting lists and the term frequencies vary
+WORD_WEIGHTS = [1 / (i + 1) for i in range(len(VOCABULARY))]
+DOC_IDS = list(range(1, 900, 3))
+QUERIES = [
+    "w1",
+    "w1 w2",
+    "w3 w3 w40",
+    "w0 w1 w2 w3 w4 w5 w6 w7",
+    "w10 w20 w30 w40 w50 w60 w70",
+    "w79",
+    "w70 w71 missing",
+    "missing",
+    "W2 w2 w9",
+]
+
+
+def document_text(docId: int) -> str:
+    """The text of a document only depends on its doc id, so any subset can be indexed"""
+    rng = random.Random(docId)
+    return " ".join(rng.choices(VOCABULARY, WORD_WEIGHTS, k=rng.randint(5, 60))) + "."
+
+
+def write_collection(directory, doc_ids):
+    directory.mkdir()
+    for docId in doc_ids:
+        (directory / str(docId)).write_text(document_text(docId))
+    return directory
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary working directory for the index and results files of the checks"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def collection(workdir):
+    return write_collection(workdir / "collection", DOC_IDS)
+
+
+@pytest.fixture
+def build(workdir, collection):
+    """Builds an index of the collection with the keyword arguments of build_index"""
+
+    def build_named(name, in_dir=collection, **kwargs):
+        out_dict, out_postings = str(workdir / f"{name}.dict"), str(workdir / f"{name}.postings")
+        build_index(str(in_dir), out_dict, out_postings, **kwargs)
+        return out_dict, out_postings
+
+    return build_named
+
+
+@pytest.fixture
+def queries_file(workdir):
+    path = workdir / "queries.txt"
+    path.write_text("\n".join(QUERIES))
+    return str(path)
+
+
+def assert_top_k(results, query, indexer, K=10, scores=None, tolerance=1e-6):
+    """
+    The results are a top K of the scores, by default the exact cosine scores of search. The
+    documents within rounding of each other may be ranked in another order, so their scores are
+    compared instead of the docIds.
+    """
+    if scores is None:
+        scores = cosine_scores(query, indexer)
+        expected = search(query, indexer, K=K)
+    else:
+        expected = sorted(scores, key=lambda d: (-scores[d], d))[:K]
+    assert len(results) == len(expected) == len(set(results))
+    assert set(results) <= set(scores)
+    assert [scores[d] for d in results] == pytest.approx([scores[d] for d in expected], abs=tolerance)
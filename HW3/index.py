@@ -1,13 +1,100 @@
 #!/usr/bin/python3
+from array import array
+from collections import defaultdict
+from contextlib import ExitStack
+from itertools import accumulate, groupby
+import heapq
 import math
 import nltk
 import sys
 import getopt
 import os
 import pickle
+import shutil
 from dataclasses import dataclass
 import time
 
+# Number of levels the impacts of the impact-ordered postings are quantised to
+IMPACT_LEVELS = 255
+
+
+# Estimated memory used by a posting and by a term of the in-memory dict of index_collection_spimi
+POSTING_BYTES = 120
+TERM_BYTES = 200
+
+
+def encode_postings(doc_ids: array, weights: array) -> bytes:
+    """The postings of a term as the raw bytes of its docIds followed by its weights"""
+    return doc_ids.tobytes() + weights.tobytes()
+
+
+def decode_postings(data: bytes) -> tuple[array, array]:
+    """Read back the arrays of docIds and weights written by encode_postings"""
+    doc_ids, weights = array("i"), array("f")
+    middle = len(data) // (doc_ids.itemsize + weights.itemsize) * doc_ids.itemsize
+    doc_ids.frombytes(data[:middle])
+    weights.frombytes(data[middle:])
+    return doc_ids, weights
+
+
+# Layouts of the weights of the postings: float32, or uint8 quantised with a global scale or with
+# a scale per term
+WEIGHT_FORMATS = ["float", "global", "term"]
+# Number of levels of the quantised weights, the largest uint8
+WEIGHT_LEVELS = 255
+
+
+def vb_encode(numbers) -> bytes:
+    """Variable byte encoding, 7 bits per byte with the high bit set on the last byte"""
+    out = bytearray()
+    for n in numbers:
+        chunks = [n & 0x7F]
+        n >>= 7
+        while n:
+            chunks.append(n & 0x7F)
+            n >>= 7
+        chunks[0] |= 0x80
+        out.extend(reversed(chunks))
+    return bytes(out)
+
+
+def vb_decode(data: bytes) -> list[int]:
+    """Decode the numbers of vb_encode"""
+    numbers = []
+    n = 0
+    for byte in data:
+        if byte < 0x80:
+            n = (n << 7) | byte
+        else:
+            numbers.append((n << 7) | (byte & 0x7F))
+            n = 0
+    return numbers
+
+
+def encode_quantised_postings(doc_ids: array, weights: array, scale: float) -> tuple[bytes, float]:
+    """
+    The postings of a term as the uint8 levels of its weights, quantised to multiples of scale,
+    followed by the variable byte gaps of its sorted docIds.
+    Returns the encoded postings and their highest dequantised weight, rounded to float32 like
+    the weights decode_quantised_postings reads back so that it bounds them.
+    """
+    levels = array("B", (min(WEIGHT_LEVELS, max(1, round(w / scale))) for w in weights))
+    gaps = [b - a for a, b in zip([0] + doc_ids[:-1].tolist(), doc_ids)]
+    return levels.tobytes() + vb_encode(gaps), array("f", [max(levels) * scale])[0]
+
+
+def decode_quantised_postings(data: bytes, df: int, scale: float) -> tuple[array, array]:
+    """Read back the arrays of docIds and dequantised weights written by encode_quantised_postings"""
+    doc_ids = array("i", accumulate(vb_decode(data[df:])))
+    weights = array("f", (level * scale for level in data[:df]))
+    return doc_ids, weights
+
+
+def quantise_impact(impact: float, max_impact: float) -> int:
+    """Quantise an impact in (0, max_impact] to a level in [1, IMPACT_LEVELS]"""
+    return max(1, round(impact / max_impact * IMPACT_LEVELS))
+
+
 class Posting:
     """
     Posting abstraction which represents the docId and the term frequency
@@ -73,6 +160,13 @@ class WordToPointerEntry:
     pointer_offset: int
     # Doc frequency for the word
     df: int
+    # Max over the postings of tf weight / doc length, the upper bound of the contribution of the
+    # word to a cosine score before the query weight. None in dictionaries written without it
+    max_score: float = None
+    # idf of the word, None in dictionaries written before it was stored
+    idf: float = None
+    # Step of the uint8 quantised weights of the word, None if they are stored as float32
+    scale: float = None
 
     def __getstate__(self) -> object:
         return self.__dict__
@@ -83,13 +177,30 @@ class WordToPointerEntry:
 
 class Indexer:
     """Class used to index the collection of documents into a dictionary and postings file."""
-    def __init__(self, out_dict, out_postings, sortkey: str = "docid"):
+    def __init__(
+        self,
+        out_dict,
+        out_postings,
+        sortkey: str = "docid",
+        impact_ordered: bool = False,
+        champions: int = None,
+        memory_budget: int = None,
+        weight_format: str = "float",
+    ):
         """
 
         Args:
             out_dict (_type_): file path for dictionary
             out_postings (_type_): file path for postings list
             sortkey (str, optional): key to sort postings by. Used internally. Defaults to "docid".
+            impact_ordered (bool, optional): also write the impact-ordered postings used by the
+                score-at-a-time search. Defaults to False.
+            champions (int, optional): also write the champion lists tier of the top champions
+                postings of every term. Defaults to None.
+            memory_budget (int, optional): index with SPIMI within about this many bytes of
+                postings instead of in memory. Defaults to None.
+            weight_format (str, optional): one of WEIGHT_FORMATS, the quantised formats store
+                the docIds as gaps and need them sorted by docid. Defaults to "float".
 
         Raises:
             ValueError: _description_
@@ -103,6 +214,34 @@ class Indexer:
         if sortkey not in ["docid", "tf"]:
             raise ValueError("sortkey should either be 'docid' or 'tf'")
         self.sortkey = sortkey
+        if weight_format not in WEIGHT_FORMATS:
+            raise ValueError(f"weight_format should be one of {WEIGHT_FORMATS}")
+        if weight_format != "float" and sortkey != "docid":
+            raise ValueError("the quantised weight formats need the postings sorted by docid")
+        self.weight_format = weight_format
+        # Whether the loaded dictionary was written before the idf was stored, see load
+        self.legacy = False
+        self.impact_ordered = impact_ordered
+        # The impact-ordered postings are a variant of the index stored next to it
+        self.impact_dict_file = f"{out_dict}.impact"
+        self.impact_postings_file = f"{out_postings}.impact"
+        # Loaded from impact_dict_file when first needed
+        self.impact_dict = None
+        if champions is not None and champions < 1:
+            raise ValueError("champions should be at least 1")
+        self.champions = champions
+        # The champion lists tier has the same layout as the dictionary and postings
+        self.champion_dict_file = f"{out_dict}.champions"
+        self.champion_postings_file = f"{out_postings}.champions"
+        # Loaded from champion_dict_file when first needed
+        self.champion_dict = None
+        # The whole postings file once cache_postings is called, read from disk otherwise
+        self.postings_cache = None
+        # The highest tf weight / doc length of the collection, the scale of the impacts
+        self.max_impact = 0.0
+        if memory_budget is not None and memory_budget <= 0:
+            raise ValueError("memory_budget should be positive")
+        self.memory_budget = memory_budget
 
     def preprocess_text(self, text: str) -> list[str]:
         """
@@ -122,11 +261,29 @@ class Indexer:
 
     def index_collection(self, collection):
         """
-        In-memory indexing of the collection
-        We first write to our in-memory dict then we write to the file.
-        No need for any fancy SPIMI technique as required.
+        Indexing of the collection, in memory or with SPIMI.
+        Without a memory_budget, we first write to our in-memory dict then we write to the file.
+        With a memory_budget, the collection is indexed by index_collection_spimi instead, which
+        spills sorted blocks to disk and merges them. Both write the terms in sorted order, so they
+        write byte for byte the same index files.
+        """
+        if self.memory_budget is not None:
+            self.index_collection_spimi(collection)
+            return
+        for docId, sub_dict in self.tokenize_collection(collection):
+            # Now we have the docId and tf for all the terms, add it to dict
+            for single, posting in sub_dict.items():
+                if single not in self.dictionary:
+                    self.dictionary[single] = PostingList()
+                self.dictionary[single].append(posting)
+        # In term order like the merge of the SPIMI blocks, so both builds write the same files
+        self.write_index(sorted(self.dictionary.items(), key=lambda item: item[0]))
+
+    def tokenize_collection(self, collection):
+        """
+        Generator of the docId and the dict of term to Posting of every document of the
+        collection, with the tf weights precomputed. Records the document lengths.
         """
-        max_doc_id = 0
         for file in os.listdir(collection):
             path = os.path.join(collection, file)
             docId = int(file)
@@ -154,25 +311,171 @@ class Indexer:
             # For some reason, this two lines are actually not equivalent!
             # self.doc_lengths[docId] = math.hypot(*all_tfs)
             self.doc_lengths[docId] = math.sqrt(sum(tf ** 2 for tf in all_tfs))
-            # Now we have the docId and tf for all the terms, add it to dict
-            for single, posting in sub_dict.items():
-                if single not in self.dictionary:
-                    self.dictionary[single] = PostingList()
-                self.dictionary[single].append(posting)
+            if all_tfs:
+                self.max_impact = max(self.max_impact, max(all_tfs) / self.doc_lengths[docId])
+            yield docId, sub_dict
 
-        with open(self.out_postings, "wb") as outf:
-            for single, pl in self.dictionary.items():
+    def index_collection_spimi(self, collection):
+        """
+        SPIMI indexing of the collection within memory_budget bytes.
+        The postings are inverted into an in-memory dict until its estimated size exceeds the
+        budget, then the dict is spilled to disk as a block sorted by term. The blocks are merged
+        term by term into the same dictionary and postings files as index_collection,
+        so only the document lengths and one block or one merged PostingList are in memory.
+        """
+        block_dir = f"{self.out_postings}.blocks"
+        os.makedirs(block_dir, exist_ok=True)
+        block_files = []
+        dictionary = defaultdict(list)
+        used = 0
+        for docId, sub_dict in self.tokenize_collection(collection):
+            for single, posting in sub_dict.items():
+                if single not in dictionary:
+                    used += TERM_BYTES
+                dictionary[single].append(posting)
+                used += POSTING_BYTES
+            if used > self.memory_budget:
+                block_files.append(self.flush_block(block_dir, len(block_files), dictionary))
+                dictionary = defaultdict(list)
+                used = 0
+        if dictionary:
+            block_files.append(self.flush_block(block_dir, len(block_files), dictionary))
+        try:
+            self.write_index(self.merge_blocks(block_files))
+        finally:
+            shutil.rmtree(block_dir)
+
+    @staticmethod
+    def flush_block(block_dir, block_id, dictionary) -> str:
+        """
+        Write the dict of term to list of Postings to a block file as one pickled
+        (term, [(docId, tf), ...]) record per term in term order, returns its filename
+        """
+        filename = os.path.join(block_dir, f"block_{block_id}")
+        with open(filename, "wb") as outf:
+            for single in sorted(dictionary):
+                pickle.dump((single, [(p.docId, p.tf) for p in dictionary[single]]), outf)
+        return filename
+
+    @staticmethod
+    def read_block(filename):
+        """Generator of the (term, [(docId, tf), ...]) records of a block file"""
+        with open(filename, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def merge_blocks(self, block_files):
+        """
+        n-way merge of the block files, yields the term and the PostingList of every term
+        of the collection in term order, reading the blocks one record at a time
+        """
+        records = heapq.merge(*(self.read_block(f) for f in block_files), key=lambda r: r[0])
+        for single, term_records in groupby(records, key=lambda r: r[0]):
+            pl = PostingList()
+            for _, postings in term_records:
+                for docId, tf in postings:
+                    posting = Posting(docId)
+                    posting.tf = tf
+                    pl.append(posting)
+            yield single, pl
+
+    def write_index(self, term_postings):
+        """
+        Write the dictionary and postings files, and the impact-ordered postings and the
+        champion lists tier if enabled, from the (term, PostingList) pairs of the collection.
+        The pairs are consumed one at a time, so they can be produced by a merge.
+        The postings of a term are stored as the packed arrays of their docIds and of their tf
+        weights divided by the document length, and its dictionary entry holds its idf, so
+        search needs neither the document lengths nor the number of documents.
+        With a quantised weight_format, the weights are stored as uint8 multiples of the scale
+        of their dictionary entry and the docIds as variable byte gaps.
+        """
+        impact_terms = {}
+        champion_dict = {}
+        with ExitStack() as stack:
+            outf = stack.enter_context(open(self.out_postings, "wb"))
+            impact_f = champion_f = None
+            if self.impact_ordered:
+                impact_f = stack.enter_context(open(self.impact_postings_file, "wb"))
+            if self.champions is not None:
+                champion_f = stack.enter_context(open(self.champion_postings_file, "wb"))
+            N = len(self.doc_lengths)
+            for single, pl in term_postings:
                 pl.sort(key=self.sortkey)
+                doc_ids = array("i", (p.docId for p in pl.plist))
+                weights = array("f", (p.tf / self.doc_lengths[p.docId] for p in pl.plist))
                 pointer = outf.tell()
-                data = pickle.dumps(pl)
+                scale = None
+                if self.weight_format == "float":
+                    data, max_score = encode_postings(doc_ids, weights), max(weights)
+                else:
+                    max_weight = max(weights) if self.weight_format == "term" else self.max_impact
+                    scale = max_weight / WEIGHT_LEVELS
+                    data, max_score = encode_quantised_postings(doc_ids, weights, scale)
                 outf.write(data)
                 self.word_to_ptr_dict[single] = WordToPointerEntry(
-                    pointer, len(data), len(pl)
+                    pointer, len(data), len(pl), max_score, math.log(N / len(pl)), scale
                 )
+                if impact_f is not None:
+                    impact_terms[single] = self.write_impact_segments(impact_f, doc_ids, weights)
+                if champion_f is not None:
+                    champion_dict[single] = self.write_champion_list(champion_f, doc_ids, weights)
         with open(self.out_dict, "wb") as outf:
             pickle.dump(self.word_to_ptr_dict, outf)
-        with open("lengths.txt", "wb") as outf:
-            pickle.dump(self.doc_lengths, outf)
+        stale_files = []
+        if self.impact_ordered:
+            with open(self.impact_dict_file, "wb") as outf:
+                pickle.dump({"scale": self.max_impact / IMPACT_LEVELS, "terms": impact_terms}, outf)
+        else:
+            stale_files += [self.impact_dict_file, self.impact_postings_file]
+        if self.champions is not None:
+            with open(self.champion_dict_file, "wb") as outf:
+                pickle.dump(champion_dict, outf)
+        else:
+            stale_files += [self.champion_dict_file, self.champion_postings_file]
+        # Do not leave the variants of an earlier build next to the new index
+        for filename in stale_files:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def write_champion_list(self, outf, doc_ids: array, weights: array) -> WordToPointerEntry:
+        """
+        Write the champion list of a term to the champion postings file: only the champions
+        postings with the highest length-normalised weights are kept, sorted by docId.
+        The champion lists tier has its own dictionary in the layout of the full index.
+        """
+        best = sorted(heapq.nlargest(self.champions, zip(doc_ids, weights), key=lambda p: p[1]))
+        pointer = outf.tell()
+        data = encode_postings(array("i", (d for d, _ in best)), array("f", (w for _, w in best)))
+        outf.write(data)
+        return WordToPointerEntry(pointer, len(data), len(best))
+
+    def write_impact_segments(self, outf, doc_ids: array, weights: array) -> tuple[int, int]:
+        """
+        Write the impact-ordered postings of a term to the impact postings file, returns their
+        pointer and length.
+        The impact of a posting is its length-normalised weight, its contribution to the cosine
+        score before the query weight. Impacts are quantised to IMPACT_LEVELS levels of a global
+        scale, and the postings of a term are grouped into one segment per level, written by
+        decreasing impact with the docIds of every segment sorted.
+        The impact dictionary maps every term to the pointer and length of its pickled list of
+        (level, raw bytes of an array of docIds) segments, and stores the scale of the levels.
+        """
+        segments = defaultdict(list)
+        for docId, weight in zip(doc_ids, weights):
+            segments[quantise_impact(weight, self.max_impact)].append(docId)
+        data = pickle.dumps(
+            [
+                (level, array("i", sorted(segment_doc_ids)).tobytes())
+                for level, segment_doc_ids in sorted(segments.items(), reverse=True)
+            ]
+        )
+        pointer = outf.tell()
+        outf.write(data)
+        return pointer, len(data)
 
     def load(self):
         """
@@ -180,41 +483,191 @@ class Indexer:
         """
         with open(self.out_dict, "rb") as f:
             self.word_to_ptr_dict = pickle.load(f)
+        # Dictionaries written before the idf was stored point to pickled PostingLists of tf
+        # weights which still have to be normalised by the lengths file
+        first = next(iter(self.word_to_ptr_dict.values()), None)
+        self.legacy = first is not None and first.idf is None
+
+    def load_doc_lengths(self):
+        """Loads the lengths file, only needed by the indexes written before the idf was stored"""
         with open("lengths.txt", "rb") as f:
             self.doc_lengths = pickle.load(f)
 
+    def cache_postings(self):
+        """Reads the whole postings file into memory so that the postings are no longer read from disk"""
+        with open(self.out_postings, "rb") as f:
+            self.postings_cache = f.read()
+
+    def load_impact_dict(self):
+        if not os.path.exists(self.impact_dict_file):
+            raise ValueError(f"{self.impact_dict_file} not found, build the index with -I")
+        with open(self.impact_dict_file, "rb") as f:
+            self.impact_dict = pickle.load(f)
+
+    def load_champion_dict(self):
+        if not os.path.exists(self.champion_dict_file):
+            raise ValueError(f"{self.champion_dict_file} not found, build the index with -c")
+        with open(self.champion_dict_file, "rb") as f:
+            self.champion_dict = pickle.load(f)
+
+    def index_files(self) -> list[str]:
+        """The files the index may be read from"""
+        return [
+            self.out_dict,
+            self.out_postings,
+            "lengths.txt",
+            self.impact_dict_file,
+            self.impact_postings_file,
+            self.champion_dict_file,
+            self.champion_postings_file,
+        ]
+
+    def reload(self):
+        """Loads again everything loaded so far, for when the index files changed"""
+        lengths_loaded = bool(self.doc_lengths)
+        impact_loaded = self.impact_dict is not None
+        champions_loaded = self.champion_dict is not None
+        postings_cached = self.postings_cache is not None
+        self.doc_lengths = {}
+        self.impact_dict = self.champion_dict = self.postings_cache = None
+        self.load()
+        if lengths_loaded and self.legacy:
+            self.load_doc_lengths()
+        if impact_loaded:
+            self.load_impact_dict()
+        if champions_loaded:
+            self.load_champion_dict()
+        if postings_cached:
+            self.cache_postings()
+
     def get_df(self, word):
         """get the doc frequency for a word in the collection"""
         if word not in self.word_to_ptr_dict:
             return 0
         return self.word_to_ptr_dict[word].df
-    
+
+    def get_idf(self, word) -> float:
+        """get the idf of a word in the collection, 0 if it is not in the collection"""
+        if not self.word_to_ptr_dict:
+            self.load()
+        entry = self.word_to_ptr_dict.get(word)
+        if entry is None:
+            return 0
+        if entry.idf is None:
+            return math.log(self.get_N() / entry.df)
+        return entry.idf
+
+    def get_max_score(self, word) -> float:
+        """get the max contribution of a word to a cosine score before the query weight"""
+        if not self.word_to_ptr_dict:
+            self.load()
+        entry = self.word_to_ptr_dict.get(word)
+        if entry is None:
+            return 0.0
+        if entry.max_score is None:
+            # Compute it from the postings for dictionaries written before it was stored
+            entry.max_score = max(self.get_posting_arrays(word)[1], default=0.0)
+        return entry.max_score
+
     def get_N(self):
         """get the total number of documents in the collection"""
         if not self.doc_lengths:
-            self.load()
+            self.load_doc_lengths()
         return len(self.doc_lengths.keys())
 
-    def get_posting_list(self, word, filename=None):
-        """Use low level file operation to read in the
-        Pickle serialized file, deserialize into PostingList"""
+    def read_posting_data(self, word, filename=None):
+        """Use low level file operation to read in the postings of a word"""
         if not self.word_to_ptr_dict:
             self.load()
         filename = self.out_postings if filename is None else filename
         if word not in self.word_to_ptr_dict.keys():
             return None
+        if filename == self.out_postings and self.postings_cache is not None:
+            entry = self.word_to_ptr_dict[word]
+            return self.postings_cache[entry.pointer : entry.pointer + entry.pointer_offset]
         if not os.path.exists(filename):
             return None
         with open(filename, "rb") as inf:
             entry = self.word_to_ptr_dict[word]
             inf.seek(entry.pointer)
             data = inf.read(entry.pointer_offset)
-        return pickle.loads(data)
-    
+        return data
+
+    def get_posting_arrays(self, word):
+        """
+        get the parallel arrays of docIds and length-normalised weights of a word,
+        None if the word is not in the collection
+        """
+        data = self.read_posting_data(word)
+        if data is None:
+            return None
+        if not self.legacy:
+            return self.decode_posting_data(word, data)
+        pl = pickle.loads(data)
+        lengths = self.get_doc_length()
+        doc_ids = array("i", (p.docId for p in pl.plist))
+        weights = array("f", (p.tf / lengths[p.docId] for p in pl.plist))
+        return doc_ids, weights
+
+    def decode_posting_data(self, word, data):
+        """Decode the postings of a word into parallel arrays of docIds and weights"""
+        entry = self.word_to_ptr_dict[word]
+        if entry.scale is not None:
+            return decode_quantised_postings(data, entry.df, entry.scale)
+        return decode_postings(data)
+
+    def get_posting_list(self, word, filename=None):
+        """
+        get the PostingList of a word, with the length-normalised weights in place of the tf
+        weights unless the index was written before they were stored
+        """
+        data = self.read_posting_data(word, filename)
+        if data is None:
+            return None
+        if self.legacy:
+            return pickle.loads(data)
+        pl = PostingList()
+        for docId, weight in zip(*self.decode_posting_data(word, data)):
+            posting = Posting(docId)
+            posting.tf = weight
+            pl.append(posting)
+        return pl
+
+    def get_impact_segments(self, word):
+        """
+        get the (impact, docIds) segments of the impact-ordered postings of a word by decreasing
+        impact, None if the word is not in the index
+        """
+        if self.impact_dict is None:
+            self.load_impact_dict()
+        if word not in self.impact_dict["terms"]:
+            return None
+        pointer, length = self.impact_dict["terms"][word]
+        with open(self.impact_postings_file, "rb") as inf:
+            inf.seek(pointer)
+            segments = pickle.loads(inf.read(length))
+        scale = self.impact_dict["scale"]
+        return [(level * scale, array("i", docIds)) for level, docIds in segments]
+
+    def get_champion_list(self, word):
+        """
+        get the parallel arrays of docIds and length-normalised weights of the champion list
+        of a word, None if the word is not in the index
+        """
+        if self.champion_dict is None:
+            self.load_champion_dict()
+        if word not in self.champion_dict:
+            return None
+        with open(self.champion_postings_file, "rb") as inf:
+            entry = self.champion_dict[word]
+            inf.seek(entry.pointer)
+            data = inf.read(entry.pointer_offset)
+        return decode_postings(data)
+
     def get_doc_lengths(self, term):
         """Get the doc lengths vector for a term"""
         if not self.doc_lengths:
-            self.load()
+            self.load_doc_lengths()
         if term not in self.doc_lengths:
             return self.doc_lengths[term]
         return 1
@@ -222,7 +675,7 @@ class Indexer:
     def get_doc_length(self):
         """Retrieve the document length vector, loading from disk if necessary"""
         if not self.doc_lengths:
-            self.load()
+            self.load_doc_lengths()
         return self.doc_lengths
 
 
@@ -230,18 +683,41 @@ def usage():
     print(
         "usage: "
         + sys.argv[0]
-        + " -i directory-of-documents -d dictionary-file -p postings-file"
+        + " -i directory-of-documents -d dictionary-file -p postings-file [-I] [-c r] [-b memory-budget-MB] [-w weight-format]"
     )
-
-
-def build_index(in_dir, out_dict, out_postings):
+    print("  -I: also write the impact-ordered postings for the impact search mode")
+    print(f"  -w: layout of the weights, one of {WEIGHT_FORMATS}, the quantised ones use a global or per-term scale")
+    print("  -b: build with SPIMI blocks of about that many MB of postings instead of in memory")
+    print("  -c: also write the champion lists of the top r postings of every term for the champion search mode")
+
+
+def build_index(
+    in_dir,
+    out_dict,
+    out_postings,
+    impact_ordered=False,
+    champions=None,
+    memory_budget=None,
+    weight_format="float",
+):
     """
     build index from documents stored in the input directory,
     then output the dictionary file and postings file
+    and the impact-ordered postings if impact_ordered
+    and the champion lists of the top champions postings of every term if given
+    within memory_budget bytes if given
+    with the weights in one of WEIGHT_FORMATS
     """
     print("indexing...")
     start_time = time.time()
-    indexer = Indexer(out_dict, out_postings)
+    indexer = Indexer(
+        out_dict,
+        out_postings,
+        impact_ordered=impact_ordered,
+        champions=champions,
+        memory_budget=memory_budget,
+        weight_format=weight_format,
+    )
     indexer.index_collection(in_dir)
     end_time = time.time()
     print(f"Took {end_time - start_time} seconds to index")
@@ -259,9 +735,13 @@ def test_get_posting_lists(out_dict, out_postings):
 
 if __name__ == "__main__":
     input_directory = output_file_dictionary = output_file_postings = None
+    impact_ordered = False
+    champions = None
+    memory_budget = None
+    weight_format = "float"
 
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "i:d:p:")
+        opts, args = getopt.getopt(sys.argv[1:], "i:d:p:Ic:b:w:")
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -273,6 +753,14 @@ if __name__ == "__main__":
             output_file_dictionary = a
         elif o == "-p":  # postings file
             output_file_postings = a
+        elif o == "-I":  # impact-ordered postings
+            impact_ordered = True
+        elif o == "-c":  # size of the champion lists
+            champions = int(a)
+        elif o == "-b":  # memory budget in MB
+            memory_budget = int(float(a) * 2**20)
+        elif o == "-w":  # layout of the weights
+            weight_format = a
         else:
             assert False, "unhandled option"
 
@@ -284,4 +772,12 @@ if __name__ == "__main__":
         usage()
         sys.exit(2)
 
-    indexer = build_index(input_directory, output_file_dictionary, output_file_postings)
+    indexer = build_index(
+        input_directory,
+        output_file_dictionary,
+        output_file_postings,
+        impact_ordered,
+        champions,
+        memory_budget,
+        weight_format,
+    )
@@ -0,0 +1,97 @@
+"""
+Cache of the top K results of queries.
+
+The query vector of a query, and so its results, only depend on the counts of its stemmed terms, so
+the queries which only differ in word order or inflection share the key given by canonical_query.
+The cache holds a bounded number of results and evicts the least recently used ones. It is
+cleared whenever the signature of the index files, their sizes and modification times, differs
+from the one recorded when the index was loaded.
+"""
+from collections import Counter, OrderedDict
+import os
+
+
+def canonical_query(terms: list[str]) -> tuple:
+    """The sorted (term, count) pairs of the preprocessed terms of a query"""
+    return tuple(sorted(Counter(terms).items()))
+
+
+def index_signature(filenames: list[str]) -> tuple:
+    """The size and modification time of every file, None for the missing ones"""
+    signature = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class ResultCache:
+    def __init__(self, capacity: int = 1024) -> None:
+        if capacity < 1:
+            raise ValueError("capacity should be at least 1")
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.signature = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def track(self, signature: tuple):
+        """Records the signature of the index files as they are loaded, before any lookup"""
+        self.entries.clear()
+        self.signature = signature
+
+    def validate(self, signature: tuple) -> bool:
+        """
+        Clears the cache if the index signature is not the recorded one, returns whether it was
+        not, in which case the index has to be loaded again. Without a recorded signature the
+        loaded index is not known to match the files, so it is also reloaded.
+        """
+        if signature == self.signature:
+            return False
+        if self.signature is not None:
+            self.invalidations += 1
+        self.track(signature)
+        return True
+
+    def lookup(self, key):
+        """The cached results of the key, None if they are not cached"""
+        results = self.entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def store(self, key, results: list[int]):
+        self.entries[key] = results
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} misses ({self.hit_rate():.1%} hit rate), "
+            f"{self.evictions} evictions, {self.invalidations} invalidations"
+        )
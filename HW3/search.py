@@ -6,11 +6,27 @@ import getopt
 import heapq
 import time
 
+from bisect import bisect_left
 from collections import defaultdict, Counter
+from functools import partial
 from index import Indexer
+from result_cache import ResultCache, canonical_query, index_signature
 # These imports are necessary for pickle to work
 from index import Posting, PostingList, WordToPointerEntry
 
+try:
+    import numpy as np
+except ImportError:  # Only needed by the numpy and sparse search modes
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:  # Only needed by the sparse search mode
+    sparse = None
+
+# Number of queries the sparse search mode scores with one matrix product
+BATCH_BLOCK_SIZE = 256
+
 
 def preprocess_query(query: str, stemmer: nltk.stem.StemmerI) -> list[str]:
     """
@@ -33,7 +49,10 @@ def get_term_freq(query: list[str]) -> dict[str, int]:
 
 def usage():
     """Prints usage for search.py"""
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results [-m search-mode] [-b queries-per-block] [-r cache-size]")
+    print(f"  -m: one of {list(SEARCH_MODES) + list(BATCH_MODES)}, defaults to taat")
+    print(f"  -b: queries scored together by the batch modes, defaults to {BATCH_BLOCK_SIZE}")
+    print("  -r: cache the results of up to this many distinct queries, not with the batch modes")
     
     
 def get_tf(term, term_counts) -> float:
@@ -44,12 +63,8 @@ def get_tf(term, term_counts) -> float:
 
 
 def get_idf(term: str, indexer: Indexer) -> float:
-    """Get the idf of a query term given the Indexer"""
-    N = indexer.get_N()
-    df = indexer.get_df(term)
-    if df == 0:
-        return 0
-    return math.log(N / df)
+    """Get the idf of a query term given the Indexer, which precomputes it"""
+    return indexer.get_idf(term)
     
 
 def compute_query_vector(terms: list[str], indexer: Indexer, term_counts):
@@ -70,12 +85,16 @@ def compute_query_vector(terms: list[str], indexer: Indexer, term_counts):
 
 def search(query, indexer: Indexer, K=10):
     """Compute relevant documents using the cosine score redux algorithm"""
+    return rank_scores(cosine_scores(query, indexer), K)
+
+
+def cosine_scores(query, indexer: Indexer) -> dict:
+    """Cosine score of every document containing a term of the query"""
     query = preprocess_query(query, indexer.stemmer)
     # We store scores as (score, docId)
     # heapify uses the first attribute, so we want to 'sort' by score
     # then afterwards, we retain the docId as the return value
     scores = defaultdict(float)
-    length = indexer.get_doc_length()   
     # Obtain the term counts to avoid doing repeated work
     term_counts = get_term_freq(query)
     # Compute the query vector separately so that we can
@@ -84,16 +103,17 @@ def search(query, indexer: Indexer, K=10):
     query_vector = compute_query_vector(query, indexer, term_counts)
     for term in set(query):
         w_t_q = query_vector[term]
-        pl = indexer.get_posting_list(term)
-        if pl is None:
+        postings = indexer.get_posting_arrays(term)
+        if postings is None:
             continue
-        for posting in pl.plist:
-            d = posting.docId
-            # Alr precomputed
-            w_t_d = posting.tf
+        # Alr precomputed and normalised by the doc length
+        for d, w_t_d in zip(*postings):
             scores[d] += w_t_d * w_t_q
-    for docId in scores.keys():
-        scores[docId] = scores[docId] / length[docId]
+    return scores
+
+
+def rank_scores(scores, K=10) -> list[int]:
+    """Return the top K docIds of the accumulated scores"""
     # Invert the docId since we are interested in
     # ascending docId as tiebreakers.
     # The heapq is largest, so inverting will make the
@@ -104,19 +124,507 @@ def search(query, indexer: Indexer, K=10):
     return results
 
 
-def run_search(dict_file, postings_file, queries_file, results_file, K=10):
+def search_champion(query, indexer: Indexer, K=10):
+    """
+    Approximate the relevant documents with the cosine score of the champion lists tier only,
+    which holds the postings of highest length-normalised weight of every term. Falls back to
+    search over the full posting lists when the champion lists have fewer than K documents.
+    """
+    terms = preprocess_query(query, indexer.stemmer)
+    scores = defaultdict(float)
+    term_counts = get_term_freq(terms)
+    terms = list(set(terms))
+    query_vector = compute_query_vector(terms, indexer, term_counts)
+    for term in terms:
+        w_t_q = query_vector[term]
+        postings = indexer.get_champion_list(term)
+        if postings is None:
+            continue
+        for d, w_t_d in zip(*postings):
+            scores[d] += w_t_d * w_t_q
+    if len(scores) < K:
+        return search(query, indexer, K=K)
+    return rank_scores(scores, K)
+
+
+def top_k(doc_ids, scores, K=10) -> list[int]:
+    """
+    The K docIds with the highest scores from parallel numpy arrays. Ties are broken by
+    ascending docId, the same order as heapq.nlargest over (score, -docId) in search.
+    """
+    if 0 < K < len(scores):
+        # argpartition finds the K-th highest score in linear time, only the scores at least as
+        # high (which includes any ties with it) need to be sorted
+        kth = scores[np.argpartition(scores, len(scores) - K)[len(scores) - K]]
+        keep = scores >= kth
+        doc_ids, scores = doc_ids[keep], scores[keep]
+    order = np.lexsort((doc_ids, -scores))[:K]
+    return doc_ids[order].tolist()
+
+
+def search_numpy(query, indexer: Indexer, K=10):
+    """
+    Compute relevant documents using the cosine score algorithm with a dense accumulator.
+    The packed postings of every term are viewed as numpy arrays without copying and scattered
+    into a float32 array of scores indexed by docId, which is then ranked with argpartition.
+    """
+    if np is None:
+        raise ValueError("the numpy search mode requires numpy")
+    query = preprocess_query(query, indexer.stemmer)
+    term_counts = get_term_freq(query)
+    query = list(set(query))
+    query_vector = compute_query_vector(query, indexer, term_counts)
+    lists = []
+    for term in query:
+        postings = indexer.get_posting_arrays(term)
+        if postings is None or not postings[0]:
+            continue
+        doc_ids, weights = postings
+        lists.append(
+            (query_vector[term], np.frombuffer(doc_ids, dtype=np.int32), np.frombuffer(weights, dtype=np.float32))
+        )
+    # The accumulator only needs to cover the docIds of the query terms
+    size = max((int(doc_ids.max()) + 1 for _, doc_ids, _ in lists), default=0)
+    scores = np.zeros(size, dtype=np.float32)
+    # Only the documents with a posting of a query term are ranked, even if they score 0
+    seen = np.zeros(size, dtype=bool)
+    for w_t_q, doc_ids, weights in lists:
+        # The docIds of a posting list are distinct, so the indexed add does not lose updates
+        scores[doc_ids] += weights * np.float32(w_t_q)
+        seen[doc_ids] = True
+    doc_ids = np.flatnonzero(seen)
+    return top_k(doc_ids, scores[doc_ids], K)
+
+
+def build_term_doc_matrix(indexer: Indexer):
+    """
+    The CSR matrix of the length-normalised weights of the index with a row per term and a column
+    per docId, and the row of every term
+    """
+    if not indexer.word_to_ptr_dict:
+        indexer.load()
+    term_rows = {}
+    doc_ids = []
+    weights = []
+    indptr = [0]
+    # Every posting list is read, so the postings file is read at once instead of once per term
+    cached = indexer.postings_cache is not None
+    if not cached:
+        indexer.cache_postings()
+    try:
+        for term in indexer.word_to_ptr_dict:
+            postings = indexer.get_posting_arrays(term)
+            if postings is None or not postings[0]:
+                continue
+            term_rows[term] = len(term_rows)
+            doc_ids.append(np.frombuffer(postings[0], dtype=np.int32))
+            weights.append(np.frombuffer(postings[1], dtype=np.float32))
+            indptr.append(indptr[-1] + len(postings[0]))
+    finally:
+        if not cached:
+            indexer.postings_cache = None
+    doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+    # Scores are accumulated in double precision like search does
+    weights = np.concatenate(weights).astype(np.float64) if weights else np.zeros(0)
+    n_docs = int(doc_ids.max()) + 1 if len(doc_ids) else 0
+    matrix = sparse.csr_matrix((weights, doc_ids, np.array(indptr)), shape=(len(term_rows), n_docs))
+    return matrix, term_rows
+
+
+def search_sparse(queries: list[str], indexer: Indexer, K=10, block_size=BATCH_BLOCK_SIZE, matrix=None):
+    """
+    Compute the relevant documents of every query as rows of sparse matrix products. The query
+    vectors of a block of queries form a sparse matrix which is multiplied with the term-document
+    matrix of the index, and the top K of every row of the scores are ranked with argpartition.
+    matrix is the result of build_term_doc_matrix, which is built when not given.
+    """
+    if np is None or sparse is None:
+        raise ValueError("the sparse search mode requires numpy and scipy")
+    if block_size < 1:
+        raise ValueError("block_size should be at least 1")
+    matrix, term_rows = build_term_doc_matrix(indexer) if matrix is None else matrix
+    results = []
+    for start in range(0, len(queries), block_size):
+        block = queries[start : start + block_size]
+        rows, cols, data = [], [], []
+        for i, query in enumerate(block):
+            terms = preprocess_query(query, indexer.stemmer)
+            term_counts = get_term_freq(terms)
+            terms = list(set(terms))
+            query_vector = compute_query_vector(terms, indexer, term_counts)
+            for term in terms:
+                if term in term_rows:
+                    rows.append(i)
+                    cols.append(term_rows[term])
+                    data.append(query_vector[term])
+        query_matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(block), matrix.shape[0]))
+        scores = (query_matrix @ matrix).tocsr()
+        for i, query in enumerate(block):
+            row_start, row_end = scores.indptr[i], scores.indptr[i + 1]
+            if row_end - row_start < K:
+                # The product drops the documents which score 0, which search still ranks
+                # when there are fewer than K other documents
+                results.append(search(query, indexer, K=K))
+                continue
+            results.append(top_k(scores.indices[row_start:row_end], scores.data[row_start:row_end], K))
+    return results
+
+
+class PruningStats:
+    """
+    Counts of the postings of the query terms and of the postings a pruning search scored.
+    The posting lists are still read and decoded in full, so a skipped posting only saves the
+    work of scoring it.
+    """
+
+    def __init__(self):
+        self.postings = 0
+        self.scored = 0
+
+    def skipped_fraction(self) -> float:
+        return 1 - self.scored / self.postings if self.postings else 0.0
+
+    def __str__(self):
+        return f"scored {self.scored} of {self.postings} postings, skipped {self.skipped_fraction():.1%}"
+
+
+# Relative slack on the score upper bounds, which are rounded differently from the scores
+BOUND_SLACK = 1e-9
+
+
+def search_maxscore(query, indexer: Indexer, K=10, stats: PruningStats = None):
+    """
+    Compute relevant documents document-at-a-time with MaxScore dynamic pruning.
+    The upper bound of the contribution of a term is its query weight times its max score in the
+    index. The terms are sorted by upper bound, and once the K-th best score is reached by the
+    cumulative upper bound of the lowest terms, those terms become non-essential: documents
+    are only drawn from the essential terms, and the non-essential posting lists are only
+    searched while the score of the document can still beat the K-th best score.
+    Gives the same scores as search up to rounding: the contributions to a score are added in
+    another order, so documents whose scores are tied or within rounding of each other may be
+    ranked differently.
+    Every posting list is decoded in full up front, the pruning only saves scoring the skipped
+    postings. Visiting the documents one at a time costs more interpreter work per posting than
+    the term-at-a-time loop of search, so this is slower than search unless most postings are
+    skipped.
+    """
+    query = preprocess_query(query, indexer.stemmer)
+    term_counts = get_term_freq(query)
+    query = list(set(query))
+    query_vector = compute_query_vector(query, indexer, term_counts)
+    # (upper bound, query weight, docIds, weights) of the query terms, by increasing upper bound
+    lists = []
+    for term in query:
+        postings = indexer.get_posting_arrays(term)
+        if postings is None:
+            continue
+        w_t_q = query_vector[term]
+        bound = w_t_q * indexer.get_max_score(term) * (1 + BOUND_SLACK)
+        lists.append((bound, w_t_q, *postings))
+    lists.sort(key=lambda item: item[0])
+    # cumulative[i] is the upper bound of a document which only occurs in lists[: i + 1]
+    cumulative = []
+    total = 0.0
+    for bound, _, _, _ in lists:
+        total += bound
+        cumulative.append(total)
+    positions = [0] * len(lists)
+    # Min heap of the top K (score, -docId), so a later docId needs a strictly higher score
+    heap = []
+    threshold = -math.inf
+    # lists[:first_essential] are the non-essential lists
+    first_essential = 0
+    scored = 0
+    while True:
+        while first_essential < len(lists) and cumulative[first_essential] <= threshold:
+            first_essential += 1
+        candidates = [
+            docIds[positions[i]]
+            for i, (_, _, docIds, _) in enumerate(lists[first_essential:], first_essential)
+            if positions[i] < len(docIds)
+        ]
+        if not candidates:
+            break
+        d = min(candidates)
+        score = 0.0
+        for i in range(first_essential, len(lists)):
+            _, w_t_q, docIds, weights = lists[i]
+            if positions[i] < len(docIds) and docIds[positions[i]] == d:
+                score += weights[positions[i]] * w_t_q
+                positions[i] += 1
+                scored += 1
+        for i in range(first_essential - 1, -1, -1):
+            if score + cumulative[i] <= threshold:
+                break
+            _, w_t_q, docIds, weights = lists[i]
+            positions[i] = bisect_left(docIds, d, positions[i])
+            if positions[i] < len(docIds) and docIds[positions[i]] == d:
+                score += weights[positions[i]] * w_t_q
+                scored += 1
+        item = (score, -d)
+        if len(heap) < K:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+        if len(heap) == K:
+            threshold = heap[0][0]
+    if stats is not None:
+        stats.postings += sum(len(docIds) for _, _, docIds, _ in lists)
+        stats.scored += scored
+    return [-item[1] for item in sorted(heap, reverse=True)]
+
+
+def search_impact(query, indexer: Indexer, K=10, stats: PruningStats = None):
+    """
+    Compute relevant documents score-at-a-time over the impact-ordered postings.
+    The impact segments of all the query terms are processed by decreasing contribution
+    (query weight times quantised impact) into accumulators. A document can only still gain
+    the contribution of the next segment of every term it has not been seen in yet. Once that
+    adds up to less than the K-th best score, no new accumulator is created, and once no
+    document outside of the current top K can reach the K-th best score, the top K documents
+    are known. Their scores are then completed by looking them up in the remaining segments
+    instead of scanning them.
+    The top K + 1 accumulators are kept in a min heap while scanning and the remaining
+    contributions are updated segment by segment, so the K-th score is found in O(K), at most
+    once per K + 1 postings scanned. No seen document can enter the top K once the (K + 1)-th
+    score plus the remaining contributions cannot reach the K-th one, otherwise the bound of
+    every seen document is checked, at most once per as many postings scanned as there are
+    accumulators.
+    Gives the same results as ranking by the quantised impacts without early termination.
+    """
+    query = preprocess_query(query, indexer.stemmer)
+    term_counts = get_term_freq(query)
+    query = list(set(query))
+    query_vector = compute_query_vector(query, indexer, term_counts)
+    # (contribution, term index, docIds) of the segments of the query terms
+    segments = []
+    # Contributions of the segments of every term, by decreasing contribution
+    term_contributions = []
+    for term in query:
+        term_segments = indexer.get_impact_segments(term)
+        if term_segments is None:
+            continue
+        w_t_q = query_vector[term]
+        contributions = [w_t_q * impact for impact, _ in term_segments]
+        segments.extend(
+            (c, len(term_contributions), docIds) for c, (_, docIds) in zip(contributions, term_segments)
+        )
+        term_contributions.append(contributions)
+    segments.sort(key=lambda segment: segment[0], reverse=True)
+    next_segments = [0] * len(term_contributions)
+    # The most every term can still add to a document it has not been seen in
+    remaining = [contributions[0] for contributions in term_contributions]
+    total_remaining = sum(remaining)
+    # docId to its [score, bit mask of the terms it was seen in]
+    accumulators = {}
+    # Min heap of the (score, -docId) of the top K + 1 accumulators. Scores only grow, so the
+    # entries may be lower than the current scores, which only the root needs to be refreshed for
+    heap = []
+    in_heap = set()
+    # A lower bound of the lowest score in the heap once it is full
+    floor = -math.inf
+    # Whether unseen documents can no longer enter the top K, so no accumulator is created
+    closed = False
+    scored = 0
+    # Postings scanned since the top K was last ranked and since every bound was last checked
+    unranked = unchecked = 0
+    top = None
+    i = 0
+    while i < len(segments):
+        c, t, docIds = segments[i]
+        i += 1
+        bit = 1 << t
+        # Once closed, only the documents which already have an accumulator are scored
+        for d in accumulators.keys() & docIds if closed else docIds:
+            acc = accumulators.get(d)
+            if acc is None:
+                acc = accumulators[d] = [c, bit]
+            else:
+                acc[0] += c
+                acc[1] |= bit
+            if acc[0] < floor or d in in_heap:
+                continue
+            if len(heap) <= K:
+                heapq.heappush(heap, (acc[0], -d))
+                in_heap.add(d)
+            else:
+                refresh_heap_root(heap, accumulators)
+                if (acc[0], -d) <= heap[0]:
+                    continue
+                in_heap.discard(-heapq.heapreplace(heap, (acc[0], -d))[1])
+                in_heap.add(d)
+            if len(heap) > K:
+                refresh_heap_root(heap, accumulators)
+                floor = heap[0][0]
+        scored += len(docIds)
+        unranked += len(docIds)
+        unchecked += len(docIds)
+        contributions = term_contributions[t]
+        next_segments[t] += 1
+        following = contributions[next_segments[t]] if next_segments[t] < len(contributions) else 0.0
+        total_remaining += following - remaining[t]
+        remaining[t] = following
+        if len(in_heap) < K or i == len(segments) or unranked <= K:
+            continue
+        unranked = 0
+        ranked = sorted(((accumulators[-d][0], d) for _, d in heap), reverse=True)
+        kth = ranked[K - 1]
+        # Recomputed so that the rounding of the running total cannot end the search early
+        total_remaining = sum(remaining)
+        # Unseen documents score at most total_remaining
+        if total_remaining * (1 + BOUND_SLACK) >= kth[0]:
+            continue
+        closed = True
+        if len(ranked) == K or (ranked[K][0] + total_remaining) * (1 + BOUND_SLACK) < kth[0]:
+            top = {-d: score for score, d in ranked[:K]}
+            break
+        if unchecked < len(accumulators):
+            continue
+        unchecked = 0
+        # The others score at most their score plus the remaining contributions of the terms
+        # they were not seen in, so only the best document outside of the top K of every
+        # mask needs to be checked
+        top_ids = {-d for _, d in ranked[:K]}
+        best_by_mask = {}
+        for d, (score, mask) in accumulators.items():
+            if (score, -d) > best_by_mask.get(mask, (-1.0, 0)) and d not in top_ids:
+                best_by_mask[mask] = (score, -d)
+
+        def cannot_enter(mask, best):
+            gain = sum(r for u, r in enumerate(remaining) if not mask >> u & 1)
+            if gain == 0:
+                # The score is final, ties with the K-th document are broken by docId
+                return best < kth
+            return (best[0] + gain) * (1 + BOUND_SLACK) < kth[0]
+
+        if all(cannot_enter(mask, best) for mask, best in best_by_mask.items()):
+            top = {-d: score for score, d in ranked[:K]}
+            break
+    if top is None:
+        # Every segment was scanned, the heap holds the top K + 1
+        top = {-d: score for score, d in sorted(((accumulators[-d][0], d) for _, d in heap), reverse=True)[:K]}
+    else:
+        for c, _, docIds in segments[i:]:
+            for d in top:
+                j = bisect_left(docIds, d)
+                if j < len(docIds) and docIds[j] == d:
+                    top[d] += c
+                    scored += 1
+    if stats is not None:
+        stats.postings += sum(len(docIds) for _, _, docIds in segments)
+        stats.scored += scored
+    return [d for d, _ in sorted(top.items(), key=lambda item: (item[1], -item[0]), reverse=True)]
+
+
+def refresh_heap_root(heap, accumulators):
+    """Replace the root of the heap of (score, -docId) until its score is the current one"""
+    while True:
+        score, d = heap[0]
+        current = accumulators[-d][0]
+        if current == score:
+            return
+        heapq.heapreplace(heap, (current, d))
+
+
+# Search mode to the function which ranks the documents of a query
+SEARCH_MODES = {
+    "taat": search,
+    "numpy": search_numpy,
+    "maxscore": search_maxscore,
+    "impact": search_impact,
+    "champion": search_champion,
+}
+# Search modes which skip postings and count them in a PruningStats
+PRUNING_MODES = ["maxscore", "impact"]
+
+
+# Search modes which take the list of all the queries and return the results of every query
+BATCH_MODES = {
+    "sparse": search_sparse,
+}
+
+
+def cached_search(search_fn, cache: ResultCache):
+    """
+    search_fn answering from the cache the queries with the same stemmed terms and counts as an
+    earlier one. The cache is cleared and the index reloaded when the index files change.
+    """
+
+    def search_cached(query, indexer: Indexer, K=10, **kwargs):
+        if cache.validate(index_signature(indexer.index_files())):
+            indexer.reload()
+        key = (K, canonical_query(preprocess_query(query, indexer.stemmer)))
+        results = cache.lookup(key)
+        if results is None:
+            results = search_fn(query, indexer, K=K, **kwargs)
+            cache.store(key, results)
+        return list(results)
+
+    return search_cached
+
+
+def run_search(
+    dict_file,
+    postings_file,
+    queries_file,
+    results_file,
+    K=10,
+    mode="taat",
+    block_size=BATCH_BLOCK_SIZE,
+    cache_size=None,
+):
     """
     using the given dictionary file and postings file,
     perform searching on the given queries file and output the results to a file
     K = top K documents to retrieve
+    mode = one of SEARCH_MODES or BATCH_MODES
+    block_size = number of queries the batch modes score together
+    cache_size = number of distinct queries whose results are cached, None to not cache them
     """
+    if mode in BATCH_MODES:
+        if cache_size is not None:
+            raise ValueError("the batch modes do not use the result cache")
+        run_batch_search(dict_file, postings_file, queries_file, results_file, K, mode, block_size)
+        return
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode should be one of {list(SEARCH_MODES) + list(BATCH_MODES)}")
+    search_fn = SEARCH_MODES[mode]
+    stats = PruningStats()
+    if mode in PRUNING_MODES:
+        search_fn = partial(search_fn, stats=stats)
+    cache = None if cache_size is None else ResultCache(cache_size)
+    if cache is not None:
+        search_fn = cached_search(search_fn, cache)
     print('running search on the queries...')
     start_time = time.time()
     indexer = Indexer(dict_file, postings_file)
+    if cache is not None:
+        # Taken before loading, so that files changed while loading are loaded again
+        cache.track(index_signature(indexer.index_files()))
+        indexer.load()
     with open(queries_file, "r") as qf, open(results_file, "w") as wf:
         for line in qf.readlines():
             line = line.strip()
-            docIds = search(line, indexer, K=K)
+            docIds = search_fn(line, indexer, K=K)
+            wf.write(" ".join(list(map(str, docIds))) + "\n")
+    end_time = time.time()
+    print(f"Execution time: {end_time - start_time}")
+    if mode in PRUNING_MODES:
+        print(f"{mode}: {stats}")
+    if cache is not None:
+        print(f"cache: {cache}")
+
+
+def run_batch_search(dict_file, postings_file, queries_file, results_file, K, mode, block_size):
+    """run_search with one of BATCH_MODES, which takes all the queries of the file at once"""
+    print('running search on the queries...')
+    start_time = time.time()
+    indexer = Indexer(dict_file, postings_file)
+    with open(queries_file, "r") as qf:
+        queries = [line.strip() for line in qf]
+    results = BATCH_MODES[mode](queries, indexer, K=K, block_size=block_size)
+    with open(results_file, "w") as wf:
+        for docIds in results:
             wf.write(" ".join(list(map(str, docIds))) + "\n")
     end_time = time.time()
     print(f"Execution time: {end_time - start_time}")
@@ -124,9 +632,12 @@ def run_search(dict_file, postings_file, queries_file, results_file, K=10):
 
 if __name__ == "__main__":
     dictionary_file = postings_file = file_of_queries = output_file_of_results = None
+    mode = "taat"
+    block_size = BATCH_BLOCK_SIZE
+    cache_size = None
 
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:m:b:r:')
     except getopt.GetoptError:
         usage()
         sys.exit(2)
@@ -140,12 +651,18 @@ if __name__ == "__main__":
             file_of_queries = a
         elif o == '-o':
             file_of_output = a
+        elif o == '-m':
+            mode = a
+        elif o == '-b':
+            block_size = int(a)
+        elif o == '-r':
+            cache_size = int(a)
         else:
             assert False, "unhandled option"
 
     if dictionary_file == None or postings_file == None or file_of_queries == None or file_of_output == None :
         usage()
         sys.exit(2)
-    run_search(dictionary_file, postings_file, file_of_queries, file_of_output)
+    run_search(dictionary_file, postings_file, file_of_queries, file_of_output, mode=mode, block_size=block_size, cache_size=cache_size)
     # with Profile() as profile:
     #     Stats(profile).strip_dirs().sort_stats(SortKey.CALLS).print_stats()
\ No newline at end of file
@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+"""
+Ranked search server which keeps the index loaded between queries.
+
+The dictionary, the document lengths of legacy indexes, the dictionary of the tier used by the
+search mode and optionally the whole postings file are loaded once at startup, then every line
+read from stdin, or from a connection to the unix socket, is answered with one line of JSON
+holding the top K docIds and the latency of the query:
+
+    {"results": [3, 1, 2], "latency_ms": 0.42}
+
+Pruning modes also report the fraction of the postings the query skipped, and with a result cache
+the responses tell whether they came from the cache, in which case no fraction is reported.
+A query which fails is answered with the error instead, and the next lines are still answered:
+
+    {"error": "..."}
+
+The connections to the unix socket are served by one thread each, so a client keeping its
+connection open does not hold up the others.
+"""
+import getopt
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from index import Indexer
+from result_cache import ResultCache, index_signature
+from search import SEARCH_MODES, PRUNING_MODES, PruningStats, cached_search
+
+# These imports are necessary for pickle to work
+from index import Posting, PostingList, WordToPointerEntry
+
+
+class SearchServer:
+    """Answers queries with a preloaded index"""
+
+    def __init__(
+        self, dict_file, postings_file, K=10, mode="taat", cache_postings=False, cache_size=None
+    ) -> None:
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode should be one of {list(SEARCH_MODES)}")
+        self.K = K
+        self.mode = mode
+        self.search_fn = SEARCH_MODES[mode]
+        self.cache = None if cache_size is None else ResultCache(cache_size)
+        if self.cache is not None:
+            self.search_fn = cached_search(self.search_fn, self.cache)
+        start = time.perf_counter()
+        self.indexer = Indexer(dict_file, postings_file)
+        if self.cache is not None:
+            # Taken before loading, so that files changed while loading are loaded again
+            self.cache.track(index_signature(self.indexer.index_files()))
+        self.indexer.load()
+        if self.indexer.legacy:
+            self.indexer.load_doc_lengths()
+        if mode == "impact":
+            self.indexer.load_impact_dict()
+        elif mode == "champion":
+            self.indexer.load_champion_dict()
+        if cache_postings:
+            self.indexer.cache_postings()
+        self.load_time = time.perf_counter() - start
+        self.queries = 0
+        # The searches only read the loaded index, but the cache may reload it and its entries
+        # and counters are shared, so the cached searches are made one at a time
+        self.lock = threading.Lock()
+
+    def answer(self, query: str) -> dict:
+        start = time.perf_counter()
+        if self.cache is None:
+            response = self.search(query)
+        else:
+            with self.lock:
+                hits = self.cache.hits
+                response = self.search(query)
+                response["cached"] = self.cache.hits > hits
+            if response["cached"]:
+                # No postings were read, the fraction skipped when it was cached is not known
+                response.pop("skipped_postings", None)
+        response["latency_ms"] = 1000 * (time.perf_counter() - start)
+        with self.lock:
+            self.queries += 1
+        return response
+
+    def search(self, query: str) -> dict:
+        if self.mode not in PRUNING_MODES:
+            return {"results": self.search_fn(query, self.indexer, K=self.K)}
+        stats = PruningStats()
+        results = self.search_fn(query, self.indexer, K=self.K, stats=stats)
+        return {"results": results, "skipped_postings": stats.skipped_fraction()}
+
+    def answer_line(self, line: str) -> str:
+        """The JSON line answering a line, or giving the error the query failed with"""
+        try:
+            response = self.answer(line.strip())
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        return json.dumps(response) + "\n"
+
+    def serve_lines(self, inf, outf):
+        """Answers every line of inf with a line of outf until inf is closed"""
+        for line in inf:
+            outf.write(self.answer_line(line))
+            outf.flush()
+
+
+def serve_socket(server: SearchServer, socket_file: str):
+    """Answers the connections to the unix socket, each in its own thread, until interrupted"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                self.wfile.write(server.answer_line(line.decode("utf-8", errors="replace")).encode("utf-8"))
+
+    if os.path.exists(socket_file):
+        os.remove(socket_file)
+    with socketserver.ThreadingUnixStreamServer(socket_file, Handler) as unix_server:
+        # The connections still open do not keep the server from exiting once interrupted
+        unix_server.daemon_threads = True
+        try:
+            unix_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_file)
+
+
+def usage():
+    print(
+        "usage: "
+        + sys.argv[0]
+        + " -d dictionary-file -p postings-file [-m search-mode] [-k K] [-s socket-file] [-c] [-r cache-size]"
+    )
+    print(f"  -m: one of {list(SEARCH_MODES)}, defaults to taat")
+    print("  -s: serve the unix socket instead of stdin")
+    print("  -c: keep the whole postings file in memory")
+    print("  -r: cache the results of up to this many distinct queries")
+
+
+if __name__ == "__main__":
+    dictionary_file = postings_file = socket_file = None
+    mode = "taat"
+    K = 10
+    cache_postings = False
+    cache_size = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "d:p:m:k:s:cr:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "-d":
+            dictionary_file = a
+        elif o == "-p":
+            postings_file = a
+        elif o == "-m":
+            mode = a
+        elif o == "-k":
+            K = int(a)
+        elif o == "-s":
+            socket_file = a
+        elif o == "-c":
+            cache_postings = True
+        elif o == "-r":
+            cache_size = int(a)
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None:
+        usage()
+        sys.exit(2)
+
+    server = SearchServer(dictionary_file, postings_file, K, mode, cache_postings, cache_size)
+    # Responses go to stdout, so the status goes to stderr
+    print(f"index loaded in {server.load_time:.3f} seconds", file=sys.stderr)
+    if socket_file is None:
+        server.serve_lines(sys.stdin, sys.stdout)
+    else:
+        print(f"serving {socket_file}", file=sys.stderr)
+        serve_socket(server, socket_file)
+    print(f"answered {server.queries} queries", file=sys.stderr)
+    if server.cache is not None:
+        print(f"cache: {server.cache}", file=sys.stderr)
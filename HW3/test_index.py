@@ -0,0 +1,148 @@
+"""Checks of the files written by the builds of the index"""
+from array import array
+from collections import Counter
+import math
+import os
+import pickle
+import random
+
+import pytest
+
+from conftest import DOC_IDS, QUERIES, assert_top_k, document_text
+from index import (
+    POSTING_BYTES,
+    WEIGHT_LEVELS,
+    Indexer,
+    Posting,
+    PostingList,
+    WordToPointerEntry,
+    decode_quantised_postings,
+    encode_quantised_postings,
+    vb_decode,
+    vb_encode,
+)
+from search import search
+
+
+def read_files(index, suffixes=("", ".impact", ".champions")) -> dict:
+    """The contents of the dictionary and postings files and of their impact and champion variants"""
+    contents = {}
+    for filename in index:
+        for suffix in suffixes:
+            contents[f"{os.path.splitext(filename)[1]}{suffix}"] = open(f"{filename}{suffix}", "rb").read()
+    return contents
+
+
+@pytest.mark.parametrize("weight_format", ["float", "term"])
+def test_spimi_build(build, weight_format):
+    options = dict(impact_ordered=True, champions=5, weight_format=weight_format)
+    expected = read_files(build("in-memory", **options))
+    # Budgets of a few postings, of many blocks and of a single block
+    for memory_budget in [POSTING_BYTES, 50 * POSTING_BYTES, 10**9]:
+        index = build(f"spimi-{memory_budget}", memory_budget=memory_budget, **options)
+        assert read_files(index) == expected
+        assert not os.path.exists(f"{index[1]}.blocks")
+
+
+def document_tfs(indexer: Indexer) -> dict:
+    """The tf weight of every term of every document, computed from the texts"""
+    tfs = {}
+    for docId in DOC_IDS:
+        counts = Counter(indexer.preprocess_text(document_text(docId)))
+        tfs[docId] = {term: 1 + math.log10(count) for term, count in counts.items()}
+    return tfs
+
+
+def document_lengths(tfs: dict) -> dict:
+    return {docId: math.sqrt(sum(tf**2 for tf in doc_tfs.values())) for docId, doc_tfs in tfs.items()}
+
+
+def test_weights_and_idf(build):
+    indexer = Indexer(*build("index"))
+    indexer.load()
+    tfs = document_tfs(indexer)
+    lengths = document_lengths(tfs)
+    terms = set().union(*tfs.values())
+    assert set(indexer.word_to_ptr_dict) == terms
+    for term in terms:
+        doc_ids, weights = indexer.get_posting_arrays(term)
+        assert list(doc_ids) == [docId for docId in DOC_IDS if term in tfs[docId]]
+        assert list(weights) == pytest.approx([tfs[d][term] / lengths[d] for d in doc_ids], rel=1e-6)
+        assert indexer.get_idf(term) == pytest.approx(math.log(len(DOC_IDS) / len(doc_ids)))
+        assert indexer.get_max_score(term) == max(weights)
+    assert indexer.get_idf("missing") == 0 and not indexer.legacy
+
+
+def test_legacy_index(build, workdir):
+    index = build("index")
+    indexer = Indexer(*index)
+    indexer.load()
+    # The layout written before the weights were normalised and the idf stored: pickled
+    # PostingLists of the tf weights, and the document lengths in lengths.txt
+    tfs = document_tfs(indexer)
+    word_to_ptr_dict = {}
+    with open("legacy.postings", "wb") as outf:
+        for term in sorted(set().union(*tfs.values())):
+            pl = PostingList()
+            for docId in DOC_IDS:
+                if term in tfs[docId]:
+                    posting = Posting(docId)
+                    posting.tf = tfs[docId][term]
+                    pl.append(posting)
+            data = pickle.dumps(pl)
+            word_to_ptr_dict[term] = WordToPointerEntry(outf.tell(), len(data), len(pl))
+            outf.write(data)
+    with open("legacy.dict", "wb") as outf:
+        pickle.dump(word_to_ptr_dict, outf)
+    with open("lengths.txt", "wb") as outf:
+        pickle.dump(document_lengths(tfs), outf)
+    legacy = Indexer("legacy.dict", "legacy.postings")
+    legacy.load()
+    assert legacy.legacy
+    for term in word_to_ptr_dict:
+        assert legacy.get_idf(term) == pytest.approx(indexer.get_idf(term))
+        assert legacy.get_max_score(term) == pytest.approx(indexer.get_max_score(term), rel=1e-6)
+    for query in QUERIES:
+        assert_top_k(search(query, legacy), query, indexer)
+
+
+def test_vb_round_trip():
+    numbers = [0, 1, 127, 128, 129, 16383, 16384, 2**31 - 1, 2**40]
+    assert vb_decode(vb_encode(numbers)) == numbers
+    assert vb_decode(vb_encode([])) == []
+
+
+def test_quantised_round_trip():
+    rng = random.Random(3245)
+    for _ in range(2000):
+        doc_ids = array("i", sorted(rng.sample(range(1, 10**6), rng.randint(1, 50))))
+        weights = array("f", (rng.uniform(1e-4, 1) for _ in doc_ids))
+        scale = max(weights) / WEIGHT_LEVELS * rng.choice([1, 1.5, 3])
+        data, max_score = encode_quantised_postings(doc_ids, weights, scale)
+        decoded_ids, decoded_weights = decode_quantised_postings(data, len(doc_ids), scale)
+        assert decoded_ids == doc_ids
+        # The bound is the largest weight read back, so it bounds them all
+        assert max_score == max(decoded_weights)
+        for weight, decoded in zip(weights, decoded_weights):
+            level = min(WEIGHT_LEVELS, max(1, round(weight / scale)))
+            assert decoded == pytest.approx(level * scale, rel=1e-6)
+            # The weights between the first and the last level are rounded to the nearest one
+            if 1 < level < WEIGHT_LEVELS:
+                assert abs(decoded - weight) <= scale / 2 * (1 + 1e-5)
+
+
+@pytest.mark.parametrize("weight_format", ["global", "term"])
+def test_quantised_index(build, weight_format):
+    exact = Indexer(*build("float"))
+    exact.load()
+    indexer = Indexer(*build(weight_format, weight_format=weight_format))
+    indexer.load()
+    for term, entry in exact.word_to_ptr_dict.items():
+        doc_ids, weights = exact.get_posting_arrays(term)
+        quantised_ids, quantised = indexer.get_posting_arrays(term)
+        assert quantised_ids == doc_ids
+        assert indexer.get_max_score(term) == max(quantised)
+        assert indexer.get_idf(term) == entry.idf
+        scale = indexer.word_to_ptr_dict[term].scale
+        # Only the weights below the first level are not rounded to the nearest one
+        assert all(abs(q - w) <= scale / 2 * (1 + 1e-5) or q == scale for q, w in zip(quantised, weights))
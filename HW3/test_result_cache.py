@@ -0,0 +1,53 @@
+"""Checks that the result cache answers with the results of the index files as they are"""
+import pytest
+
+from conftest import DOC_IDS, QUERIES, write_collection
+from index import Indexer
+from result_cache import ResultCache, canonical_query
+from search import cached_search, run_search, search
+from server import SearchServer
+
+
+def test_lru_entries():
+    cache = ResultCache(capacity=2)
+    cache.store("a", [1])
+    cache.store("b", [2])
+    assert cache.lookup("a") == [1]
+    # b is the least recently used
+    cache.store("c", [3])
+    assert cache.lookup("b") is None and cache.lookup("a") == [1] and cache.lookup("c") == [3]
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+    with pytest.raises(ValueError):
+        ResultCache(capacity=0)
+    assert canonical_query(["b", "a", "b"]) == canonical_query(["a", "b", "b"]) != canonical_query(["a", "b"])
+
+
+def test_canonical_hits(build):
+    indexer = Indexer(*build("index"))
+    cache = ResultCache()
+    search_cached = cached_search(search, cache)
+    # The same stemmed terms and counts in another order and case
+    for query in ["w1 w2 w2", "W2 w1 w2", "w2 w2 W1"]:
+        assert search_cached(query, indexer) == search("w1 w2 w2", indexer)
+    assert (cache.hits, cache.misses) == (2, 1)
+    # Another K is another entry
+    assert search_cached("w1 w2 w2", indexer, K=3) == search("w1 w2 w2", indexer, K=3)
+    assert cache.misses == 2
+
+
+def test_rebuilt_index(build, workdir, queries_file):
+    other = write_collection(workdir / "other", DOC_IDS[::2])
+    index = build("index")
+    server = SearchServer(*index, cache_size=8)
+    # Rebuilt after the server loaded the index and before its first query
+    build("index", in_dir=other)
+    expected = [search(query, Indexer(*index)) for query in QUERIES]
+    assert [server.answer(query)["results"] for query in QUERIES] == expected
+    # And after the results were cached
+    build("index")
+    expected = [search(query, Indexer(*index)) for query in QUERIES]
+    assert [server.answer(query)["results"] for query in QUERIES] == expected
+    assert server.cache.invalidations == 2
+    run_search(*index, queries_file, "cached.txt", cache_size=8)
+    run_search(*index, queries_file, "uncached.txt")
+    assert open("cached.txt").read() == open("uncached.txt").read()
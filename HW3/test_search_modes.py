@@ -0,0 +1,123 @@
+"""Checks that the search modes return the top K documents of the exact cosine scores"""
+from collections import defaultdict
+
+import pytest
+
+from conftest import DOC_IDS, QUERIES, assert_top_k
+from index import WEIGHT_FORMATS, Indexer
+from search import (
+    PruningStats,
+    compute_query_vector,
+    get_term_freq,
+    preprocess_query,
+    run_search,
+    search,
+    search_champion,
+    search_impact,
+    search_maxscore,
+    search_numpy,
+    search_sparse,
+)
+
+
+@pytest.fixture
+def indexer(build):
+    indexer = Indexer(*build("index"))
+    indexer.load()
+    return indexer
+
+
+def test_numpy_search(indexer):
+    for query in QUERIES:
+        for K in [1, 10, 1000]:
+            assert_top_k(search_numpy(query, indexer, K=K), query, indexer, K)
+
+
+def test_run_search_modes(build, queries_file):
+    index = build("index")
+    indexer = Indexer(*index)
+    indexer.load()
+    for mode in ["taat", "numpy", "sparse"]:
+        run_search(*index, queries_file, f"{mode}.txt", mode=mode)
+        with open(f"{mode}.txt") as f:
+            lines = f.read().splitlines()
+        assert len(lines) == len(QUERIES)
+        for query, line in zip(QUERIES, lines):
+            assert_top_k([int(docId) for docId in line.split()], query, indexer)
+
+
+@pytest.mark.parametrize("weight_format", WEIGHT_FORMATS)
+def test_maxscore_search(build, weight_format):
+    indexer = Indexer(*build(f"index-{weight_format}", weight_format=weight_format))
+    indexer.load()
+    stats = PruningStats()
+    for query in QUERIES:
+        for K in [1, 3, 10, 1000]:
+            assert_top_k(search_maxscore(query, indexer, K=K, stats=stats), query, indexer, K)
+    # The small K of the long queries let some postings be skipped
+    assert 0 < stats.scored < stats.postings
+
+
+def impact_scores(query, indexer: Indexer) -> dict:
+    """The scores of the quantised impacts of every segment, without early termination"""
+    terms = preprocess_query(query, indexer.stemmer)
+    term_counts = get_term_freq(terms)
+    terms = list(set(terms))
+    query_vector = compute_query_vector(terms, indexer, term_counts)
+    scores = defaultdict(float)
+    for term in terms:
+        for impact, docIds in indexer.get_impact_segments(term) or []:
+            for d in docIds:
+                scores[d] += query_vector[term] * impact
+    return scores
+
+
+def test_impact_search(build):
+    indexer = Indexer(*build("index", impact_ordered=True))
+    indexer.load()
+    # The segments hold the postings of every term, at their quantised weights
+    for term in indexer.word_to_ptr_dict:
+        weights = dict(zip(*indexer.get_posting_arrays(term)))
+        impacts = {d: impact for impact, docIds in indexer.get_impact_segments(term) for d in docIds}
+        assert impacts.keys() == weights.keys()
+        assert all(abs(impacts[d] - weights[d]) <= indexer.impact_dict["scale"] for d in weights)
+    stats = PruningStats()
+    for query in QUERIES:
+        scores = impact_scores(query, indexer)
+        for K in [1, 3, 10, 1000]:
+            assert_top_k(search_impact(query, indexer, K=K, stats=stats), query, indexer, K, scores)
+    assert 0 < stats.scored < stats.postings
+
+
+def test_champion_search(build):
+    for champions in [5, len(DOC_IDS)]:
+        indexer = Indexer(*build(f"index-{champions}", champions=champions))
+        indexer.load()
+        # The champion list of a term holds its postings of highest weight, by docId
+        for term in indexer.word_to_ptr_dict:
+            postings = sorted(zip(*indexer.get_posting_arrays(term)), key=lambda p: (-p[1], p[0]))
+            doc_ids, weights = indexer.get_champion_list(term)
+            assert list(zip(doc_ids, weights)) == sorted(postings[:champions])
+        for query in QUERIES:
+            for K in [1, 10]:
+                results = search_champion(query, indexer, K=K)
+                if champions == len(DOC_IDS):
+                    # The champion lists are the whole posting lists
+                    assert_top_k(results, query, indexer, K)
+                else:
+                    assert len(results) == len(search(query, indexer, K=K))
+
+
+@pytest.mark.parametrize("weight_format", ["float", "term"])
+def test_sparse_search(build, weight_format):
+    indexer = Indexer(*build(f"index-{weight_format}", weight_format=weight_format))
+    indexer.load()
+    # Blocks of one query, of some of the queries and of all of them
+    for block_size in [1, 4, len(QUERIES)]:
+        for K in [1, 10, 1000]:
+            results = search_sparse(QUERIES, indexer, K=K, block_size=block_size)
+            assert len(results) == len(QUERIES)
+            for query, query_results in zip(QUERIES, results):
+                assert_top_k(query_results, query, indexer, K)
+    with pytest.raises(ValueError):
+        search_sparse(QUERIES, indexer, block_size=0)
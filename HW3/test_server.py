@@ -0,0 +1,81 @@
+"""Checks that the search server answers every line with the results of the search modes"""
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import QUERIES
+from index import Indexer
+from search import SEARCH_MODES
+from server import SearchServer
+
+
+@pytest.mark.parametrize("mode", ["taat", "maxscore", "impact", "champion"])
+def test_answer_lines(build, mode):
+    index = build("index", impact_ordered=True, champions=5)
+    indexer = Indexer(*index)
+    indexer.load()
+    server = SearchServer(*index, K=5, mode=mode, cache_postings=True)
+    inf, outf = io.StringIO("".join(f"{query}\n" for query in QUERIES)), io.StringIO()
+    server.serve_lines(inf, outf)
+    responses = [json.loads(line) for line in outf.getvalue().splitlines()]
+    assert [response["results"] for response in responses] == [
+        SEARCH_MODES[mode](query, indexer, K=5) for query in QUERIES
+    ]
+    assert all(response["latency_ms"] >= 0 for response in responses)
+    assert server.queries == len(QUERIES)
+
+
+def test_failed_query(build):
+    server = SearchServer(*build("index"))
+    search_fn = server.search_fn
+
+    def failing(query, indexer, K=10):
+        if query == "fail":
+            raise ValueError("failed")
+        return search_fn(query, indexer, K=K)
+
+    server.search_fn = failing
+    outf = io.StringIO()
+    server.serve_lines(io.StringIO("w1\nfail\nw2\n"), outf)
+    responses = [json.loads(line) for line in outf.getvalue().splitlines()]
+    # The failed query is answered with its error and the next line is still answered
+    assert responses[1] == {"error": "ValueError: failed"}
+    assert "results" in responses[0] and "results" in responses[2]
+
+
+def test_socket(build, workdir):
+    index = build("index")
+    socket_file = str(workdir / "server.sock")
+    server_file = os.path.join(os.path.dirname(__file__), "server.py")
+    process = subprocess.Popen(
+        [sys.executable, server_file, "-d", index[0], "-p", index[1], "-s", socket_file],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    try:
+        for _ in range(200):
+            if os.path.exists(socket_file):
+                break
+            time.sleep(0.05)
+        # A client keeping its connection open does not hold up the other clients
+        idle = socket.socket(socket.AF_UNIX)
+        idle.connect(socket_file)
+        with socket.socket(socket.AF_UNIX) as client:
+            client.settimeout(30)
+            client.connect(socket_file)
+            client.sendall(b"w1 w2\n")
+            response = json.loads(client.makefile().readline())
+        indexer = Indexer(*index)
+        indexer.load()
+        assert response["results"] == SEARCH_MODES["taat"]("w1 w2", indexer)
+        idle.close()
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+    assert not os.path.exists(socket_file)